@@ -0,0 +1,121 @@
+"""initial schema
+
+Databases created before migrations were shipped (with create_all or a local
+autogenerated revision) already have some of these tables; only the missing
+ones are created, so ``alembic upgrade head`` works on them as well.
+
+Revision ID: 3f1c2a7d9b01
+Revises:
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a7d9b01"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def _missing(table: str) -> bool:
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if _missing("isps"):
+        op.create_table(
+            "isps",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.Column("name_en", sa.String(length=100), nullable=True),
+            sa.Column("country", sa.String(length=10), nullable=False),
+            sa.Column("isp_type", sa.String(length=20), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("name"),
+        )
+        op.create_index(op.f("ix_isps_id"), "isps", ["id"], unique=False)
+
+    if _missing("dns_servers"):
+        op.create_table(
+            "dns_servers",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("isp_id", sa.Integer(), nullable=False),
+            sa.Column("ip_address", sa.String(length=45), nullable=False),
+            sa.Column("priority", sa.Integer(), nullable=False),
+            sa.Column("region", sa.String(length=50), nullable=True),
+            sa.Column("server_type", sa.String(length=20), nullable=False),
+            sa.Column("doh_url", sa.String(length=255), nullable=True),
+            sa.Column("dot_hostname", sa.String(length=255), nullable=True),
+            sa.Column("is_anycast", sa.Boolean(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+            sa.Column("notes", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.ForeignKeyConstraint(["isp_id"], ["isps.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(op.f("ix_dns_servers_id"), "dns_servers", ["id"], unique=False)
+
+    if _missing("asn_mappings"):
+        op.create_table(
+            "asn_mappings",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("isp_id", sa.Integer(), nullable=False),
+            sa.Column("asn", sa.Integer(), nullable=False),
+            sa.Column("as_name", sa.String(length=255), nullable=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.ForeignKeyConstraint(["isp_id"], ["isps.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(op.f("ix_asn_mappings_asn"), "asn_mappings", ["asn"], unique=False)
+        op.create_index(op.f("ix_asn_mappings_id"), "asn_mappings", ["id"], unique=False)
+
+    if _missing("query_logs"):
+        op.create_table(
+            "query_logs",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("client_ip", sa.String(length=45), nullable=True),
+            sa.Column("domain", sa.String(length=255), nullable=False),
+            sa.Column("dns_server", sa.String(length=45), nullable=False),
+            sa.Column("response_time_ms", sa.Integer(), nullable=True),
+            sa.Column("success", sa.Boolean(), nullable=False),
+            sa.Column("error_message", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            op.f("ix_query_logs_created_at"), "query_logs", ["created_at"], unique=False
+        )
+        op.create_index(op.f("ix_query_logs_id"), "query_logs", ["id"], unique=False)
+
+    if _missing("catalog_version"):
+        op.create_table(
+            "catalog_version",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("catalog_version")
+    op.drop_index(op.f("ix_query_logs_id"), table_name="query_logs")
+    op.drop_index(op.f("ix_query_logs_created_at"), table_name="query_logs")
+    op.drop_table("query_logs")
+    op.drop_index(op.f("ix_asn_mappings_id"), table_name="asn_mappings")
+    op.drop_index(op.f("ix_asn_mappings_asn"), table_name="asn_mappings")
+    op.drop_table("asn_mappings")
+    op.drop_index(op.f("ix_dns_servers_id"), table_name="dns_servers")
+    op.drop_table("dns_servers")
+    op.drop_index(op.f("ix_isps_id"), table_name="isps")
+    op.drop_table("isps")
@@ -0,0 +1,168 @@
+"""partition query_logs and add query_log_rollups
+
+Self-contained on purpose: migrations must not import application code or
+settings, which change after the revision is written. Monthly partitions are
+created here; the maintenance task takes over from them (and switches to day
+partitions if QUERY_LOG_PARTITION_INTERVAL=day).
+
+Revision ID: 8a4e6c2f1d37
+Revises: 3f1c2a7d9b01
+Create Date: 2026-10-16 09:10:00.000000
+
+"""
+
+from collections.abc import Sequence
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8a4e6c2f1d37"
+down_revision: str | None = "3f1c2a7d9b01"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+COLUMNS = "id, client_ip, domain, dns_server, response_time_ms, success, error_message, created_at"
+PARTITIONS_AHEAD = 2  # months created beyond the current one
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(start: datetime) -> datetime:
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def _is_partitioned(bind: sa.engine.Connection) -> bool:
+    return bool(
+        bind.execute(
+            sa.text(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('query_logs')"
+            )
+        ).scalar()
+    )
+
+
+def _rename_legacy() -> None:
+    op.execute("ALTER TABLE query_logs RENAME TO query_logs_legacy")
+    op.execute(
+        "ALTER TABLE query_logs_legacy RENAME CONSTRAINT query_logs_pkey TO query_logs_legacy_pkey"
+    )
+    op.execute("ALTER INDEX ix_query_logs_created_at RENAME TO ix_query_logs_legacy_created_at")
+    op.execute("ALTER INDEX ix_query_logs_id RENAME TO ix_query_logs_legacy_id")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    # Already there if the database was created with create_all on the current models
+    if not sa.inspect(bind).has_table("query_log_rollups"):
+        op.create_table(
+            "query_log_rollups",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(), nullable=False),
+            sa.Column("dns_server", sa.String(length=45), nullable=False),
+            sa.Column("domain", sa.String(length=255), nullable=False),
+            sa.Column("query_count", sa.Integer(), nullable=False),
+            sa.Column("success_count", sa.Integer(), nullable=False),
+            sa.Column("latency_sum_ms", sa.BigInteger(), nullable=False),
+            sa.Column("latency_buckets", sa.JSON(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("bucket_start", "dns_server", "domain"),
+        )
+        op.create_index(
+            op.f("ix_query_log_rollups_bucket_start"),
+            "query_log_rollups",
+            ["bucket_start"],
+            unique=False,
+        )
+
+    if bind.dialect.name != "postgresql" or _is_partitioned(bind):
+        return
+
+    # Declarative partitioning needs the partition key in the primary key
+    _rename_legacy()
+    op.execute(
+        """
+        CREATE TABLE query_logs (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            client_ip VARCHAR(45),
+            domain VARCHAR(255) NOT NULL,
+            dns_server VARCHAR(45) NOT NULL,
+            response_time_ms INTEGER,
+            success BOOLEAN NOT NULL,
+            error_message TEXT,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("CREATE INDEX ix_query_logs_created_at ON query_logs (created_at)")
+    op.execute("CREATE TABLE query_logs_default PARTITION OF query_logs DEFAULT")
+
+    # Monthly partitions from the oldest legacy row through the look-ahead
+    now = bind.execute(sa.text("SELECT localtimestamp")).scalar_one()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM query_logs_legacy")).scalar() or now
+    last = _month_start(now)
+    for _ in range(PARTITIONS_AHEAD):
+        last = _next_month(last)
+
+    start = _month_start(oldest)
+    while start <= last:
+        end = _next_month(start)
+        op.execute(
+            f'CREATE TABLE "query_logs_p{start:%Y_%m}" PARTITION OF query_logs '
+            f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+        )
+        start = end
+
+    op.execute(
+        f"INSERT INTO query_logs ({COLUMNS}) OVERRIDING SYSTEM VALUE "
+        f"SELECT {COLUMNS} FROM query_logs_legacy"
+    )
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('query_logs', 'id'), "
+        "coalesce((SELECT max(id) FROM query_logs), 0) + 1, false)"
+    )
+    op.execute("DROP TABLE query_logs_legacy")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.execute("ALTER TABLE query_logs RENAME TO query_logs_partitioned")
+        op.execute(
+            "ALTER INDEX ix_query_logs_created_at RENAME TO ix_query_logs_partitioned_created_at"
+        )
+        op.create_table(
+            "query_logs",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("client_ip", sa.String(length=45), nullable=True),
+            sa.Column("domain", sa.String(length=255), nullable=False),
+            sa.Column("dns_server", sa.String(length=45), nullable=False),
+            sa.Column("response_time_ms", sa.Integer(), nullable=True),
+            sa.Column("success", sa.Boolean(), nullable=False),
+            sa.Column("error_message", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            op.f("ix_query_logs_created_at"), "query_logs", ["created_at"], unique=False
+        )
+        op.create_index(op.f("ix_query_logs_id"), "query_logs", ["id"], unique=False)
+        op.execute(
+            f"INSERT INTO query_logs ({COLUMNS}) SELECT {COLUMNS} FROM query_logs_partitioned"
+        )
+        op.execute(
+            "SELECT setval(pg_get_serial_sequence('query_logs', 'id'), "
+            "coalesce((SELECT max(id) FROM query_logs), 0) + 1, false)"
+        )
+        # Drops every partition with it
+        op.execute("DROP TABLE query_logs_partitioned")
+
+    op.drop_index(op.f("ix_query_log_rollups_bucket_start"), table_name="query_log_rollups")
+    op.drop_table("query_log_rollups")
@@ -0,0 +1,113 @@
+"""Concurrent /api/resolve throughput with and without a slow upstream.
+
+Starts two stub DNS servers on the same port: a fast one on 127.0.0.1 and a slow
+one on 127.0.0.2 (Linux routes all of 127.0.0.0/8 to loopback). The fast
+scenario is measured alone and then again while a steady stream of requests is
+stuck on the slow upstream. With a non-blocking resolver the two RPS figures
+should be close.
+
+Usage:
+    python -m benchmarks.bench_resolve --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import app_client, emit, summarize
+from benchmarks.stub_dns import StubDNSServer
+from src.core.config import settings
+from src.services.dns_service import DNSService
+
+FAST_SERVER = "127.0.0.1"
+SLOW_SERVER = "127.0.0.2"
+
+
+async def _drive(client, server: str, total: int, concurrency: int) -> dict:
+    """Send ``total`` resolve requests to ``server`` at fixed concurrency."""
+    latencies: list[float] = []
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        for i in remaining:
+            start = time.perf_counter()
+            await client.post(
+                "/api/resolve",
+                json={
+                    "domain": f"host{i}.bench.test",
+                    "dns_server": server,
+                    "record_type": "A",
+                    "no_cache": True,
+                },
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def _slow_background(client, concurrency: int, stop: asyncio.Event) -> None:
+    """Keep ``concurrency`` requests in flight against the slow upstream."""
+
+    async def worker() -> None:
+        while not stop.is_set():
+            await client.post(
+                "/api/resolve",
+                json={
+                    "domain": "slow.bench.test",
+                    "dns_server": SLOW_SERVER,
+                    "record_type": "A",
+                    "no_cache": True,
+                },
+            )
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def main(args: argparse.Namespace) -> None:
+    fast = await StubDNSServer(FAST_SERVER, slow_latency=0).start()
+    slow = await StubDNSServer(SLOW_SERVER, fast.port, latency=args.slow_latency).start()
+
+    settings.dns_port = fast.port
+    settings.dns_retries = 0
+    DNSService._resolvers.clear()
+
+    try:
+        async with app_client() as client:
+            # Warm up resolvers and the app
+            await _drive(client, FAST_SERVER, args.concurrency, args.concurrency)
+
+            fast_only = await _drive(client, FAST_SERVER, args.requests, args.concurrency)
+
+            stop = asyncio.Event()
+            background = asyncio.create_task(_slow_background(client, args.slow_concurrency, stop))
+            await asyncio.sleep(0.1)
+            with_slow = await _drive(client, FAST_SERVER, args.requests, args.concurrency)
+            stop.set()
+            await background
+    finally:
+        await fast.stop()
+        await slow.stop()
+
+    emit(
+        {
+            "benchmark": "resolve_slow_upstream",
+            "slow_latency_s": args.slow_latency,
+            "slow_concurrency": args.slow_concurrency,
+            "fast_only": fast_only,
+            "with_slow_upstream": with_slow,
+            "rps_ratio": round(with_slow["rps"] / fast_only["rps"], 3) if fast_only["rps"] else 0.0,
+        },
+        args.out,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--slow-concurrency", type=int, default=20)
+    parser.add_argument("--slow-latency", type=float, default=1.5)
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    asyncio.run(main(parser.parse_args()))
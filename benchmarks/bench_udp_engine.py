@@ -0,0 +1,148 @@
+"""Queries per second through the multiplexed UDP engine vs. a resolver per query.
+
+Runs a minimal echo-style DNS responder in a separate process (answers are
+built by patching the query bytes, so the stub is not the bottleneck) and then
+sends ``--queries`` lookups from this process at ``--concurrency`` in flight:
+
+- ``engine``: UDPQueryEngine.exchange on pre-encoded queries (the engine itself)
+- ``service_engine``: DNSService with the engine (parsing, result dicts)
+- ``service_resolver``: DNSService with dnspython's resolver, one socket per query
+
+The service runs cycle through ``--domains`` names with the answer cache off,
+like a probing job sending one domain list to many servers.
+
+Usage:
+    python -m benchmarks.bench_udp_engine --queries 50000 --concurrency 500
+"""
+
+import argparse
+import asyncio
+import contextlib
+import multiprocessing
+import socket
+import time
+
+import dns.exception
+import dns.message
+
+from benchmarks.common import emit
+from src.core.config import settings
+from src.services.dns_service import DNSService
+from src.services.udp_engine import UDPQueryEngine
+
+# Answer RR: pointer to the question name, type A, class IN, TTL 300, 127.0.0.1
+_ANSWER = b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x01\x2c\x00\x04\x7f\x00\x00\x01"
+
+
+def raw_answer(query: bytes) -> bytes:
+    """Turn a single-question A query into a one-answer response without parsing it."""
+    end = 12
+    while query[end]:
+        end += query[end] + 1
+    end += 5  # root label, qtype, qclass
+    flags = bytes([query[2] | 0x80, 0x80])  # QR, keep RD; RA
+    return query[:2] + flags + b"\x00\x01\x00\x01\x00\x00\x00\x00" + query[12:end] + _ANSWER
+
+
+def _serve(port_out: "multiprocessing.Queue") -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind(("127.0.0.1", 0))
+    port_out.put(sock.getsockname()[1])
+    while True:
+        data, addr = sock.recvfrom(4096)
+        with contextlib.suppress(IndexError, OSError):
+            sock.sendto(raw_answer(data), addr)
+
+
+async def _run(send, total: int, concurrency: int) -> dict:
+    """Issue ``total`` lookups through ``send(i)`` with ``concurrency`` in flight."""
+    remaining = iter(range(total))
+    failures = 0
+
+    async def worker() -> None:
+        nonlocal failures
+        for i in remaining:
+            if not await send(i):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": total,
+        "failures": failures,
+        "elapsed_s": round(elapsed, 3),
+        "qps": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    port_out: multiprocessing.Queue = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=_serve, args=(port_out,), daemon=True)
+    stub.start()
+    settings.dns_port = port_out.get(timeout=10)
+    settings.dns_retries = 0
+    settings.dns_cache_enabled = False
+
+    engine = UDPQueryEngine()
+
+    # Engine only: queries are encoded up front, responses are not parsed
+    wires = [
+        dns.message.make_query(f"host{i}.bench.test", "A").to_wire()
+        for i in range(max(args.queries, args.concurrency))
+    ]
+
+    async def engine_send(i: int) -> bool:
+        try:
+            await engine.exchange("127.0.0.1", wires[i], settings.dns_timeout)
+            return True
+        except dns.exception.DNSException:
+            return False
+
+    async def service_send(i: int) -> bool:
+        domain = f"host{i % args.domains}.bench.test"
+        result = await DNSService.resolve_domain(domain, "127.0.0.1", "A")
+        return result["success"]
+
+    report: dict = {
+        "benchmark": "udp_engine",
+        "concurrency": args.concurrency,
+        "domains": args.domains,
+    }
+    try:
+        await _run(engine_send, args.concurrency, args.concurrency)  # warm up
+        report["engine"] = await _run(engine_send, args.queries, args.concurrency)
+        report["engine"]["stats"] = engine.stats()
+
+        settings.dns_udp_engine_enabled = True
+        report["service_engine"] = await _run(service_send, args.queries, args.concurrency)
+
+        settings.dns_udp_engine_enabled = False
+        resolver_queries = min(args.queries, args.resolver_queries)
+        report["service_resolver"] = await _run(service_send, resolver_queries, args.concurrency)
+    finally:
+        await engine.close()
+        stub.terminate()
+
+    report["speedup"] = (
+        round(report["service_engine"]["qps"] / report["service_resolver"]["qps"], 2)
+        if report["service_resolver"]["qps"]
+        else 0.0
+    )
+    emit(report, args.out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--domains", type=int, default=1000)
+    parser.add_argument(
+        "--resolver-queries",
+        type=int,
+        default=10000,
+        help="Cap for the (slow) resolver-per-query baseline",
+    )
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Shared helpers for benchmark scripts."""
+
+import json
+import math
+import subprocess
+import tempfile
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.core.database import Base, get_db
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of ``samples`` (0 < pct <= 100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies_ms: list[float], elapsed_s: float) -> dict:
+    """Summarize a run as RPS and latency percentiles."""
+    return {
+        "requests": len(latencies_ms),
+        "elapsed_s": round(elapsed_s, 3),
+        "rps": round(len(latencies_ms) / elapsed_s, 1) if elapsed_s > 0 else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+    }
+
+
+def emit(report: dict, out: str | None = None) -> None:
+    """Print a report as JSON and optionally write it to ``out``."""
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if out:
+        Path(out).write_text(text + "\n", encoding="utf-8")
+
+
+def git_commit() -> str | None:
+    """HEAD commit of the checkout, so reports can be compared across commits."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+@asynccontextmanager
+async def app_client() -> AsyncGenerator[AsyncClient]:
+    """In-process client for the app backed by a throwaway SQLite file."""
+    from src.main import app
+
+    tmpdir = tempfile.TemporaryDirectory(prefix="kresolver-bench-")
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmpdir.name}/bench.db",
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db() -> AsyncGenerator[AsyncSession]:
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+        tmpdir.cleanup()
@@ -0,0 +1,419 @@
+"""Microbenchmarks for the per-request CPU hot paths, with stored baselines.
+
+Each benchmark times one small operation in-process (no network, no
+database): response model construction, DNS answer extraction, catalog
+snapshot builds and IP to ASN lookups. A result is the best per-operation
+time over ``--rounds`` rounds, each auto-sized to run for at least
+``--min-time`` seconds, which is far less noisy than a mean.
+
+Baselines live in ``benchmarks/baselines/micro.json``. ``compare`` runs the
+suite (or reads a previous ``run --out`` file) and exits with status 1 when
+any benchmark is slower than its baseline by more than ``--threshold``.
+Baselines are machine-specific: regenerate them with ``--save-baseline`` on
+the machine that runs the comparison. On a shared or throttled machine,
+round-to-round noise of 10-20% is normal, hence the 25% default threshold.
+
+Usage:
+    python -m benchmarks.micro run --filter asn --out micro.json
+    python -m benchmarks.micro run --save-baseline
+    python -m benchmarks.micro compare --threshold 0.15
+    python -m benchmarks.micro compare micro.json
+"""
+
+import argparse
+import ipaddress
+import json
+import platform
+import random
+import re
+import sys
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import dns.message
+import dns.rrset
+from pydantic import TypeAdapter
+
+from benchmarks.common import ROOT, emit, git_commit
+from src.api.schemas import DNSResolveResponse, DNSServerResponse, ISPWithDNS
+from src.models.dns import ISP, ASNMapping, DNSServer
+from src.services.asn_client import ASNLookupClient
+from src.services.asn_index import PrefixIndex
+from src.services.catalog import CatalogSnapshot, ISPEntry
+from src.services.dns_service import DNSService
+
+BASELINE = ROOT / "benchmarks" / "baselines" / "micro.json"
+
+# name -> setup; setup builds fixtures and returns the operation to time
+Operation = Callable[[], Any]
+BENCHMARKS: dict[str, Callable[[], Operation]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Operation]], Callable[[], Operation]]:
+    def register(setup: Callable[[], Operation]) -> Callable[[], Operation]:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+# Fixtures
+
+
+def make_isps(count: int = 8, servers_per_isp: int = 4) -> list[ISP]:
+    """Transient ORM objects shaped like the seeded catalog."""
+    now = datetime(2024, 1, 1, tzinfo=UTC)
+    isps = []
+    for i in range(1, count + 1):
+        isp = ISP(
+            id=i,
+            name=f"ISP {i}",
+            name_en=f"ISP {i}",
+            country="KR",
+            isp_type="landline",
+            is_active=True,
+            created_at=now,
+            updated_at=now,
+        )
+        isp.dns_servers = [
+            DNSServer(
+                id=i * 100 + j,
+                isp_id=i,
+                ip_address=f"10.{i}.0.{j + 1}",
+                priority=j % 2 + 1,
+                region="서울",
+                server_type="standard",
+                doh_url=None,
+                dot_hostname=None,
+                is_anycast=False,
+                is_active=True,
+                notes=None,
+                created_at=now,
+                updated_at=now,
+            )
+            for j in range(servers_per_isp)
+        ]
+        isps.append(isp)
+    return isps
+
+
+def make_mappings(isps: list[ISP], per_isp: int = 4) -> list[ASNMapping]:
+    return [
+        ASNMapping(id=isp.id * 10 + k, asn=64500 + isp.id * 10 + k, isp_id=isp.id)
+        for isp in isps
+        for k in range(per_isp)
+    ]
+
+
+def make_response(qname: str, addresses: int = 4, cname: bool = False) -> dns.message.Message:
+    """A parsed upstream response, optionally answering through one CNAME."""
+    query = dns.message.make_query(qname, "A")
+    response = dns.message.make_response(query)
+    qname = target = query.question[0].name.to_text()
+    if cname:
+        target = f"edge.{qname}"
+        response.answer.append(dns.rrset.from_text(qname, 300, "IN", "CNAME", target))
+    response.answer.append(
+        dns.rrset.from_text(target, 60, "IN", "A", *(f"192.0.2.{i + 1}" for i in range(addresses)))
+    )
+    # Round-trip so the message looks like one read off the wire
+    return dns.message.from_wire(response.to_wire())
+
+
+def make_prefixes(count: int, seed: int = 1) -> list[tuple[str, int, str]]:
+    """Random IPv4 and IPv6 prefixes, nested often enough to exercise longest match."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        if i % 4 == 3:
+            length = rng.choice((32, 40, 48))
+            network = ipaddress.IPv6Network((rng.getrandbits(128), length), strict=False)
+        else:
+            length = rng.choice((8, 12, 16, 20, 22, 24))
+            network = ipaddress.IPv4Network((rng.getrandbits(32), length), strict=False)
+        asn = 64512 + i % 1000
+        entries.append((str(network), asn, f"AS{asn}"))
+    return entries
+
+
+def sample_addresses(entries: list[tuple[str, int, str]], count: int, seed: int = 2) -> list[str]:
+    """Addresses inside random prefixes of ``entries``."""
+    rng = random.Random(seed)
+    addresses = []
+    for prefix, _, _ in rng.sample(entries, count):
+        network = ipaddress.ip_network(prefix)
+        addresses.append(str(network[rng.randrange(min(network.num_addresses, 1 << 16))]))
+    return addresses
+
+
+def cycle(values: list) -> Callable[[], Any]:
+    """Return a zero-argument callable yielding ``values`` round-robin."""
+    state = {"i": 0}
+    size = len(values)
+
+    def next_value() -> Any:
+        i = state["i"]
+        state["i"] = (i + 1) % size
+        return values[i]
+
+    return next_value
+
+
+# Response models
+
+
+@benchmark("schema.isp_with_dns.from_orm")
+def _isp_from_orm() -> Operation:
+    isp = make_isps(1)[0]
+    return lambda: ISPWithDNS.model_validate(isp)
+
+
+@benchmark("schema.isp_with_dns.from_snapshot")
+def _isp_from_snapshot() -> Operation:
+    entry = ISPEntry.from_orm(make_isps(1)[0])
+    return lambda: ISPWithDNS.model_validate(entry)
+
+
+@benchmark("schema.dns_server_response.from_orm")
+def _server_from_orm() -> Operation:
+    server = make_isps(1)[0].dns_servers[0]
+    return lambda: DNSServerResponse.model_validate(server)
+
+
+@benchmark("schema.isp_list.validate_and_dump_json")
+def _isp_list_json() -> Operation:
+    # What GET /api/isps does with the handler's return value
+    adapter = TypeAdapter(list[ISPWithDNS])
+    entries = [ISPEntry.from_orm(isp) for isp in make_isps()]
+    return lambda: adapter.dump_json(adapter.validate_python(entries, from_attributes=True))
+
+
+@benchmark("schema.resolve_response.build_and_dump_json")
+def _resolve_response() -> Operation:
+    result = DNSService._result(
+        "www.example.com",
+        "10.1.0.1",
+        "A",
+        time.perf_counter(),
+        answers=[f"192.0.2.{i}" for i in range(1, 5)],
+    )
+    result.update(cached=True, ttl_remaining=42)
+    return lambda: DNSResolveResponse(**result).model_dump_json()
+
+
+# DNS answer extraction
+
+
+@benchmark("dns.parse_response.a")
+def _parse_a() -> Operation:
+    response = make_response("www.example.com")
+    return lambda: DNSService._parse_response(response)
+
+
+@benchmark("dns.parse_response.cname")
+def _parse_cname() -> Operation:
+    response = make_response("www.example.com", cname=True)
+    return lambda: DNSService._parse_response(response)
+
+
+@benchmark("dns.parse_response.from_wire")
+def _parse_wire() -> Operation:
+    wire = make_response("www.example.com").to_wire()
+    return lambda: DNSService._parse_response(dns.message.from_wire(wire))
+
+
+# Catalog
+
+
+@benchmark("catalog.snapshot_build")
+def _snapshot_build() -> Operation:
+    isps = make_isps()
+    mappings = make_mappings(isps)
+    return lambda: CatalogSnapshot.build(1, isps, mappings)
+
+
+# IP to ASN
+
+
+def _index_lookup(family: str) -> Operation:
+    entries = make_prefixes(20_000)
+    index = PrefixIndex.build(entries)
+    addresses = [
+        address
+        for address in sample_addresses(entries, 2_000)
+        if (":" in address) == (family == "v6")
+    ]
+    next_address = cycle(addresses)
+    return lambda: index.lookup(next_address())
+
+
+@benchmark("asn.index_lookup.v4")
+def _index_lookup_v4() -> Operation:
+    return _index_lookup("v4")
+
+
+@benchmark("asn.index_lookup.v6")
+def _index_lookup_v6() -> Operation:
+    return _index_lookup("v6")
+
+
+@benchmark("asn.lookup_many.v4_1000")
+def _lookup_many_v4() -> Operation:
+    entries = make_prefixes(20_000)
+    index = PrefixIndex.build(entries)
+    addresses = [address for address in sample_addresses(entries, 2_000) if ":" not in address]
+    batch = addresses[:1000]
+    return lambda: index.lookup_many(batch)
+
+
+@benchmark("asn.cache_hit")
+def _asn_cache_hit() -> Operation:
+    client = ASNLookupClient()
+    entries = make_prefixes(2_000)
+    index = PrefixIndex.build(entries)
+    addresses = sample_addresses(entries, 500)
+    for address in addresses:
+        client._store(address, index.lookup(address))
+    next_address = cycle(addresses)
+    return lambda: client._cached(next_address())
+
+
+# Runner
+
+
+def measure(operation: Operation, rounds: int, min_time: float) -> float:
+    """Best nanoseconds per call over ``rounds`` rounds of at least ``min_time`` seconds."""
+    number = 1
+    while True:  # Size a round like timeit.autorange
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            operation()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time * 1e9:
+            break
+        number *= 2 if elapsed * 10 > min_time * 1e9 else 10
+
+    best = elapsed / number
+    for _ in range(rounds - 1):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            operation()
+        best = min(best, (time.perf_counter_ns() - start) / number)
+    return best
+
+
+def run(pattern: str | None, rounds: int, min_time: float) -> dict[str, dict]:
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        ns = measure(setup(), rounds, min_time)
+        results[name] = {"ns_per_op": round(ns, 1), "ops_per_s": round(1e9 / ns, 1)}
+        print(f"  {name:45s} {ns / 1000:10.2f} µs", file=sys.stderr)
+    return results
+
+
+def compare(
+    current: dict[str, dict], baseline: dict[str, dict], threshold: float
+) -> tuple[list[dict], bool]:
+    """Rows comparing ``current`` to ``baseline`` and whether any regressed past ``threshold``."""
+    rows = []
+    regressed = False
+    for name in sorted(current.keys() | baseline.keys()):
+        now = current.get(name, {}).get("ns_per_op")
+        then = baseline.get(name, {}).get("ns_per_op")
+        if now is None or then is None:
+            status = "missing" if now is None else "new"
+            change = None
+        else:
+            change = now / then - 1
+            if change > threshold:
+                status = "regressed"
+                regressed = True
+            elif change < -threshold:
+                status = "improved"
+            else:
+                status = "ok"
+        rows.append(
+            {
+                "name": name,
+                "baseline_ns": then,
+                "current_ns": now,
+                "change": None if change is None else round(change, 4),
+                "status": status,
+            }
+        )
+    return rows, regressed
+
+
+def report(results: dict[str, dict], args: argparse.Namespace) -> dict:
+    return {
+        "benchmark": "micro",
+        "commit": git_commit(),
+        "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {"rounds": args.rounds, "min_time_s": args.min_time},
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite and print JSON")
+    run_parser.add_argument("--out", help="Also write the JSON report to this file")
+    run_parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help=f"Write the report to {BASELINE.relative_to(ROOT)}",
+    )
+
+    compare_parser = commands.add_parser("compare", help="Compare against the stored baseline")
+    compare_parser.add_argument(
+        "results", nargs="?", help="Report from `run --out` (default: run now)"
+    )
+    compare_parser.add_argument("--baseline", type=Path, default=BASELINE)
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Allowed slowdown as a fraction (0.25 = 25%%)"
+    )
+
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--filter", help="Regex selecting benchmark names")
+        sub.add_argument("--rounds", type=int, default=5)
+        sub.add_argument("--min-time", type=float, default=0.2, help="Seconds per round")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        result = report(run(args.filter, args.rounds, args.min_time), args)
+        emit(result, args.out)
+        if args.save_baseline:
+            BASELINE.parent.mkdir(parents=True, exist_ok=True)
+            BASELINE.write_text(
+                json.dumps(result, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
+            )
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    if args.results:
+        current = json.loads(Path(args.results).read_text(encoding="utf-8"))["results"]
+    else:
+        current = run(args.filter, args.rounds, args.min_time)
+    if args.filter:
+        baseline = {name: value for name, value in baseline.items() if re.search(args.filter, name)}
+        current = {name: value for name, value in current.items() if re.search(args.filter, name)}
+
+    rows, regressed = compare(current, baseline, args.threshold)
+    for row in rows:
+        change = "" if row["change"] is None else f"{row['change']:+.1%}"
+        print(f"{row['status']:10s} {row['name']:45s} {change}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Local stub DNS server for benchmarks and tests."""
+
+import asyncio
+import contextlib
+import random
+import ssl
+
+import dns.flags
+import dns.message
+import dns.name
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+
+STUB_ANSWERS = {
+    dns.rdatatype.A: "127.0.0.1",
+    dns.rdatatype.AAAA: "::1",
+}
+
+
+def build_response(query: dns.message.Message, ttl: int = 300) -> dns.message.Message:
+    """Build a canned answer for a query.
+
+    Names whose first label is ``nx`` get NXDOMAIN, record types without a canned
+    answer get NODATA. Negative answers carry an SOA in the authority section.
+    """
+    response = dns.message.make_response(query)
+    response.flags |= dns.flags.RA
+    question = query.question[0]
+
+    if question.name.labels[0] == b"nx":
+        response.set_rcode(dns.rcode.NXDOMAIN)
+    elif question.rdtype in STUB_ANSWERS:
+        response.answer.append(
+            dns.rrset.from_text(
+                question.name,
+                ttl,
+                dns.rdataclass.IN,
+                question.rdtype,
+                STUB_ANSWERS[question.rdtype],
+            )
+        )
+        return response
+
+    zone = question.name.parent() if len(question.name) > 2 else question.name
+    response.authority.append(
+        dns.rrset.from_text(
+            zone,
+            ttl,
+            dns.rdataclass.IN,
+            dns.rdatatype.SOA,
+            f"ns.{zone} hostmaster.{zone} 1 3600 600 86400 60",
+        )
+    )
+    return response
+
+
+class _StubProtocol(asyncio.DatagramProtocol):
+    """UDP protocol answering every query from build_response."""
+
+    def __init__(self, server: "StubDNSServer") -> None:
+        self.server = server
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        try:
+            query = dns.message.from_wire(data)
+        except Exception:
+            return
+
+        self.server.queries += 1
+        if self.server.loss and random.random() < self.server.loss:
+            self.server.dropped += 1
+            return
+        truncate = self.server.truncate and random.random() < self.server.truncate
+        if truncate or query.question[0].name.labels[0] == b"tc":
+            self.server.truncated += 1
+            response = dns.message.make_response(query)
+            response.flags |= dns.flags.RA | dns.flags.TC
+            wire = response.to_wire()
+        else:
+            wire = build_response(query, self.server.ttl).to_wire()
+        delay = self.server.latency_for(query.question[0].name)
+
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._send, wire, addr)
+        else:
+            self._send(wire, addr)
+
+    def _send(self, wire: bytes, addr: tuple) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(wire, addr)
+
+
+class StubDNSServer:
+    """Minimal asyncio DNS server (UDP and TCP on one port) with configurable latency.
+
+    ``latency`` applies to every query; queries whose first label is ``slow``
+    additionally wait ``slow_latency`` seconds, so a single stub can serve both
+    fast and slow names. Over UDP, names whose first label is ``tc`` get an
+    empty truncated response, so clients have to retry over TCP.
+
+    ``loss`` and ``truncate`` are probabilities of silently dropping a UDP
+    query or answering it truncated, for load tests against a lossy upstream.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        slow_latency: float = 1.0,
+        ttl: int = 300,
+        loss: float = 0.0,
+        truncate: float = 0.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.slow_latency = slow_latency
+        self.ttl = ttl
+        self.loss = loss
+        self.truncate = truncate
+        self.queries = 0
+        self.dropped = 0
+        self.truncated = 0
+        self.connections = 0
+        self._transport: asyncio.DatagramTransport | None = None
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    def latency_for(self, qname: dns.name.Name) -> float:
+        """Return the response delay for a query name."""
+        if qname.labels and qname.labels[0] == b"slow":
+            return self.latency + self.slow_latency
+        return self.latency
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve length-prefixed queries on one stream connection.
+
+        Queries are answered concurrently, so slow names come back after faster
+        ones sent later (out-of-order pipelining).
+        """
+        self.connections += 1
+        self._writers.add(writer)
+        lock = asyncio.Lock()
+        tasks: set[asyncio.Task] = set()
+
+        async def answer(query: dns.message.Message) -> None:
+            delay = self.latency_for(query.question[0].name)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            wire = build_response(query, self.ttl).to_wire()
+            async with lock:
+                writer.write(len(wire).to_bytes(2, "big") + wire)
+                await writer.drain()
+
+        try:
+            with contextlib.suppress(asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+                while True:
+                    length = int.from_bytes(await reader.readexactly(2), "big")
+                    query = dns.message.from_wire(await reader.readexactly(length))
+                    self.queries += 1
+                    task = asyncio.ensure_future(answer(query))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._writers.discard(writer)
+            writer.close()
+
+    def drop_connections(self) -> None:
+        """Close every stream client connection (the listeners stay up)."""
+        for writer in list(self._writers):
+            writer.close()
+
+    async def start(self) -> "StubDNSServer":
+        """Bind the UDP socket and TCP listener; picks a free port when ``port`` is 0."""
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _StubProtocol(self), local_addr=(self.host, self.port)
+        )
+        self._transport = transport
+        self.port = transport.get_extra_info("sockname")[1]
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self
+
+    async def stop(self) -> None:
+        """Close the UDP socket, the TCP listener and client connections."""
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        if self._server is not None:
+            self._server.close()
+            self.drop_connections()
+            self._server = None
+
+    async def __aenter__(self) -> "StubDNSServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.stop()
+
+
+class StubDoTServer(StubDNSServer):
+    """Minimal DNS-over-TLS server answering from build_response.
+
+    Serves the same pipelined stream protocol as the TCP listener, over TLS.
+    Needs a certificate chain and key for the TLS context.
+    """
+
+    def __init__(
+        self, certfile: str, keyfile: str, host: str = "127.0.0.1", **kwargs: float
+    ) -> None:
+        super().__init__(host, **kwargs)  # type: ignore[arg-type]
+        self._context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self._context.load_cert_chain(certfile, keyfile)
+
+    async def start(self) -> "StubDoTServer":
+        """Start listening; picks a free port when ``port`` is 0."""
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, ssl=self._context
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
@@ -0,0 +1,457 @@
+"""Benchmark every ISP resolver in the catalog from this host (namebench-style).
+
+Loads the ISP/DNS catalog from the database or from an export (the JSON of
+``GET /api/isps?include_inactive=true``), reads a domain list and queries each
+domain on every active DNS server through ``DNSService.resolve_domain``, the
+same path as ``/api/resolve`` with ``no_cache``. Queries are paced per server
+(``--qps``) under a global cap on queries in flight.
+
+The list is queried twice: the cold pass also warms the resolvers' caches, so
+the warm pass measures cached answers. The report has per-server latency
+percentiles of answered queries, failure rates and answer disagreements.
+
+Usage:
+    python scripts/benchmark_resolvers.py domains.txt
+    python scripts/benchmark_resolvers.py top-1m.csv --limit 10000 --qps 50 --out run.json
+    python scripts/benchmark_resolvers.py domains.txt --catalog catalog.json --isp KT --isp 2
+    python scripts/benchmark_resolvers.py --export-catalog catalog.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.common import percentile
+from src.api.schemas import ISPWithDNS
+from src.core.config import settings
+from src.models.dns import ISP, DNSServer
+from src.services.catalog import CatalogSnapshot, DNSServerEntry, ISPEntry, catalog_store
+from src.services.dns_service import DNSService
+from src.services.dns_transports import doh_client, dot_pool
+from src.services.udp_engine import udp_engine
+
+PASSES = ("cold", "warm")
+PERCENTILES = (50, 90, 95, 99)
+
+catalog_adapter = TypeAdapter(list[ISPWithDNS])
+
+
+def read_domains(path: str, limit: int | None) -> list[str]:
+    """Domains from a list, one per line; ``rank,domain`` rows (top-sites CSVs) are accepted."""
+    domains: dict[str, None] = {}
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            domain = line.rsplit(",", 1)[-1].strip().rstrip(".").lower()
+            if domain:
+                domains[domain] = None
+            if limit and len(domains) >= limit:
+                break
+    return list(domains)
+
+
+def load_catalog_file(path: str) -> CatalogSnapshot:
+    """Build a snapshot from an exported ``/api/isps`` response."""
+    isps = [
+        ISP(
+            **isp.model_dump(exclude={"dns_servers"}),
+            dns_servers=[DNSServer(**server.model_dump()) for server in isp.dns_servers],
+        )
+        for isp in catalog_adapter.validate_json(Path(path).read_bytes())
+    ]
+    return CatalogSnapshot.build(0, isps, [])
+
+
+async def load_catalog(path: str | None) -> CatalogSnapshot:
+    """Catalog from an export file, or from the database; served to DNSService either way."""
+    if path:
+        catalog = load_catalog_file(path)
+        catalog_store.set(catalog)
+        return catalog
+
+    from src.core.database import AsyncSessionLocal, engine
+
+    try:
+        async with AsyncSessionLocal() as db:
+            return await catalog_store.refresh(db)
+    finally:
+        await engine.dispose()
+
+
+def select_servers(
+    catalog: CatalogSnapshot, isp_filters: list[str]
+) -> list[tuple[DNSServerEntry, list[ISPEntry]]]:
+    """Active servers of the active (and selected) ISPs, once per address."""
+    isps = [isp for isp in catalog.isps if isp.is_active]
+    if isp_filters:
+        wanted = {value.lower() for value in isp_filters}
+        isps = [
+            isp
+            for isp in isps
+            if wanted & {str(isp.id), isp.name.lower(), (isp.name_en or "").lower()}
+        ]
+
+    servers: dict[str, tuple[DNSServerEntry, list[ISPEntry]]] = {}
+    for isp in isps:
+        for server in isp.dns_servers:
+            if server.is_active:
+                servers.setdefault(server.ip_address, (server, []))[1].append(isp)
+    return list(servers.values())
+
+
+class Pacer:
+    """Spaces calls evenly at ``rate`` per second."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.next = time.perf_counter()
+
+    async def wait(self) -> None:
+        now = time.perf_counter()
+        start = max(now, self.next)
+        self.next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+@dataclass(slots=True)
+class Outcome:
+    """What one query returned, without the full result dict."""
+
+    kind: str  # "answers", "negative" (NXDOMAIN/NODATA), "failed" or "rejected" (circuit open)
+    response_time_ms: int
+    answers: tuple[str, ...] = ()
+    error_message: str | None = None
+
+    @classmethod
+    def from_result(cls, result: dict) -> "Outcome":
+        if result["success"]:
+            kind = "answers"
+        elif result["negative"]:
+            kind = "negative"
+        else:
+            kind = "rejected" if "retry_after" in result else "failed"
+        answers = tuple(result["answers"])
+        return cls(kind, result["response_time_ms"], answers, result["error_message"])
+
+    @property
+    def answered(self) -> bool:
+        return self.kind in ("answers", "negative")
+
+
+async def run_pass(
+    domains: list[str],
+    servers: list[str],
+    args: argparse.Namespace,
+    label: str,
+) -> dict[str, list[Outcome]]:
+    """Query every domain on every server; outcomes per server in domain order."""
+    results: dict[str, list[Outcome | None]] = {server: [None] * len(domains) for server in servers}
+    in_flight = asyncio.Semaphore(args.concurrency)
+    done = 0
+    total = len(domains) * len(servers)
+    last_report = time.perf_counter()
+
+    async def query(server: str, i: int) -> None:
+        nonlocal done, last_report
+        try:
+            result = await DNSService.resolve_domain(
+                domains[i], server, args.record_type, use_cache=False, transport=args.transport
+            )
+            results[server][i] = Outcome.from_result(result)
+        finally:
+            in_flight.release()
+        done += 1
+        now = time.perf_counter()
+        if now - last_report >= args.progress_interval > 0:
+            last_report = now
+            print(f"⏳ {label}: {done:,}/{total:,} queries", file=sys.stderr)
+
+    async def run_server(server: str) -> None:
+        pacer = Pacer(args.qps)
+        tasks = []
+        for i in range(len(domains)):
+            await pacer.wait()
+            await in_flight.acquire()
+            tasks.append(asyncio.ensure_future(query(server, i)))
+        await asyncio.gather(*tasks)
+
+    await asyncio.gather(*(run_server(server) for server in servers))
+    return results
+
+
+def summarize_pass(results: list[Outcome]) -> dict:
+    """Latency percentiles of answered queries and failure counts."""
+    latencies = [float(result.response_time_ms) for result in results if result.answered]
+    failed = [result for result in results if not result.answered]
+    rejected = sum(1 for result in failed if result.kind == "rejected")
+    summary = {
+        "queries": len(results),
+        "answered": len(latencies),
+        "failed": len(failed),
+        "rejected": rejected,
+        "failure_rate": round(len(failed) / len(results), 4) if results else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "min_ms": min(latencies) if latencies else None,
+        "max_ms": max(latencies) if latencies else None,
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = percentile(latencies, pct) if latencies else None
+    return summary
+
+
+def find_disagreements(domains: list[str], results: dict[str, list[Outcome]]) -> list[dict]:
+    """Domains where some servers' answers differ from the majority.
+
+    A server disagrees when it answers negatively while most answer with
+    records (or the reverse), or when its records share nothing with the
+    majority's. Answers that merely differ (CDN nodes, rotation) but overlap
+    are not counted. Servers that did not answer are left out. When the top
+    outcome or the top group of overlapping answers is tied there is no
+    majority (``majority_servers`` is 0) and every answering server is listed.
+    """
+    disagreements = []
+    for i, domain in enumerate(domains):
+        outcomes: dict[str, list[tuple[str, Outcome]]] = {}
+        for server, server_results in results.items():
+            if server_results[i].answered:
+                outcomes.setdefault(server_results[i].kind, []).append((server, server_results[i]))
+        if not outcomes:
+            continue
+
+        top = max(len(group) for group in outcomes.values())
+        leaders = [kind for kind, group in outcomes.items() if len(group) == top]
+        majority_kind = leaders[0] if len(leaders) == 1 else None
+        majority_answers: set[str] = set()
+        if majority_kind == "answers":
+            # Answer sets that share an address agree: group them, the largest group wins
+            groups: list[tuple[set[str], int]] = []
+            for _, outcome in outcomes["answers"]:
+                answers, count = set(outcome.answers), 1
+                for merged in [g for g in groups if not g[0].isdisjoint(answers)]:
+                    groups.remove(merged)
+                    answers |= merged[0]
+                    count += merged[1]
+                groups.append((answers, count))
+            top = max(count for _, count in groups)
+            tied = [answers for answers, count in groups if count == top]
+            if len(tied) == 1:
+                majority_answers = tied[0]
+            else:
+                majority_kind = None  # Equally large groups that share nothing
+
+        dissenting = [
+            {
+                "dns_server": server,
+                "answers": list(outcome.answers) if kind == "answers" else None,
+                "error_message": outcome.error_message,
+            }
+            for kind, group in outcomes.items()
+            for server, outcome in group
+            if majority_kind is None
+            or kind != majority_kind
+            or (kind == "answers" and majority_answers.isdisjoint(outcome.answers))
+        ]
+        if dissenting:
+            disagreements.append(
+                {
+                    "domain": domain,
+                    "majority": sorted(majority_answers) if majority_kind == "answers" else None,
+                    "majority_servers": len(outcomes[majority_kind]) if majority_kind else 0,
+                    "dissenting": dissenting,
+                }
+            )
+    return disagreements
+
+
+def build_report(
+    domains: list[str],
+    servers: list[tuple[DNSServerEntry, list[ISPEntry]]],
+    transports: dict[str, str],
+    passes: dict[str, dict[str, list[Outcome]]],
+    args: argparse.Namespace,
+    started_at: datetime,
+    elapsed_s: float,
+) -> dict:
+    disagreements = find_disagreements(domains, passes["cold"])
+    dissent_counts: dict[str, int] = {}
+    for item in disagreements:
+        for server in item["dissenting"]:
+            dissent_counts[server["dns_server"]] = dissent_counts.get(server["dns_server"], 0) + 1
+
+    rows = []
+    for server, isps in servers:
+        address = server.ip_address
+        rows.append(
+            {
+                "dns_server": address,
+                "isps": [isp.name for isp in isps],
+                "transport": transports[address],
+                **{name: summarize_pass(by_server[address]) for name, by_server in passes.items()},
+                "disagreements": dissent_counts.get(address, 0),
+            }
+        )
+    # Fastest cold median first; servers that mostly fail go last
+    rows.sort(
+        key=lambda row: (
+            (row["cold"]["failure_rate"] or 0) >= 0.5,
+            row["cold"]["p50_ms"] if row["cold"]["p50_ms"] is not None else float("inf"),
+        )
+    )
+
+    return {
+        "started_at": started_at.isoformat(),
+        "elapsed_s": round(elapsed_s, 1),
+        "config": {
+            "domains": len(domains),
+            "servers": len(servers),
+            "record_type": args.record_type,
+            "transport": args.transport,
+            "qps_per_server": args.qps,
+            "concurrency": args.concurrency,
+            "dns_timeout": settings.dns_timeout,
+            "dns_retries": settings.dns_retries,
+        },
+        "servers": rows,
+        "disagreements": disagreements,
+    }
+
+
+def _width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+
+
+def _cell(value: object, width: int, align_left: bool = False) -> str:
+    text = "-" if value is None else str(value)
+    pad = " " * max(0, width - _width(text))
+    return text + pad if align_left else pad + text
+
+
+def print_table(report: dict, max_disagreements: int) -> None:
+    columns = [("Server", 16, True), ("ISP", 18, True)]
+    columns += [(f"{name} {stat}", 9, False) for name in PASSES for stat in ("p50", "p95")]
+    columns += [("Fail%", 6, False), ("Diff", 5, False)]
+    print("  ".join(_cell(title, width, left) for title, width, left in columns))
+
+    for row in report["servers"]:
+        queries = row["cold"]["queries"] + row["warm"]["queries"]
+        failed = row["cold"]["failed"] + row["warm"]["failed"]
+        values = [row["dns_server"], ", ".join(row["isps"])]
+        values += [row[name][f"{stat}_ms"] for name in PASSES for stat in ("p50", "p95")]
+        values += [f"{failed / queries:.1%}" if queries else None, row["disagreements"]]
+        cells = zip(values, columns, strict=True)
+        print("  ".join(_cell(value, width, left) for value, (_, width, left) in cells))
+
+    disagreements = report["disagreements"]
+    if disagreements and max_disagreements > 0:
+        print(f"\n⚠️  Answer disagreements: {len(disagreements)} domains")
+        for item in disagreements[:max_disagreements]:
+            if not item["majority_servers"]:
+                majority = "none"
+            else:
+                majority = ", ".join(item["majority"]) if item["majority"] else "negative answer"
+            print(f"  {item['domain']}  (majority: {majority})")
+            for server in item["dissenting"]:
+                answer = server["error_message"]
+                if server["answers"] is not None:
+                    answer = ", ".join(server["answers"])
+                print(f"    {server['dns_server']}: {answer}")
+
+
+async def run(args: argparse.Namespace) -> dict | None:
+    try:
+        catalog = await load_catalog(args.catalog)
+    except Exception as e:
+        raise SystemExit(f"❌ Catalog load failed: {e}") from e
+    print(f"✅ Catalog loaded: {len(catalog.isps)} ISPs", file=sys.stderr)
+
+    if args.export_catalog:
+        isps = catalog_adapter.validate_python(list(catalog.isps), from_attributes=True)
+        export = catalog_adapter.dump_json(isps, indent=2)
+        Path(args.export_catalog).write_bytes(export)
+        print(f"✅ Catalog exported: {args.export_catalog}", file=sys.stderr)
+        if not args.domains:
+            return None
+    if not args.domains:
+        raise SystemExit("❌ No domain list given")
+
+    domains = read_domains(args.domains, args.limit)
+    servers = []
+    transports: dict[str, str] = {}
+    for server, isps in select_servers(catalog, args.isp):
+        try:
+            transports[server.ip_address], _ = DNSService.select_transport(
+                server.ip_address, args.transport
+            )
+        except ValueError as e:
+            print(f"⚠️  Skipping {server.ip_address}: {e}", file=sys.stderr)
+            continue
+        servers.append((server, isps))
+    if not domains or not servers:
+        raise SystemExit(f"❌ No work: {len(domains)} domains, {len(servers)} servers")
+    seconds = len(domains) / args.qps * len(PASSES) if args.qps > 0 else 0
+    print(
+        f"🏁 {len(domains)} domains x {len(servers)} servers x {len(PASSES)} passes"
+        + (f" (at least {seconds:.0f}s at {args.qps:g} qps per server)" if seconds else ""),
+        file=sys.stderr,
+    )
+
+    await doh_client.start()
+    started_at = datetime.now(UTC)
+    start = time.perf_counter()
+    try:
+        addresses = [server.ip_address for server, _ in servers]
+        passes = {name: await run_pass(domains, addresses, args, name) for name in PASSES}
+    finally:
+        await doh_client.close()
+        await dot_pool.close()
+        await udp_engine.close()
+    elapsed_s = time.perf_counter() - start
+    return build_report(domains, servers, transports, passes, args, started_at, elapsed_s)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the catalog's DNS servers")
+    parser.add_argument("domains", nargs="?", help="domain list, one per line (or rank,domain)")
+    parser.add_argument("--limit", type=int, help="use the first N domains")
+    parser.add_argument("--catalog", help="catalog export (JSON of /api/isps) instead of the DB")
+    parser.add_argument("--export-catalog", help="write the loaded catalog in the export format")
+    parser.add_argument("--isp", action="append", default=[], help="ISP id or name (repeatable)")
+    parser.add_argument("--record-type", default="A")
+    parser.add_argument("--transport", choices=("auto", "udp", "doh", "dot"), default="auto")
+    parser.add_argument("--qps", type=float, default=20.0, help="queries per second per server")
+    parser.add_argument("--concurrency", type=int, default=100, help="queries in flight overall")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    parser.add_argument("--max-disagreements", type=int, default=10, help="shown in the table")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds, 0: off")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if report is None:
+        return
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    if args.json:
+        print(text)
+    else:
+        print_table(report, args.max_disagreements)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+-- catalog_version table (catalog snapshot invalidation counter)
+-- For databases created before the table existed:
+--   podman-compose exec -T db psql -U kresolver -d kresolver < scripts/catalog_version.sql
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
@@ -0,0 +1,326 @@
+"""Annotate access logs with ASN and ISP offline.
+
+Streams CSV, NDJSON or plain-text input line by line, takes the client IP from
+one column and appends ``asn``, ``as_name``, ``isp_id`` and ``isp_name``. Lines
+are cut into chunks that a process pool enriches in parallel; every worker
+memory-maps the same saved prefix index, so the index is held in memory once
+however many workers run. Output is written in input order with at most a few
+chunks per worker in flight, so memory stays constant for any input size.
+
+Usage:
+    python scripts/enrich_ips.py access.log.gz -o enriched.tsv --index routeviews.pfx2as.gz
+    python scripts/enrich_ips.py requests.csv --ip-field client_ip --workers 8 -o out.csv
+    python scripts/enrich_ips.py events.ndjson --ip-field request.ip --no-isp
+
+Text lines get the fields appended tab-separated; the IP is the whitespace
+field ``--ip-field`` (default 0, as in common/combined log format). An index
+that is not already saved (``.idx``) is built once and saved first
+(``--save-index`` keeps it for the next run).
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import IO
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.config import settings
+from src.services.asn_index import PrefixIndex
+
+FIELDS = ("asn", "as_name", "isp_id", "isp_name")
+FORMATS = ("csv", "ndjson", "text")
+
+# Per-process state, set by init_worker
+_index: PrefixIndex | None = None
+_isps: dict[int, tuple[int, str]] = {}  # asn -> (isp id, isp name)
+_format = "text"
+_ip_field: object = 0  # column index (csv, text) or dotted key path (ndjson)
+
+
+def init_worker(
+    index_path: str, isps: dict[int, tuple[int, str]], fmt: str, ip_field: object
+) -> None:
+    """Map the saved index and keep the settings for this process."""
+    global _index, _isps, _format, _ip_field
+    _index = PrefixIndex.open_mmap(index_path)
+    _isps = isps
+    _format = fmt
+    _ip_field = ip_field
+
+
+def clean_ip(token: str) -> str:
+    """Strip brackets and ports (``[::1]:80``, ``1.2.3.4:5678``) from a log token."""
+    token = token.strip().strip('"')
+    if token.startswith("["):
+        return token[1:].partition("]")[0]
+    if token.count(":") == 1:
+        return token.partition(":")[0]
+    return token
+
+
+def _annotations(ip_address: str | None, matches: dict[str, dict | None]) -> tuple:
+    match = matches.get(ip_address) if ip_address else None
+    if match is None:
+        return None, None, None, None
+    isp = _isps.get(match["asn"])
+    return match["asn"], match["as_name"], isp[0] if isp else None, isp[1] if isp else None
+
+
+def enrich_chunk(lines: list[str]) -> tuple[str, int, int]:
+    """Enrich a chunk of lines. Returns (output, lines, matched lines)."""
+    if _format == "csv":
+        rows = list(csv.reader(lines))
+        ips = [clean_ip(row[_ip_field]) if len(row) > _ip_field else None for row in rows]
+    elif _format == "ndjson":
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+        ips = [_get_path(record, _ip_field) for record in records]
+    else:
+        ips = []
+        for line in lines:
+            parts = line.split()
+            ips.append(clean_ip(parts[_ip_field]) if len(parts) > _ip_field else None)
+
+    matches = _index.lookup_many(ip for ip in ips if ip)
+    annotations = [_annotations(ip, matches) for ip in ips]
+    matched = sum(1 for values in annotations if values[0] is not None)
+
+    out = io.StringIO()
+    if _format == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        for row, values in zip(rows, annotations, strict=True):
+            writer.writerow([*row, *("" if value is None else value for value in values)])
+    elif _format == "ndjson":
+        for line, record, values in zip(lines, records, annotations, strict=True):
+            if not isinstance(record, dict):
+                out.write(line + "\n")  # Not a JSON object: passed through unchanged
+                continue
+            record.update(zip(FIELDS, values, strict=True))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        for line, values in zip(lines, annotations, strict=True):
+            fields = ("-" if value is None else str(value) for value in values)
+            out.write("\t".join([line, *fields]) + "\n")
+    return out.getvalue(), len(lines), matched
+
+
+def _get_path(record: object, path: str) -> str | None:
+    for key in path.split("."):
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return clean_ip(record) if isinstance(record, str) else None
+
+
+def read_chunks(f: IO[str], chunk_lines: int) -> Iterator[list[str]]:
+    """Yield the input as lists of ``chunk_lines`` lines without line endings.
+
+    Lines are split only where the file splits them, not on the other
+    characters ``str.splitlines`` treats as breaks (U+2028, ``\x85``, ...).
+    """
+    lines: list[str] = []
+    for line in f:
+        lines.append(line.rstrip("\r\n"))
+        if len(lines) >= chunk_lines:
+            yield lines
+            lines = []
+    if lines:
+        yield lines
+
+
+def detect_format(path: str) -> str:
+    suffixes = [suffix for suffix in Path(path).suffixes if suffix != ".gz"]
+    if suffixes and suffixes[-1] == ".csv":
+        return "csv"
+    if suffixes and suffixes[-1] in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return "text"
+
+
+def open_input(path: str) -> tuple[IO[str], IO[bytes] | None, int | None]:
+    """Open the input as text. Also returns the raw file and its size for progress."""
+    if path == "-":
+        return sys.stdin, None, None
+    raw = Path(path).open("rb")  # noqa: SIM115
+    size = os.fstat(raw.fileno()).st_size
+    stream: IO[bytes] = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline=""), raw, size
+
+
+def prepare_index(path: str, save_path: str | None) -> tuple[str, str | None]:
+    """Path of a saved index for the workers, and a temporary file to remove afterwards."""
+    if Path(path).suffix == ".idx":
+        return path, None
+
+    start = time.perf_counter()
+    index = PrefixIndex.from_file(path)
+    elapsed = time.perf_counter() - start
+    print(f"✅ ASN index built: {len(index)} prefixes in {elapsed:.1f}s", file=sys.stderr)
+    if save_path:
+        index.save(save_path)
+        return save_path, None
+
+    shm = Path("/dev/shm")
+    fd, temp_path = tempfile.mkstemp(suffix=".idx", dir=shm if shm.is_dir() else None)
+    os.close(fd)
+    index.save(temp_path)
+    return temp_path, temp_path
+
+
+async def load_isps() -> dict[int, tuple[int, str]]:
+    """ASN to ISP mapping from the catalog in the database."""
+    from src.core.database import AsyncSessionLocal, engine
+    from src.services.catalog import catalog_store
+
+    try:
+        async with AsyncSessionLocal() as db:
+            catalog = await catalog_store.refresh(db)
+    finally:
+        await engine.dispose()
+    return {asn: (isp.id, isp.name) for asn, isp in catalog.isps_by_asn.items()}
+
+
+class Progress:
+    """Periodic progress and throughput on stderr."""
+
+    def __init__(self, raw: IO[bytes] | None, size: int | None, interval: float) -> None:
+        self.raw = raw
+        self.size = size
+        self.interval = interval
+        self.start = self.last = time.perf_counter()
+        self.lines = 0
+        self.matched = 0
+        self.position = 0  # input bytes read (compressed size for .gz)
+
+    def update(self, lines: int, matched: int) -> None:
+        self.lines += lines
+        self.matched += matched
+        if self.raw is not None:
+            self.position = self.raw.tell()
+        now = time.perf_counter()
+        if self.interval > 0 and now - self.last >= self.interval:
+            self.last = now
+            print(f"⏳ {self.summary(now)}", file=sys.stderr)
+
+    def summary(self, now: float | None = None) -> str:
+        elapsed = (now or time.perf_counter()) - self.start
+        text = f"{self.lines:,} lines, {self.lines / elapsed:,.0f} lines/s"
+        if self.raw is not None:
+            text += f", {self.position / elapsed / 1e6:.1f} MB/s"
+            if self.size:
+                text += f", {self.position / self.size:.0%}"
+        matched = self.matched / self.lines if self.lines else 0
+        return f"{text}, {matched:.1%} matched, {elapsed:.1f}s"
+
+
+def resolve_ip_field(fmt: str, ip_field: str | None, header: list[str] | None) -> object:
+    """Column index (csv, text) or key path (ndjson) of the client IP."""
+    if fmt == "ndjson":
+        return ip_field or "ip"
+    if fmt == "text":
+        return int(ip_field or 0)
+    if ip_field is not None and ip_field.isdigit():
+        return int(ip_field)
+    name = ip_field or "ip"
+    if header is None or name not in header:
+        raise SystemExit(f"❌ CSV column '{name}' not found (columns: {header})")
+    return header.index(name)
+
+
+def run(args: argparse.Namespace) -> Progress:
+    fmt = args.format or detect_format(args.input)
+    if not args.index:
+        raise SystemExit("❌ No ASN index (pass --index or set ASN_DB_PATH)")
+    try:
+        isps = {} if args.no_isp else asyncio.run(load_isps())
+    except Exception as e:
+        raise SystemExit(f"❌ Catalog load failed: {e} (use --no-isp for ASN only)") from e
+    index_path, temp_path = prepare_index(args.index, args.save_index)
+
+    f, raw, size = open_input(args.input)
+    out = sys.stdout
+    if args.output != "-":
+        out = Path(args.output).open("w", encoding="utf-8", newline="")  # noqa: SIM115
+    try:
+        header = None
+        if fmt == "csv" and not args.no_header:
+            header_line = f.readline()
+            header = next(csv.reader([header_line]), [])
+            csv.writer(out, lineterminator="\n").writerow([*header, *FIELDS])
+        ip_field = resolve_ip_field(fmt, args.ip_field, header)
+        initargs = (index_path, isps, fmt, ip_field)
+        progress = Progress(raw, size, args.progress_interval)
+
+        if args.workers == 0:
+            init_worker(*initargs)
+            for chunk in read_chunks(f, args.chunk_lines):
+                output, lines, matched = enrich_chunk(chunk)
+                out.write(output)
+                progress.update(lines, matched)
+            return progress
+
+        with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=initargs) as pool:
+            # Bounded window of chunks in flight, written back in submission order
+            pending: deque[Future] = deque()
+            for chunk in read_chunks(f, args.chunk_lines):
+                pending.append(pool.submit(enrich_chunk, chunk))
+                if len(pending) >= args.workers * 2:
+                    output, lines, matched = pending.popleft().result()
+                    out.write(output)
+                    progress.update(lines, matched)
+            while pending:
+                output, lines, matched = pending.popleft().result()
+                out.write(output)
+                progress.update(lines, matched)
+        return progress
+    finally:
+        f.close()
+        if out is not sys.stdout:
+            out.close()
+        if temp_path:
+            Path(temp_path).unlink()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Annotate logs with ASN and ISP")
+    parser.add_argument("input", help="input file (.gz supported) or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: by suffix)")
+    parser.add_argument(
+        "--ip-field",
+        help="CSV column name or index, NDJSON key path or text field index (default: ip / 0)",
+    )
+    parser.add_argument("--no-header", action="store_true", help="CSV input has no header row")
+    parser.add_argument(
+        "--index", default=settings.asn_db_path, help="ASN index (default: ASN_DB_PATH)"
+    )
+    parser.add_argument("--save-index", help="save the built index here for later runs (.idx)")
+    parser.add_argument("--no-isp", action="store_true", help="ASN only, no catalog database")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="0: no pool")
+    parser.add_argument("--chunk-lines", type=int, default=10_000)
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds, 0: off")
+    args = parser.parse_args()
+
+    progress = run(args)
+    print(f"✅ Done: {progress.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Pre-rendered catalog responses.
+
+The catalog endpoints return the same ISP/DNS lists until the catalog changes,
+so their JSON bodies are rendered once per catalog snapshot instead of being
+validated and serialized by pydantic on every request. Each body is kept with
+gzip and (when the optional ``brotli`` package is installed) brotli variants
+and a strong ETag, so clients and CDNs can revalidate with ``If-None-Match``
+and get a bodiless 304.
+
+Variants that depend on live health data (``sort=latency``, ``healthy_only``)
+are not pre-rendered and go through the normal response_model path.
+"""
+
+import gzip
+import hashlib
+from dataclasses import dataclass
+from typing import Any
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from src.api.schemas import DNSServerResponse, ISPWithDNS
+from src.core.config import settings
+from src.services.catalog import CatalogSnapshot
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+_isp_list = TypeAdapter(list[ISPWithDNS])
+_isp = TypeAdapter(ISPWithDNS)
+_server_list = TypeAdapter(list[DNSServerResponse])
+
+# Content-Encoding -> ETag suffix; a strong ETag must differ per encoding
+_ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz", "identity": ""}
+
+
+@dataclass(frozen=True, slots=True)
+class RenderedResponse:
+    """One JSON body with its compressed variants and ETag."""
+
+    body: bytes
+    encoded: dict[str, bytes]  # Content-Encoding -> compressed body
+    etag: str  # Unquoted hash of ``body``
+
+    @classmethod
+    def render(cls, body: bytes) -> "RenderedResponse":
+        encoded = {"gzip": gzip.compress(body, compresslevel=settings.catalog_gzip_level, mtime=0)}
+        if brotli is not None:
+            encoded["br"] = brotli.compress(body, quality=settings.catalog_brotli_quality)
+        return cls(body, encoded, hashlib.sha256(body).hexdigest()[:32])
+
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    """Parse ``Accept-Encoding`` into {coding: q}."""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header: str | None, available: dict[str, bytes]) -> str:
+    """Pick the best available encoding for ``Accept-Encoding`` (br, then gzip, else identity)."""
+    if not header:
+        return "identity"
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding in available and accepted.get(coding, wildcard) > 0:
+            return coding
+    return "identity"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison as RFC 9110 requires for If-None-Match, across encodings.
+
+    Every encoding holds the same JSON, so a tag for any of them is a match.
+    """
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag.removeprefix("W/").strip('"')
+        if tag.removesuffix("-br").removesuffix("-gz") == etag:
+            return True
+    return False
+
+
+def serve(rendered: RenderedResponse, request: Request) -> Response:
+    """Serve ``rendered`` with content negotiation and conditional GET."""
+    encoding = choose_encoding(request.headers.get("accept-encoding"), rendered.encoded)
+    headers = {
+        "ETag": f'"{rendered.etag}{_ETAG_SUFFIXES[encoding]}"',
+        "Cache-Control": f"public, max-age={settings.catalog_cache_max_age}",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, rendered.etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding == "identity":
+        return Response(rendered.body, media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(rendered.encoded[encoding], media_type="application/json", headers=headers)
+
+
+class CatalogResponses:
+    """Rendered catalog bodies for the current snapshot, rebuilt when it is swapped."""
+
+    def __init__(self) -> None:
+        self._snapshot: CatalogSnapshot | None = None
+        self._responses: dict[Any, RenderedResponse] = {}
+
+    def get(self, snapshot: CatalogSnapshot, key: Any) -> RenderedResponse | None:
+        """Return the rendered response for ``key``, or None if there is none.
+
+        Keys: ``("isps", include_inactive)``, ``("isp", isp_id)``, ``("dns", isp_id or None)``.
+        """
+        if snapshot is not self._snapshot:
+            self.build(snapshot)
+        return self._responses.get(key)
+
+    def build(self, snapshot: CatalogSnapshot) -> None:
+        """Render every catalog response of ``snapshot``."""
+        active = [isp for isp in snapshot.isps if isp.is_active]
+        bodies: dict[Any, bytes] = {
+            ("isps", False): _isp_list.dump_json(
+                _isp_list.validate_python(active, from_attributes=True)
+            ),
+            ("isps", True): _isp_list.dump_json(
+                _isp_list.validate_python(snapshot.isps, from_attributes=True)
+            ),
+            ("dns", None): _server_list.dump_json(
+                _server_list.validate_python(snapshot.active_servers, from_attributes=True)
+            ),
+        }
+        for isp in snapshot.isps:
+            bodies["isp", isp.id] = _isp.dump_json(_isp.validate_python(isp, from_attributes=True))
+            servers = snapshot.active_servers_by_isp.get(isp.id, ())
+            bodies["dns", isp.id] = _server_list.dump_json(
+                _server_list.validate_python(servers, from_attributes=True)
+            )
+
+        self._responses = {key: RenderedResponse.render(body) for key, body in bodies.items()}
+        self._snapshot = snapshot
+
+
+catalog_responses = CatalogResponses()
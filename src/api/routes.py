@@ -1,77 +1,204 @@
 """API routes."""
 
-from typing import Optional
+import itertools
+import math
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import asdict, replace
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.api.catalog_responses import catalog_responses, serve
 from src.api.schemas import (
+    CacheStatsResponse,
+    DNSBatchResolveRequest,
     DNSCommandExample,
+    DNSCompareRequest,
+    DNSCompareResponse,
     DNSResolveRequest,
     DNSResolveResponse,
+    DNSServerHealth,
     DNSServerResponse,
-    DNSServerWithISP,
+    DNSServerStats,
+    ISPBatchDetectionRequest,
+    ISPBatchDetectionResponse,
+    ISPDetectionColumns,
     ISPDetectionRequest,
     ISPDetectionResponse,
     ISPResponse,
+    ISPStats,
     ISPWithDNS,
+    LatencyTimeseriesResponse,
+    UpstreamCircuit,
 )
+from src.core.config import settings
 from src.core.database import get_db
-from src.models.dns import QueryLog
+from src.services.asn_client import asn_client
+from src.services.catalog import CatalogSnapshot, DNSServerEntry, catalog_store
+from src.services.circuit_breaker import circuit_breakers
+from src.services.compare_service import CompareService
+from src.services.dns_cache import answer_cache
 from src.services.dns_service import DNSService
+from src.services.health_prober import health_prober
+from src.services.hedging import HedgedResolver
 from src.services.isp_service import ISPService
+from src.services.latency_stats import latency_stats
+from src.services.query_logger import query_log_writer
+from src.services.shared_cache import shared_cache
 
 router = APIRouter(prefix="/api", tags=["api"])
 
+ServerSort = Literal["priority", "latency"]
+
+
+def _log_rows(results: list[dict], client_ip: str | None) -> list[dict]:
+    """QueryLog rows for results that actually queried upstream (cache hits are skipped)."""
+    return [
+        {
+            "client_ip": client_ip,
+            "domain": result["domain"],
+            "dns_server": result["dns_server"],
+            "response_time_ms": result["response_time_ms"],
+            "success": result["success"],
+            "error_message": result["error_message"],
+        }
+        for result in results
+        if not result["cached"]
+    ]
+
+
+def _select_servers(
+    servers: Iterable[DNSServerEntry], sort: str, healthy_only: bool
+) -> list[DNSServerEntry]:
+    """Filter out unhealthy servers and/or order by measured latency."""
+    selected = list(servers)
+    if healthy_only:
+        selected = [server for server in selected if health_prober.is_healthy(server.ip_address)]
+    if sort == "latency":
+        selected.sort(key=health_prober.rank)
+    return selected
+
+
+async def _record(catalog: CatalogSnapshot, results: list[dict], client_ip: str | None) -> None:
+    """Feed upstream results to the latency stats and the query log."""
+    for result in results:
+        if result["cached"] or result.get("retry_after") is not None:
+            continue  # Not sent upstream
+        servers = catalog.servers_by_ip.get(result["dns_server"], ())
+        latency_stats.record(
+            result["dns_server"],
+            {server.isp_id for server in servers},
+            result["response_time_ms"],
+            result["success"],
+        )
+
+    # Written in the background
+    await query_log_writer.submit_many(_log_rows(results, client_ip))
+
 
 @router.get("/isps", response_model=list[ISPWithDNS])
 async def get_isps(
+    request: Request,
     include_inactive: bool = False,
+    sort: ServerSort = "priority",
+    healthy_only: bool = False,
     db: AsyncSession = Depends(get_db),
-) -> list[ISPWithDNS]:
-    """Get all ISPs with their DNS servers."""
-    isps = await ISPService.get_all_isps(db, include_dns=True)
+) -> Response | list[ISPWithDNS]:
+    """Get all ISPs with their DNS servers.
+
+    With ``sort=latency`` servers are ordered by measured latency and ISPs by
+    their fastest server; ``healthy_only`` hides servers measured unhealthy.
+    The default ordering is served pre-rendered with an ETag.
+    """
+    catalog = await catalog_store.get(db)
+    if sort == "priority" and not healthy_only:
+        return serve(catalog_responses.get(catalog, ("isps", include_inactive)), request)
+
+    isps = list(catalog.isps)
 
     if not include_inactive:
         isps = [isp for isp in isps if isp.is_active]
 
+    if sort == "latency" or healthy_only:
+        isps = [
+            replace(isp, dns_servers=tuple(_select_servers(isp.dns_servers, sort, healthy_only)))
+            for isp in isps
+        ]
+    if sort == "latency":
+        isps.sort(
+            key=lambda isp: (
+                health_prober.rank(isp.dns_servers[0]) if isp.dns_servers else (True, float("inf"))
+            )
+        )
+
     return isps
 
 
 @router.get("/isps/{isp_id}", response_model=ISPWithDNS)
 async def get_isp(
     isp_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
-) -> ISPWithDNS:
+) -> Response:
     """Get specific ISP with DNS servers."""
-    isp = await ISPService.get_isp_by_id(db, isp_id, include_dns=True)
+    catalog = await catalog_store.get(db)
+    rendered = catalog_responses.get(catalog, ("isp", isp_id))
 
-    if not isp:
+    if not rendered:
         raise HTTPException(status_code=404, detail="ISP not found")
 
-    return isp
+    return serve(rendered, request)
 
 
 @router.get("/dns", response_model=list[DNSServerResponse])
 async def get_dns_servers(
-    isp_id: Optional[int] = None,
+    request: Request,
+    isp_id: int | None = None,
+    sort: ServerSort = "priority",
+    healthy_only: bool = False,
     db: AsyncSession = Depends(get_db),
-) -> list[DNSServerResponse]:
-    """Get DNS servers, optionally filtered by ISP."""
-    if isp_id:
-        servers = await ISPService.get_dns_servers_by_isp(db, isp_id)
-    else:
-        # Get all active DNS servers
-        from sqlalchemy import select
+) -> Response | list[DNSServerResponse]:
+    """Get DNS servers, optionally filtered by ISP or measured health."""
+    catalog = await catalog_store.get(db)
+    if sort == "priority" and not healthy_only:
+        rendered = catalog_responses.get(catalog, ("dns", isp_id or None))
+        if rendered:  # Unknown ISP ids fall through to an empty list
+            return serve(rendered, request)
 
-        from src.models.dns import DNSServer
+    servers = catalog.active_servers_by_isp.get(isp_id, ()) if isp_id else catalog.active_servers
 
-        result = await db.execute(
-            select(DNSServer).where(DNSServer.is_active == True).order_by(DNSServer.priority)
-        )
-        servers = list(result.scalars().all())
+    return _select_servers(servers, sort, healthy_only)
+
+
+@router.get("/dns/health", response_model=list[DNSServerHealth])
+async def get_dns_health() -> list[DNSServerHealth]:
+    """Get probed health (EWMA latency, loss rate) of every DNS server address."""
+    return [
+        DNSServerHealth(healthy=health.healthy, **asdict(health)) for health in health_prober.all()
+    ]
+
+
+async def _resolve_isp(request: DNSResolveRequest, catalog: CatalogSnapshot) -> dict:
+    """ISP mode: resolve through the ISP's active servers with hedging."""
+    if request.dns_server:
+        raise HTTPException(status_code=400, detail="Specify either dns_server or isp_id, not both")
+
+    isp = catalog.isps_by_id.get(request.isp_id)
+    if isp is None or not isp.is_active:
+        raise HTTPException(status_code=404, detail="ISP not found")
+    servers = catalog.active_servers_by_isp.get(isp.id, ())
+    if not servers:
+        raise HTTPException(status_code=400, detail="ISP has no active DNS servers")
 
-    return servers
+    try:
+        result = await HedgedResolver.resolve(
+            request.domain, servers, request.record_type, not request.no_cache, request.transport
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return {**result, "isp_id": isp.id}
 
 
 @router.post("/resolve", response_model=DNSResolveResponse)
@@ -80,28 +207,109 @@ async def resolve_domain(
     req: Request,
     db: AsyncSession = Depends(get_db),
 ) -> DNSResolveResponse:
-    """Resolve domain using specified DNS server."""
-    # Perform DNS resolution
-    result = await DNSService.resolve_domain(
-        domain=request.domain,
-        dns_server=request.dns_server,
-        record_type=request.record_type,
-    )
+    """Resolve domain using specified DNS server, or hedged across an ISP's servers."""
+    catalog = await catalog_store.get(db)
+    if request.isp_id is not None:
+        result = await _resolve_isp(request, catalog)
+    else:
+        try:
+            result = await DNSService.resolve_domain(
+                domain=request.domain,
+                dns_server=request.dns_server,
+                record_type=request.record_type,
+                use_cache=not request.no_cache,
+                transport=request.transport,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+    await _record(catalog, [result], req.client.host if req.client else None)
+
+    if result.get("retry_after") is not None:
+        # The circuit breaker did not let the query through
+        raise HTTPException(
+            status_code=503,
+            detail=result["error_message"],
+            headers={"Retry-After": str(max(1, math.ceil(result["retry_after"])))},
+        )
+
+    return DNSResolveResponse(**result)
 
-    # Log query
+
+@router.post(
+    "/resolve/batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def resolve_batch(
+    request: DNSBatchResolveRequest,
+    req: Request,
+    db: AsyncSession = Depends(get_db),
+) -> StreamingResponse:
+    """Resolve domains x DNS servers x record types, streaming NDJSON results.
+
+    Each line is a DNSResolveResponse, written as soon as its query completes.
+    """
+    queries = list(itertools.product(request.domains, request.dns_servers, request.record_types))
+    if len(queries) > settings.batch_max_queries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries: {len(queries)} (max {settings.batch_max_queries})",
+        )
+
+    # Reject transports a server cannot use before streaming starts
+    for dns_server in set(request.dns_servers):
+        try:
+            DNSService.select_transport(dns_server, request.transport)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+    concurrency = min(
+        request.concurrency or settings.batch_concurrency, settings.batch_max_concurrency
+    )
     client_ip = req.client.host if req.client else None
-    log_entry = QueryLog(
-        client_ip=client_ip,
+    # Loaded before streaming: the session is closed once the response starts
+    catalog = await catalog_store.get(db)
+
+    async def stream() -> AsyncIterator[str]:
+        async for result in DNSService.resolve_many(
+            queries, concurrency, not request.no_cache, request.transport
+        ):
+            # Recorded as it arrives, so a client that disconnects mid-stream loses nothing
+            await _record(catalog, [result], client_ip)
+            yield DNSResolveResponse(**result).model_dump_json() + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/resolve/compare", response_model=DNSCompareResponse)
+async def compare_resolvers(
+    request: DNSCompareRequest,
+    req: Request,
+    db: AsyncSession = Depends(get_db),
+) -> DNSCompareResponse:
+    """Query every active DNS server in parallel and compare answers by ISP."""
+    catalog = await catalog_store.get(db)
+    isps = [isp for isp in catalog.isps if isp.is_active]
+    if request.isp_ids:
+        isps = [isp for isp in isps if isp.id in request.isp_ids]
+
+    deadline = settings.compare_deadline_s
+    if request.deadline_ms:
+        deadline = min(request.deadline_ms / 1000, settings.compare_max_deadline_s)
+
+    comparison = await CompareService.compare(
         domain=request.domain,
-        dns_server=result["dns_server"],
-        response_time_ms=result["response_time_ms"],
-        success=result["success"],
-        error_message=result["error_message"],
+        isps=isps,
+        record_types=request.record_types,
+        deadline=deadline,
+        use_cache=not request.no_cache,
     )
-    db.add(log_entry)
-    await db.commit()
 
-    return DNSResolveResponse(**result)
+    client_ip = req.client.host if req.client else None
+    await _record(catalog, comparison.pop("results"), client_ip)
+
+    return DNSCompareResponse(**comparison)
 
 
 @router.get("/resolve/examples", response_model=list[DNSCommandExample])
@@ -137,3 +345,120 @@ async def detect_isp(
         )
 
     return ISPDetectionResponse(**result)
+
+
+@router.post("/detect-isp/batch", response_model=ISPBatchDetectionResponse)
+async def detect_isp_batch(
+    request: ISPBatchDetectionRequest,
+    db: AsyncSession = Depends(get_db),
+) -> ISPBatchDetectionResponse:
+    """Detect ISPs of many IP addresses or CIDRs from the local ASN index."""
+    limit = settings.detect_batch_max_addresses
+    if len(request.ip_addresses) > limit:
+        raise HTTPException(
+            status_code=400, detail=f"Too many addresses: {len(request.ip_addresses)} (max {limit})"
+        )
+
+    try:
+        results, invalid = await ISPService.detect_isps(db, request.ip_addresses)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+
+    detected = sum(result["detected"] for result in results)
+    if request.format == "records":
+        return ISPBatchDetectionResponse(
+            count=len(results),
+            detected=detected,
+            invalid=invalid,
+            results=[ISPDetectionResponse(**result) for result in results],
+        )
+
+    isps = {result["isp"].id: result["isp"] for result in results if result["isp"]}
+    return ISPBatchDetectionResponse(
+        count=len(results),
+        detected=detected,
+        invalid=invalid,
+        columns=ISPDetectionColumns(
+            ip_address=[result["ip_address"] for result in results],
+            asn=[result["asn"] for result in results],
+            as_name=[result["as_name"] for result in results],
+            isp_id=[result["isp"].id if result["isp"] else None for result in results],
+        ),
+        isps=[
+            ISPResponse.model_validate(isp) for isp in sorted(isps.values(), key=lambda isp: isp.id)
+        ],
+    )
+
+
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+async def get_cache_stats() -> CacheStatsResponse:
+    """Get hit/miss counters of the in-process caches."""
+    return CacheStatsResponse(
+        resolve=answer_cache.stats(), asn=asn_client.stats(), shared=shared_cache.stats()
+    )
+
+
+@router.get("/circuits", response_model=list[UpstreamCircuit])
+async def get_circuits() -> list[UpstreamCircuit]:
+    """Get circuit breaker state and in-flight queries of every upstream used."""
+    return [UpstreamCircuit(**breaker.stats()) for breaker in circuit_breakers.all()]
+
+
+def _stats_window(window_s: int) -> int:
+    return min(window_s, settings.stats_retention_seconds)
+
+
+@router.get("/stats/servers", response_model=list[DNSServerStats])
+async def get_server_stats(
+    window_s: int = Query(3600, ge=1, description="최근 N초"),
+    db: AsyncSession = Depends(get_db),
+) -> list[DNSServerStats]:
+    """Get latency percentiles, success rate and volume per DNS server."""
+    catalog = await catalog_store.get(db)
+    summaries = latency_stats.summary("server", _stats_window(window_s))
+
+    stats = []
+    for dns_server, summary in sorted(summaries.items()):
+        servers = catalog.servers_by_ip.get(dns_server, ())
+        isp_ids = sorted({server.isp_id for server in servers})
+        stats.append(DNSServerStats(dns_server=dns_server, isp_ids=isp_ids, **summary))
+    return stats
+
+
+@router.get("/stats/isps", response_model=list[ISPStats])
+async def get_isp_stats(
+    window_s: int = Query(3600, ge=1, description="최근 N초"),
+    db: AsyncSession = Depends(get_db),
+) -> list[ISPStats]:
+    """Get latency percentiles, success rate and volume per ISP."""
+    catalog = await catalog_store.get(db)
+    summaries = latency_stats.summary("isp", _stats_window(window_s))
+
+    stats = []
+    for key, summary in sorted(summaries.items(), key=lambda item: int(item[0])):
+        isp = catalog.isps_by_id.get(int(key))
+        stats.append(ISPStats(isp_id=int(key), isp_name=isp.name if isp else None, **summary))
+    return stats
+
+
+@router.get("/stats/timeseries", response_model=LatencyTimeseriesResponse)
+async def get_stats_timeseries(
+    dns_server: str | None = None,
+    isp_id: int | None = None,
+    window_s: int = Query(3600, ge=1, description="최근 N초"),
+) -> LatencyTimeseriesResponse:
+    """Get per-window latency stats of one DNS server or ISP."""
+    if (dns_server is None) == (isp_id is None):
+        raise HTTPException(status_code=400, detail="Specify exactly one of dns_server or isp_id")
+
+    if dns_server is not None:
+        points = latency_stats.timeseries("server", dns_server, _stats_window(window_s))
+    else:
+        points = latency_stats.timeseries("isp", str(isp_id), _stats_window(window_s))
+
+    return LatencyTimeseriesResponse(
+        dns_server=dns_server,
+        isp_id=isp_id,
+        window_seconds=latency_stats.window_seconds,
+        points=points,
+    )
@@ -1,9 +1,9 @@
 """Pydantic schemas for API."""
 
 from datetime import datetime
-from typing import Optional
+from typing import Literal
 
-from pydantic import BaseModel, Field, IPvAnyAddress
+from pydantic import BaseModel, Field
 
 
 # ISP Schemas
@@ -11,7 +11,7 @@ class ISPBase(BaseModel):
     """ISP base schema."""
 
     name: str = Field(..., description="통신사 이름")
-    name_en: Optional[str] = Field(None, description="통신사 영문 이름")
+    name_en: str | None = Field(None, description="통신사 영문 이름")
     country: str = Field(default="KR", description="국가 코드")
     isp_type: str = Field(default="landline", description="통신사 타입 (landline, mobile, both)")
     is_active: bool = Field(default=True, description="활성화 여부")
@@ -39,13 +39,13 @@ class DNSServerBase(BaseModel):
 
     ip_address: str = Field(..., description="DNS 서버 IP 주소")
     priority: int = Field(default=1, description="우선순위 (1=Primary, 2=Secondary)")
-    region: Optional[str] = Field(None, description="지역")
+    region: str | None = Field(None, description="지역")
     server_type: str = Field(default="standard", description="서버 타입 (standard, doh, dot)")
-    doh_url: Optional[str] = Field(None, description="DNS-over-HTTPS URL")
-    dot_hostname: Optional[str] = Field(None, description="DNS-over-TLS hostname")
+    doh_url: str | None = Field(None, description="DNS-over-HTTPS URL")
+    dot_hostname: str | None = Field(None, description="DNS-over-TLS hostname")
     is_anycast: bool = Field(default=False, description="Anycast 여부")
     is_active: bool = Field(default=True, description="활성화 여부")
-    notes: Optional[str] = Field(None, description="비고")
+    notes: str | None = Field(None, description="비고")
 
 
 class DNSServerCreate(DNSServerBase):
@@ -71,6 +71,21 @@ class DNSServerWithISP(DNSServerResponse):
     isp: ISPResponse
 
 
+class DNSServerHealth(BaseModel):
+    """Measured health of a DNS server address."""
+
+    ip_address: str
+    healthy: bool = Field(..., description="정상 여부")
+    ewma_latency_ms: float | None = Field(None, description="응답 시간 지수이동평균 (밀리초)")
+    loss_rate: float = Field(..., description="실패율 지수이동평균 (0~1)")
+    probes: int = Field(..., description="검사 횟수")
+    failures: int = Field(..., description="실패 횟수")
+    consecutive_failures: int = Field(..., description="연속 실패 횟수")
+    last_probe_at: datetime | None = Field(None, description="마지막 검사 시각")
+    last_healthy_at: datetime | None = Field(None, description="마지막 정상 확인 시각")
+    last_error: str | None = None
+
+
 # ISP with DNS Servers
 class ISPWithDNS(ISPResponse):
     """ISP with DNS servers."""
@@ -79,12 +94,46 @@ class ISPWithDNS(ISPResponse):
 
 
 # DNS Query Schemas
+DNSTransport = Literal["auto", "udp", "doh", "dot"]
+
+
 class DNSResolveRequest(BaseModel):
     """DNS resolve request schema."""
 
     domain: str = Field(..., description="조회할 도메인", examples=["google.com"])
-    dns_server: Optional[str] = Field(None, description="사용할 DNS 서버 (미지정시 시스템 기본값)")
+    dns_server: str | None = Field(None, description="사용할 DNS 서버 (미지정시 시스템 기본값)")
+    isp_id: int | None = Field(
+        None,
+        description="통신사 모드: Primary DNS에 질의하고 응답이 늦으면 Secondary에도 질의 (dns_server와 함께 사용 불가)",
+    )
     record_type: str = Field(default="A", description="레코드 타입 (A, AAAA, MX, NS, TXT 등)")
+    no_cache: bool = Field(
+        default=False, description="캐시를 무시하고 새로 조회 (응답 시간 측정용)"
+    )
+    transport: DNSTransport = Field(
+        default="auto", description="전송 방식 (auto=DNS 서버의 server_type, udp, doh, dot)"
+    )
+
+
+class DNSBatchResolveRequest(BaseModel):
+    """DNS batch resolve request schema (domains x dns_servers x record_types)."""
+
+    domains: list[str] = Field(..., min_length=1, description="조회할 도메인 목록")
+    dns_servers: list[str | None] = Field(
+        default_factory=lambda: [None],
+        min_length=1,
+        description="사용할 DNS 서버 목록 (null=시스템 기본값)",
+    )
+    record_types: list[str] = Field(
+        default_factory=lambda: ["A"], min_length=1, description="레코드 타입 목록"
+    )
+    concurrency: int | None = Field(None, ge=1, description="동시 조회 수 (미지정시 서버 기본값)")
+    no_cache: bool = Field(
+        default=False, description="캐시를 무시하고 새로 조회 (응답 시간 측정용)"
+    )
+    transport: DNSTransport = Field(
+        default="auto", description="전송 방식 (auto=DNS 서버의 server_type, udp, doh, dot)"
+    )
 
 
 class DNSResolveResponse(BaseModel):
@@ -96,7 +145,103 @@ class DNSResolveResponse(BaseModel):
     answers: list[str]
     response_time_ms: int
     success: bool
-    error_message: Optional[str] = None
+    error_message: str | None = None
+    cached: bool = Field(default=False, description="캐시된 응답 여부")
+    ttl_remaining: int | None = Field(None, description="캐시 만료까지 남은 TTL (초)")
+    transport: str = Field(default="udp", description="사용한 전송 방식 (udp, doh, dot)")
+    handshake_time_ms: int | None = Field(
+        None, description="연결 수립(TCP/TLS) 시간, 응답 시간에서 제외됨 (재사용 연결은 0)"
+    )
+    isp_id: int | None = Field(
+        None, description="통신사 모드로 조회한 통신사 ID (dns_server는 응답한 서버)"
+    )
+    hedged: bool = Field(
+        default=False, description="통신사 모드에서 다음 DNS 서버에도 질의했는지 여부"
+    )
+
+
+class UpstreamCircuit(BaseModel):
+    """Circuit breaker state of one upstream DNS server."""
+
+    dns_server: str
+    state: Literal["closed", "half_open", "open"] = Field(
+        ..., description="closed=정상, open=차단, half_open=시험 조회 중"
+    )
+    state_changed_at: datetime = Field(..., description="상태가 바뀐 시각")
+    retry_in_s: float | None = Field(None, description="차단 해제(half_open)까지 남은 시간 (초)")
+    queries: int = Field(..., description="최근 구간의 조회 수")
+    failures: int = Field(
+        ..., description="최근 구간의 실패 수 (타임아웃, 오류, SERVFAIL, REFUSED)"
+    )
+    failure_rate: float | None = Field(None, description="최근 구간의 실패율")
+    inflight: int = Field(..., description="진행 중인 조회 수")
+    opens: int = Field(..., description="차단된 횟수")
+    rejected: int = Field(..., description="차단 상태라 보내지 않은 조회 수")
+    queue_timeouts: int = Field(..., description="동시 조회 한도로 대기하다 실패한 조회 수")
+
+
+# Cross-ISP Comparison Schemas
+class DNSCompareRequest(BaseModel):
+    """Cross-ISP comparison request schema."""
+
+    domain: str = Field(..., description="조회할 도메인", examples=["google.com"])
+    record_types: list[str] = Field(
+        default_factory=lambda: ["A"], min_length=1, description="레코드 타입 목록"
+    )
+    isp_ids: list[int] | None = Field(None, description="비교할 통신사 ID 목록 (미지정시 전체)")
+    deadline_ms: int | None = Field(None, ge=1, description="전체 조회 제한 시간 (밀리초)")
+    no_cache: bool = Field(
+        default=False, description="캐시를 무시하고 새로 조회 (응답 시간 측정용)"
+    )
+
+
+class DNSCompareCell(BaseModel):
+    """One server's answer for one record type."""
+
+    answers: list[str]
+    response_time_ms: int
+    success: bool
+    error_message: str | None = None
+    cached: bool = False
+    matches_majority: bool | None = Field(None, description="다수 응답과 일치 여부 (실패시 null)")
+
+
+class DNSCompareServer(BaseModel):
+    """Comparison results for one DNS server, keyed by record type."""
+
+    dns_server: str
+    priority: int
+    results: dict[str, DNSCompareCell]
+
+
+class DNSCompareISP(BaseModel):
+    """Comparison results grouped by ISP."""
+
+    isp_id: int
+    isp_name: str
+    servers: list[DNSCompareServer]
+    diverging_record_types: list[str] = Field(
+        default_factory=list, description="다수 응답과 다른 레코드 타입"
+    )
+
+
+class DNSAnswerSet(BaseModel):
+    """Servers that returned an identical answer set."""
+
+    answers: list[str]
+    dns_servers: list[str]
+    is_majority: bool
+
+
+class DNSCompareResponse(BaseModel):
+    """Cross-ISP comparison response schema."""
+
+    domain: str
+    record_types: list[str]
+    elapsed_ms: int
+    deadline_ms: int
+    isps: list[DNSCompareISP]
+    answer_sets: dict[str, list[DNSAnswerSet]]
 
 
 # Command Example Schema
@@ -112,19 +257,107 @@ class DNSCommandExample(BaseModel):
 class ISPDetectionRequest(BaseModel):
     """ISP detection request schema."""
 
-    ip_address: Optional[str] = Field(None, description="IP 주소 (미지정시 요청자 IP 사용)")
+    ip_address: str | None = Field(None, description="IP 주소 (미지정시 요청자 IP 사용)")
 
 
 class ISPDetectionResponse(BaseModel):
     """ISP detection response schema."""
 
     ip_address: str
-    asn: Optional[int] = None
-    as_name: Optional[str] = None
-    isp: Optional[ISPResponse] = None
+    asn: int | None = None
+    as_name: str | None = None
+    isp: ISPResponse | None = None
     detected: bool
 
 
+class ISPBatchDetectionRequest(BaseModel):
+    """Bulk ISP detection request schema."""
+
+    ip_addresses: list[str] = Field(
+        ...,
+        min_length=1,
+        description="IP 주소 또는 CIDR 목록 (CIDR은 네트워크 주소로 조회, 중복은 한 번만)",
+    )
+    format: Literal["records", "columnar"] = Field(
+        default="records", description="records=ISPDetectionResponse 목록, columnar=열 단위 배열"
+    )
+
+
+class ISPDetectionColumns(BaseModel):
+    """Columnar detection results; entry i of every list belongs to ip_address[i]."""
+
+    ip_address: list[str]
+    asn: list[int | None]
+    as_name: list[str | None]
+    isp_id: list[int | None]
+
+
+class ISPBatchDetectionResponse(BaseModel):
+    """Bulk ISP detection response schema."""
+
+    count: int = Field(..., description="조회한 고유 주소 수")
+    detected: int = Field(..., description="통신사를 찾은 주소 수")
+    invalid: list[str] = Field(default_factory=list, description="잘못된 주소")
+    results: list[ISPDetectionResponse] | None = Field(
+        None, description="format=records 결과 (주소 순)"
+    )
+    columns: ISPDetectionColumns | None = Field(None, description="format=columnar 결과 (주소 순)")
+    isps: list[ISPResponse] | None = Field(
+        None, description="format=columnar에서 isp_id가 가리키는 통신사"
+    )
+
+
+# Cache Stats Schema
+class CacheStatsResponse(BaseModel):
+    """In-process cache counters."""
+
+    resolve: dict[str, int] = Field(..., description="DNS 응답 캐시")
+    asn: dict[str, int] = Field(..., description="ASN 조회 캐시")
+    shared: dict[str, int] = Field(..., description="워커 간 공유 메모리 캐시 (이 워커의 카운터)")
+
+
+# Latency Stats Schemas
+class LatencySummary(BaseModel):
+    """Query volume, success rate and latency percentiles."""
+
+    queries: int = Field(..., description="업스트림 쿼리 수 (캐시 응답 제외)")
+    successes: int = Field(..., description="성공한 쿼리 수")
+    success_rate: float | None = Field(None, description="성공률 (0~1)")
+    p50_ms: float | None = Field(None, description="응답 시간 p50 (성공한 쿼리 기준)")
+    p90_ms: float | None = Field(None, description="응답 시간 p90")
+    p99_ms: float | None = Field(None, description="응답 시간 p99")
+    max_ms: float | None = Field(None, description="최대 응답 시간")
+
+
+class DNSServerStats(LatencySummary):
+    """Latency stats of one DNS server."""
+
+    dns_server: str
+    isp_ids: list[int] = Field(default_factory=list, description="이 서버를 사용하는 통신사 ID")
+
+
+class ISPStats(LatencySummary):
+    """Latency stats of one ISP across its DNS servers."""
+
+    isp_id: int
+    isp_name: str | None = None
+
+
+class LatencyPoint(LatencySummary):
+    """Latency stats of one time window."""
+
+    window_start: datetime
+
+
+class LatencyTimeseriesResponse(BaseModel):
+    """Per-window latency stats of one DNS server or ISP."""
+
+    dns_server: str | None = None
+    isp_id: int | None = None
+    window_seconds: int = Field(..., description="시간 구간 크기 (초)")
+    points: list[LatencyPoint]
+
+
 # Health Check Schema
 class HealthResponse(BaseModel):
     """Health check response."""
@@ -1,5 +1,7 @@
 """Application configuration."""
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -17,9 +19,133 @@ class Settings(BaseSettings):
     log_level: str = "info"
     cors_origins: str = "*"
 
+    # DNS resolver
+    dns_port: int = 53
+    dns_timeout: float = 2.0  # seconds per attempt
+    dns_retries: int = 1  # extra attempts after a timeout
+    dns_resolver_pool_size: int = 256  # cached per-nameserver resolvers
+
+    # Multiplexed UDP query engine (explicit nameservers)
+    dns_udp_engine_enabled: bool = True
+    dns_udp_sockets_per_upstream: int = 4
+    dns_udp_socket_max_queries: int = 64  # then the socket gets a new random source port
+    dns_timer_resolution: float = 0.01  # seconds per timer wheel tick
+
+    # Encrypted DNS (DoH/DoT)
+    doh_max_connections: int = 20
+    dot_port: int = 853
+    encrypted_dns_idle_timeout: float = 60.0  # seconds before a pooled connection is replaced
+
+    # DNS answer cache
+    dns_cache_enabled: bool = True
+    dns_cache_max_bytes: int = 32 * 1024 * 1024
+    dns_cache_max_ttl: int = 86400
+    dns_cache_negative_max_ttl: int = 3600  # RFC 2308 cap for NXDOMAIN/NODATA
+
+    # Shared-memory L2 cache for resolve answers and ASN lookups (multi-worker hosts)
+    shared_cache_path: str = ""  # mmap file, e.g. /dev/shm/kresolver-cache; disabled when empty
+    shared_cache_slots: int = 65536
+    shared_cache_slot_size: int = 512  # bytes; larger entries are only cached per worker
+    shared_cache_ways: int = 8  # slots per hash set
+
+    # Per-upstream circuit breakers and in-flight limits (explicit nameservers)
+    circuit_breaker_enabled: bool = True
+    circuit_window_seconds: float = 30.0  # failure rate is measured over this window
+    circuit_min_queries: int = 10  # in the window before the circuit can open
+    circuit_failure_rate: float = 0.5  # timeouts, errors, SERVFAIL and REFUSED
+    circuit_open_seconds: float = 15.0  # then trial queries decide whether to close
+    circuit_half_open_queries: int = 1  # trial queries in flight while half-open
+    upstream_max_inflight: int = 100  # queries in flight per upstream; more wait for a slot
+    upstream_queue_timeout: float = 0.5  # seconds to wait for a slot before failing
+    circuit_max_upstreams: int = 1024  # breakers kept; open or busy ones are never dropped
+
+    # Hedged resolution across an ISP's servers (resolve with isp_id)
+    dns_hedge_quantile: float = 0.95  # of recent latency; then the next server is queried too
+    dns_hedge_min_delay_ms: float = 10.0
+    dns_hedge_max_delay_ms: float = 500.0
+    dns_hedge_default_delay_ms: float = 100.0  # until a server has dns_hedge_min_samples
+    dns_hedge_min_samples: int = 20
+    dns_hedge_window: int = 128  # recent response times kept per server
+    dns_hedge_max_servers: int = 1024  # servers with recent response times kept (LRU)
+
+    # Batch resolve
+    batch_max_queries: int = 1000  # domains x servers x record types per request
+    batch_concurrency: int = 20
+    batch_max_concurrency: int = 100
+
+    # Cross-ISP comparison
+    compare_deadline_s: float = 3.0
+    compare_max_deadline_s: float = 10.0
+
     # Optional: MaxMind for IP to ISP
     maxmind_license_key: str = ""
 
+    # IP to ASN lookup
+    asn_db_path: str = ""  # pfx2as, CSV or GeoLite2-ASN .mmdb file
+    asn_http_fallback: bool = True  # query bgpview.io when the local index has no match
+    asn_api_url: str = "https://api.bgpview.io"
+    asn_http_timeout: float = 5.0
+    asn_http_max_connections: int = 20
+    asn_cache_ttl: int = 6 * 3600  # per covering prefix
+    asn_cache_negative_ttl: int = 60  # failed or empty lookups, per IP
+    asn_cache_max_entries: int = 100_000
+    detect_batch_max_addresses: int = 10_000  # per /api/detect-isp/batch request (local index only)
+
+    # Query log write-behind
+    query_log_queue_size: int = 10_000
+    query_log_batch_size: int = 500
+    query_log_flush_interval: float = 1.0  # seconds
+    query_log_overflow_policy: Literal["drop", "block"] = "drop"
+    query_log_shutdown_timeout: float = 10.0
+
+    # Query log partitions, rollups and retention
+    query_log_maintenance_enabled: bool = True
+    query_log_maintenance_interval: float = 3600.0  # seconds
+    query_log_partition_interval: Literal["day", "month"] = "month"
+    query_log_partitions_ahead: int = 2  # future partitions kept ready
+    query_log_retention_days: int = 90  # raw rows, dropped a partition at a time
+    query_log_rollup_retention_days: int = 730
+    query_log_rollup_delay: int = 300  # seconds behind now before an hour is rolled up
+
+    # Latency statistics
+    stats_window_seconds: int = 300  # sketch granularity
+    stats_retention_seconds: int = 86400
+    stats_relative_accuracy: float = 0.01  # percentile error bound
+    stats_checkpoint_path: str = ""  # JSON checkpoint file, disabled when empty
+    stats_checkpoint_interval: float = 60.0
+
+    # DNS server health probing
+    health_probe_enabled: bool = True
+    health_probe_interval: float = 30.0  # seconds between rounds
+    health_probe_domain: str = "google.com"  # canary name, must resolve
+    health_probe_rate: float = 20.0  # probes per second, shared by all workers
+    health_probe_burst: int = 5
+    health_probe_concurrency: int = 50
+    health_ewma_alpha: float = 0.3
+    health_unhealthy_after: int = 3  # consecutive failed probes
+    health_max_loss_rate: float = 0.5
+    health_snapshot_path: str = ""  # JSON snapshot file, disabled when empty
+
+    # Prometheus metrics
+    metrics_enabled: bool = True
+    metrics_max_series: int = 2000  # per metric; further label sets collapse into "other"
+
+    # Per-request profiling (collapsed stacks for flamegraphs)
+    profiling_enabled: bool = False
+    profiling_header: str = "X-Profile"  # requests sending it are captured
+    profiling_sample_rate: float = 0.0  # share of requests captured at random
+    profiling_slow_threshold_ms: int = 1000  # slower requests are captured (0 disables)
+    profiling_interval_ms: float = 5.0  # stack sampling interval
+    profiling_window_seconds: float = 120.0  # stack samples kept for slow captures
+    profiling_dir: str = "profiles"
+    profiling_max_files: int = 200
+
+    # Catalog snapshot
+    catalog_poll_interval: float = 5.0  # seconds between catalog_version checks
+    catalog_cache_max_age: int = 60  # Cache-Control max-age of pre-rendered catalog responses
+    catalog_gzip_level: int = 9
+    catalog_brotli_quality: int = 11  # used when the optional brotli package is installed
+
     # Environment
     env: str = "development"
 
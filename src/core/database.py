@@ -7,6 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from sqlalchemy.orm import DeclarativeBase
 
 from src.core.config import settings
+from src.core.metrics import Gauge, registry
+from src.core.profiling import phase
 
 # Convert postgresql:// to postgresql+psycopg://
 DATABASE_URL = settings.database_url.replace("postgresql://", "postgresql+psycopg://")
@@ -20,6 +22,26 @@ engine = create_async_engine(
     max_overflow=20,
 )
 
+
+def _pool_stats() -> list[tuple[tuple[str, ...], float]]:
+    pool = engine.sync_engine.pool
+    # Only QueuePool has these; the SQLite test pools do not
+    return [
+        ((name,), getattr(pool, name)())
+        for name in ("size", "checkedout", "overflow", "checkedin")
+        if callable(getattr(pool, name, None))
+    ]
+
+
+registry.register(
+    Gauge(
+        "kresolver_db_pool_connections",
+        "SQLAlchemy connection pool state (size, checkedout, overflow, checkedin)",
+        ("state",),
+        collect=_pool_stats,
+    )
+)
+
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -35,12 +57,13 @@ class Base(DeclarativeBase):
     pass
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_db() -> AsyncGenerator[AsyncSession]:
     """Dependency for getting async database session."""
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            with phase("db_commit"):
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
@@ -49,7 +72,7 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 
 @asynccontextmanager
-async def get_db_context() -> AsyncGenerator[AsyncSession, None]:
+async def get_db_context() -> AsyncGenerator[AsyncSession]:
     """Context manager for database session."""
     async with AsyncSessionLocal() as session:
         try:
@@ -0,0 +1,311 @@
+"""Prometheus metrics without a client library.
+
+Metrics live in plain dicts keyed by label tuples. Updates happen on the event
+loop thread, so they need no locks: an increment is one dict lookup and one
+store. Values that other components already count (ASN cache, query log
+writer, DB pool) are read at scrape time through collectors instead of being
+updated on the hot path.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from src.core.config import settings
+
+LabelValues = tuple[str, ...]
+Sample = tuple[str, dict[str, str], float]  # (suffix, labels, value)
+
+# Seconds; covers a cache hit through a DNS timeout
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+OVERFLOW = "other"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return (
+        repr(float(value))
+        if isinstance(value, float) and not value.is_integer()
+        else str(int(value))
+    )
+
+
+class Metric(ABC):
+    """Base class: name, help text, label names and series bookkeeping."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._overflow: LabelValues = (OVERFLOW,) * len(self.labelnames)
+
+    def _key(self, series: dict, labels: LabelValues) -> LabelValues:
+        """Collapse new label sets into one ``other`` series past ``metrics_max_series``."""
+        if labels in series or len(series) < settings.metrics_max_series:
+            return labels
+        return self._overflow
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """(suffix, labels, value) for each exposed sample."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every series."""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(self._values, labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in list(self._values.items()):
+            yield "_total", dict(zip(self.labelnames, labels, strict=True)), value
+
+    def clear(self) -> None:
+        self._values.clear()
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; per-series counts are stored per bucket and summed at scrape."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self._series: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        key = self._key(self._series, labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, series in list(self._series.items()):
+            base = dict(zip(self.labelnames, labels, strict=True))
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1], strict=True):
+                cumulative += count
+                yield "_bucket", {**base, "le": _format_value(bound)}, cumulative
+            yield "_count", base, cumulative
+            yield "_sum", base, series[-1]
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+class Gauge(Metric):
+    """Gauge whose samples come from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        collect: Callable[[], Iterable[tuple[LabelValues, float]]] = lambda: (),
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        for labels, value in self.collect():
+            yield "", dict(zip(self.labelnames, labels, strict=True)), value
+
+    def clear(self) -> None:
+        pass
+
+
+class CounterView(Gauge):
+    """Counter read at scrape time from a component that already counts it."""
+
+    kind = "counter"
+
+    def samples(self) -> Iterable[Sample]:
+        for _, labels, value in super().samples():
+            yield "_total", labels, value
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Any) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for suffix, labels, value in metric.samples():
+                    lines.append(
+                        f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+                    )
+            except Exception as e:  # a broken collector must not break the scrape
+                lines.append(f"# collect failed: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Reset every recorded series (collectors are unaffected)."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "kresolver_http_request_duration_seconds",
+        "HTTP request latency by route template",
+        ("method", "route", "status"),
+    )
+)
+upstream_dns_duration = registry.register(
+    Histogram(
+        "kresolver_upstream_dns_duration_seconds",
+        "Upstream DNS query latency (cache misses only)",
+        ("dns_server", "transport"),
+    )
+)
+upstream_dns_responses = registry.register(
+    Counter(
+        "kresolver_upstream_dns_responses",
+        "Upstream DNS outcomes by rcode (TIMEOUT/ERROR when there was no usable response)",
+        ("dns_server", "rcode"),
+    )
+)
+isp_resolves = registry.register(
+    Counter(
+        "kresolver_isp_resolves",
+        "ISP-mode resolves by which server answered (primary, primary_hedged, hedge, failed)",
+        ("outcome",),
+    )
+)
+asn_lookup_duration = registry.register(
+    Histogram(
+        "kresolver_asn_lookup_duration_seconds",
+        "IP to ASN lookup latency by source",
+        ("source",),
+    )
+)
+query_log_write_duration = registry.register(
+    Histogram(
+        "kresolver_query_log_write_duration_seconds",
+        "Latency of one QueryLog batch INSERT",
+        ("outcome",),
+    )
+)
+
+
+class Timer:
+    """Context manager observing elapsed seconds into a histogram."""
+
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, *labels: str) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests per route template (not raw path)."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+            )
@@ -0,0 +1,246 @@
+"""Opt-in per-request profiling and slow-request capture.
+
+Two kinds of data are collected for a request:
+
+- Phase timings: code wraps interesting sections (upstream DNS, DB commit,
+  ASN lookup) in ``phase()``. This is one contextvar lookup when the request
+  is not being profiled.
+- Stack samples: a daemon thread samples the event-loop thread's stack every
+  ``profiling_interval_ms`` into a rolling window. A captured request takes
+  the samples that fall inside its start and end time. Every request shares
+  the loop, so these show what the process was doing during the request
+  (including idle time in the selector), not just this request's frames.
+
+Because samples are kept for a rolling window, requests that turn out to be
+slow can still be captured after they finish.
+
+Captures are written in the collapsed-stack format read by flamegraph.pl and
+speedscope, weighted in microseconds. Phases are under a ``phases`` root
+frame and samples under a ``stacks`` root frame. Files go to a directory
+that keeps at most ``profiling_max_files`` captures.
+"""
+
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any
+
+from src.core.config import settings
+
+Stack = tuple[str, ...]
+
+
+class RequestProfile:
+    """Phase timings collected for one request."""
+
+    __slots__ = ("started", "phases")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}  # name -> seconds (concurrent phases add up)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+_current: ContextVar[RequestProfile | None] = ContextVar("request_profile", default=None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a section of the current request (no-op outside a profiled request)."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into a rolling window."""
+
+    def __init__(self, interval: float, window: float) -> None:
+        self.interval = interval
+        self.samples: deque[tuple[float, Stack]] = deque(maxlen=max(1, int(window / interval)))
+        self._names: dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._target: int | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, thread_id: int | None = None) -> None:
+        """Start sampling ``thread_id`` (default: the calling thread)."""
+        if self.running:
+            return
+        self._target = thread_id if thread_id is not None else threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _frame_name(self, code: CodeType, frame: FrameType) -> str:
+        name = self._names.get(code)
+        if name is None:
+            module = frame.f_globals.get("__name__", "?")
+            name = self._names[code] = f"{module}:{code.co_qualname}"
+        return name
+
+    def sample(self) -> Stack | None:
+        """Take one sample of the target thread (root frame first)."""
+        frame: FrameType | None = sys._current_frames().get(self._target)  # type: ignore[arg-type]
+        if frame is None:
+            return None
+        names = []
+        while frame is not None:
+            names.append(self._frame_name(frame.f_code, frame))
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            stack = self.sample()
+            if stack is not None:
+                self.samples.append((time.perf_counter(), stack))
+
+    def between(self, start: float, end: float) -> Counter[Stack]:
+        """Count the samples taken between ``start`` and ``end`` (perf_counter seconds)."""
+        # list() copies under the GIL, so the sampler thread cannot mutate it mid-iteration
+        return Counter(stack for at, stack in list(self.samples) if start <= at <= end)
+
+
+class ProfileStore:
+    """Directory of captures, pruned to the newest ``max_files``."""
+
+    def __init__(self, directory: str, max_files: int) -> None:
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def write(self, name: str, lines: list[str]) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        captures = sorted(self.directory.glob("*.folded"))
+        for old in captures[: max(0, len(captures) - self.max_files)]:
+            old.unlink(missing_ok=True)
+        return path
+
+
+stack_sampler = StackSampler(
+    settings.profiling_interval_ms / 1000, settings.profiling_window_seconds
+)
+
+
+def _frame(text: str) -> str:
+    # ';' separates frames and the last space separates the weight
+    return text.replace(";", ":").replace(" ", "_")
+
+
+def collapse(
+    label: str,
+    profile: RequestProfile,
+    total: float,
+    stacks: Counter[Stack],
+    interval: float,
+) -> list[str]:
+    """Render phases and stack samples as collapsed-stack lines weighted in microseconds."""
+    root = _frame(label)
+    lines = []
+    attributed = 0.0
+    for name, seconds in sorted(profile.phases.items()):
+        frames = ";".join(_frame(part) for part in name.split(";"))  # ';' nests phases
+        lines.append(f"phases;{root};{frames} {round(seconds * 1e6)}")
+        attributed += seconds
+    # Validation, serialization, middleware and waiting for the loop
+    lines.append(f"phases;{root};unattributed {round(max(0.0, total - attributed) * 1e6)}")
+    for stack, count in stacks.most_common():
+        frames = ";".join(_frame(name) for name in stack)
+        lines.append(f"stacks;{frames} {round(count * interval * 1e6)}")
+    return lines
+
+
+class ProfilingMiddleware:
+    """ASGI middleware capturing profiles for opted-in, sampled or slow requests.
+
+    Inactive unless ``profiling_enabled``. A request is captured when it sends
+    the ``profiling_header`` header, when it falls in ``profiling_sample_rate``,
+    or when it takes longer than ``profiling_slow_threshold_ms``. Captured
+    requests that were selected up front get an ``X-Profile-Id`` response header.
+    """
+
+    def __init__(self, app: Any, sampler: StackSampler = stack_sampler) -> None:
+        self.app = app
+        self.sampler = sampler
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not settings.profiling_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        header = settings.profiling_header.lower().encode()
+        if any(name == header for name, _ in scope.get("headers", ())):
+            trigger: str | None = "header"
+        elif settings.profiling_sample_rate and random.random() < settings.profiling_sample_rate:
+            trigger = "sampled"
+        else:
+            trigger = None
+
+        profile = RequestProfile()
+        capture_id = f"{time.time_ns()}-{random.getrandbits(16):04x}"
+        token = _current.set(profile)
+        status = 500
+
+        async def send_wrapper(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trigger is not None:
+                    headers = [*message.get("headers", []), (b"x-profile-id", capture_id.encode())]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            ended = time.perf_counter()
+            total = ended - profile.started
+            if trigger is None and 0 < settings.profiling_slow_threshold_ms <= total * 1000:
+                trigger = "slow"
+            if trigger is not None:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                label = f"{scope['method']} {route}"
+                lines = collapse(
+                    label,
+                    profile,
+                    total,
+                    self.sampler.between(profile.started, ended),
+                    self.sampler.interval,
+                )
+                name = f"{capture_id}-{trigger}-{round(total * 1000)}ms-{status}.folded"
+                store = ProfileStore(settings.profiling_dir, settings.profiling_max_files)
+                try:
+                    # The response has been sent; this only delays the ASGI call returning
+                    await asyncio.to_thread(store.write, name, lines)
+                except OSError as e:
+                    print(f"❌ Profile capture failed: {e}")
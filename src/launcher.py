@@ -0,0 +1,185 @@
+"""Pre-fork launcher: build read-only state once, then fork the workers.
+
+The master process imports the app and loads the large read-only structures
+(the IP to ASN index, the catalog snapshot and its pre-rendered responses)
+before forking. ``gc.freeze()`` then moves every object into the permanent
+generation, so garbage collections in the workers do not write to those
+pages and they stay shared copy-on-write. Workers skip the loads they
+inherited and start almost immediately.
+
+Each worker binds its own listening socket with ``SO_REUSEPORT`` and the
+kernel balances connections across them. Workers that exit unexpectedly are
+re-forked from the master; SIGTERM or SIGINT to the master shuts all of them
+down gracefully.
+
+Usage:
+    python -m src.launcher --workers 4 --port 8000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+import uvicorn
+
+from src.core.config import settings
+from src.services.latency_stats import WORKER_COUNT_ENV, WORKER_INDEX_ENV
+
+RESTART_BACKOFF = 1.0  # seconds before re-forking a worker that died right after starting
+
+
+def preload() -> None:
+    """Load the read-only structures that workers would otherwise each build."""
+    from src.api.catalog_responses import catalog_responses
+    from src.core.database import AsyncSessionLocal, engine
+    from src.main import app  # noqa: F401  (imports every module once, in the master)
+    from src.services.asn_index import load_asn_index
+    from src.services.catalog import catalog_store
+
+    if settings.asn_db_path:
+        try:
+            index = load_asn_index(settings.asn_db_path)
+            print(f"✅ ASN index preloaded: {len(index)} prefixes")
+        except Exception as e:
+            print(f"❌ ASN index load failed: {e}")
+
+    async def load_catalog() -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                catalog = await catalog_store.refresh(db)
+            catalog_responses.build(catalog)
+            print(f"✅ Catalog preloaded: {len(catalog.isps)} ISPs (version {catalog.version})")
+        except Exception as e:
+            print(f"❌ Catalog load failed: {e}")
+        finally:
+            # Pooled connections must not be inherited by the workers
+            await engine.dispose()
+
+    asyncio.run(load_catalog())
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """A listening socket that shares ``port`` with the other workers."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    # asyncio only sets TCP_NODELAY on accepted sockets whose proto is IPPROTO_TCP;
+    # with proto 0, Nagle holds the body behind the headers for a delayed ACK (~40 ms)
+    sock = socket.socket(family, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def _exit_before_serving(_signum: int, _frame: object | None) -> None:
+    raise SystemExit(0)
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Serve the app in a forked worker until it is told to stop."""
+    from src.main import app
+
+    os.setpgid(0, 0)  # Terminal signals go to the master, which forwards them once
+    # Until uvicorn installs its own handlers, a stop request just exits
+    signal.signal(signal.SIGTERM, _exit_before_serving)
+    signal.signal(signal.SIGINT, _exit_before_serving)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    gc.enable()
+
+    config = uvicorn.Config(
+        app,
+        log_level=args.log_level,
+        access_log=not args.no_access_log,
+        lifespan="on",
+    )
+    uvicorn.Server(config).run(sockets=[bind_socket(args.host, args.port)])
+
+
+class Launcher:
+    """Forks and supervises the workers."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.workers: dict[int, tuple[int, float]] = {}  # pid -> (worker index, start time)
+        self.stopping = False
+
+    def spawn(self, index: int) -> None:
+        sys.stdout.flush()  # Otherwise buffered output is written again by the child
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.environ[WORKER_INDEX_ENV] = str(index)  # Per-worker checkpoint files
+                os.environ[WORKER_COUNT_ENV] = str(self.args.workers)  # Shared probe budget
+                run_worker(self.args)
+                code = 0
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.workers[pid] = (index, time.monotonic())
+
+    def stop(self, _signum: int, _frame: object | None = None) -> None:
+        self.stopping = True
+        for pid in list(self.workers):
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for index in range(self.args.workers):
+            self.spawn(index)
+        print(f"✅ {self.args.workers} workers on {self.args.host}:{self.args.port}")
+
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker = self.workers.pop(pid, None)
+            if worker is None or self.stopping:
+                continue
+            index, started = worker
+            print(f"❌ Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting")
+            if time.monotonic() - started < RESTART_BACKOFF:
+                time.sleep(RESTART_BACKOFF)
+            if not self.stopping:
+                self.spawn(index)
+        return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-fork K-Resolver launcher")
+    parser.add_argument("--host", default=settings.api_host)
+    parser.add_argument("--port", type=int, default=settings.api_port)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-level", default=settings.log_level)
+    parser.add_argument("--no-access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    print(f"🚀 Preloading K-Resolver for {args.workers} workers...")
+    gc.disable()  # Everything preload() builds is frozen below; collecting it first is wasted work
+    started = time.perf_counter()
+    preload()
+    gc.collect()
+    gc.freeze()
+    print(f"✅ Preloaded in {time.perf_counter() - started:.1f}s")
+
+    return Launcher(args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
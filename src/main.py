@@ -1,18 +1,32 @@
 """Main FastAPI application."""
 
+import asyncio
+from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from sqlalchemy import text
 
 from src import __version__
+from src.api.catalog_responses import catalog_responses
 from src.api.routes import router as api_router
 from src.api.schemas import HealthResponse
 from src.core.config import settings
-from src.core.database import engine
+from src.core.database import AsyncSessionLocal, engine
+from src.core.metrics import MetricsMiddleware, registry
+from src.core.profiling import ProfilingMiddleware, stack_sampler
+from src.services.asn_client import asn_client
+from src.services.asn_index import get_asn_index, load_asn_index
+from src.services.catalog import catalog_store
+from src.services.dns_transports import doh_client, dot_pool
+from src.services.health_prober import health_prober
+from src.services.latency_stats import latency_stats, worker_checkpoint_path
+from src.services.log_maintenance import query_log_maintenance
+from src.services.query_logger import query_log_writer
+from src.services.shared_cache import shared_cache
+from src.services.udp_engine import udp_engine
 
 
 @asynccontextmanager
@@ -31,10 +45,95 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
 
+    # Load local IP to ASN index (unless inherited from the pre-fork launcher)
+    if settings.asn_db_path and get_asn_index() is None:
+        try:
+            index = await asyncio.to_thread(load_asn_index, settings.asn_db_path)
+            print(f"✅ ASN index loaded: {len(index)} prefixes")
+        except Exception as e:
+            print(f"❌ ASN index load failed: {e}")
+
+    await asn_client.start()
+    await doh_client.start()
+
+    # Map the cross-worker cache
+    if settings.shared_cache_path and shared_cache.open():
+        size_mb = shared_cache.stats()["bytes"] / (1024 * 1024)
+        print(f"✅ Shared cache mapped: {settings.shared_cache_path} ({size_mb:.0f} MB)")
+
+    # Load catalog snapshot and watch for changes (the watcher catches up on a preloaded one)
+    if catalog_store.snapshot is None:
+        try:
+            async with AsyncSessionLocal() as db:
+                catalog = await catalog_store.refresh(db)
+            catalog_responses.build(catalog)
+            print(f"✅ Catalog loaded: {len(catalog.isps)} ISPs (version {catalog.version})")
+        except Exception as e:
+            print(f"❌ Catalog load failed: {e}")
+    catalog_watcher = asyncio.create_task(catalog_store.watch(settings.catalog_poll_interval))
+
+    query_log_writer.start()
+
+    # Sample event-loop stacks so slow requests can be profiled after the fact
+    if settings.profiling_enabled:
+        stack_sampler.start()
+        print(f"🔬 Request profiling enabled: captures in {settings.profiling_dir}/")
+
+    # Probe DNS server health in the background
+    prober = None
+    if settings.health_probe_enabled:
+        if settings.health_snapshot_path:
+            try:
+                servers = health_prober.load(settings.health_snapshot_path)
+                print(f"✅ DNS health snapshot restored: {servers} servers")
+            except Exception as e:
+                print(f"❌ DNS health snapshot restore failed: {e}")
+        prober = asyncio.create_task(health_prober.run_forever(settings.health_probe_interval))
+
+    # Restore latency stats and checkpoint them periodically
+    stats_checkpointer = None
+    stats_checkpoint_path = worker_checkpoint_path(settings.stats_checkpoint_path)
+    if settings.stats_checkpoint_path:
+        try:
+            windows = latency_stats.load(stats_checkpoint_path)
+            print(f"✅ Latency stats restored: {windows} windows")
+        except Exception as e:
+            print(f"❌ Latency stats restore failed: {e}")
+        stats_checkpointer = asyncio.create_task(
+            latency_stats.checkpoint_forever(
+                stats_checkpoint_path, settings.stats_checkpoint_interval
+            )
+        )
+
+    # Query log partitions, rollups and retention
+    log_maintenance = None
+    if settings.query_log_maintenance_enabled:
+        log_maintenance = asyncio.create_task(
+            query_log_maintenance.run_forever(settings.query_log_maintenance_interval)
+        )
+
     yield
 
     # Shutdown
     print("👋 Shutting down K-Resolver API...")
+    catalog_watcher.cancel()
+    if prober is not None:
+        prober.cancel()
+    if log_maintenance is not None:
+        log_maintenance.cancel()
+    if stats_checkpointer is not None:
+        stats_checkpointer.cancel()
+        try:
+            latency_stats.save(stats_checkpoint_path)
+        except Exception as e:
+            print(f"❌ Latency stats checkpoint failed: {e}")
+    stack_sampler.stop()
+    await query_log_writer.stop()
+    await asn_client.close()
+    shared_cache.close()
+    await doh_client.close()
+    await dot_pool.close()
+    await udp_engine.close()
     await engine.dispose()
 
 
@@ -53,6 +152,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Include API routes
 app.include_router(api_router)
@@ -201,3 +302,13 @@ async def health_check() -> HealthResponse:
         version=__version__,
         database=db_status,
     )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Prometheus metrics in the text exposition format."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,5 +1,5 @@
 """Database models."""
 
-from src.models.dns import DNSServer, ISP, ASNMapping, QueryLog
+from src.models.dns import ISP, ASNMapping, CatalogVersion, DNSServer, QueryLog, QueryLogRollup
 
-__all__ = ["DNSServer", "ISP", "ASNMapping", "QueryLog"]
+__all__ = ["DNSServer", "ISP", "ASNMapping", "CatalogVersion", "QueryLog", "QueryLogRollup"]
@@ -1,10 +1,25 @@
 """DNS and ISP database models."""
 
+import itertools
 from datetime import datetime
-from typing import Optional
-
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text, func
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from typing import Any
+
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    event,
+    func,
+    insert,
+    update,
+)
+from sqlalchemy.orm import Mapped, Session, mapped_column, relationship
 
 from src.core.database import Base
 
@@ -16,20 +31,26 @@ class ISP(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
-    name_en: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    name_en: Mapped[str | None] = mapped_column(String(100), nullable=True)
     country: Mapped[str] = mapped_column(String(10), default="KR", nullable=False)
     isp_type: Mapped[str] = mapped_column(
         String(20), default="landline", nullable=False
     )  # landline, mobile, both
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
     )
 
     # Relationships
-    dns_servers: Mapped[list["DNSServer"]] = relationship(back_populates="isp", cascade="all, delete-orphan")
-    asn_mappings: Mapped[list["ASNMapping"]] = relationship(back_populates="isp", cascade="all, delete-orphan")
+    dns_servers: Mapped[list["DNSServer"]] = relationship(
+        back_populates="isp", cascade="all, delete-orphan"
+    )
+    asn_mappings: Mapped[list["ASNMapping"]] = relationship(
+        back_populates="isp", cascade="all, delete-orphan"
+    )
 
 
 class DNSServer(Base):
@@ -40,17 +61,23 @@ class DNSServer(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     isp_id: Mapped[int] = mapped_column(Integer, ForeignKey("isps.id"), nullable=False)
     ip_address: Mapped[str] = mapped_column(String(45), nullable=False)  # IPv4/IPv6
-    priority: Mapped[int] = mapped_column(Integer, default=1, nullable=False)  # 1=Primary, 2=Secondary
-    region: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # 지역 (서울, 부산 등)
+    priority: Mapped[int] = mapped_column(
+        Integer, default=1, nullable=False
+    )  # 1=Primary, 2=Secondary
+    region: Mapped[str | None] = mapped_column(String(50), nullable=True)  # 지역 (서울, 부산 등)
     server_type: Mapped[str] = mapped_column(
         String(20), default="standard", nullable=False
     )  # standard, doh, dot
-    doh_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)  # DNS-over-HTTPS URL
-    dot_hostname: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)  # DNS-over-TLS hostname
+    doh_url: Mapped[str | None] = mapped_column(String(255), nullable=True)  # DNS-over-HTTPS URL
+    dot_hostname: Mapped[str | None] = mapped_column(
+        String(255), nullable=True
+    )  # DNS-over-TLS hostname
     is_anycast: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
-    notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+    notes: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
     )
@@ -67,25 +94,90 @@ class ASNMapping(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     isp_id: Mapped[int] = mapped_column(Integer, ForeignKey("isps.id"), nullable=False)
     asn: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
-    as_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
+    as_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
 
     # Relationships
     isp: Mapped["ISP"] = relationship(back_populates="asn_mappings")
 
 
 class QueryLog(Base):
-    """DNS 쿼리 로그 (통계/분석용)."""
+    """DNS 쿼리 로그 (통계/분석용).
+
+    PostgreSQL에서는 created_at 기준 범위 파티션 테이블입니다 (PK: id, created_at).
+    파티션 생성/삭제는 QueryLogMaintenance가 담당합니다.
+    """
 
     __tablename__ = "query_logs"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    client_ip: Mapped[Optional[str]] = mapped_column(String(45), nullable=True)
+    # BIGINT like the partitioned table; SQLite only autoincrements INTEGER keys
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True, index=True
+    )
+    client_ip: Mapped[str | None] = mapped_column(String(45), nullable=True)
     domain: Mapped[str] = mapped_column(String(255), nullable=False)
     dns_server: Mapped[str] = mapped_column(String(45), nullable=False)
-    response_time_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    response_time_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
     success: Mapped[bool] = mapped_column(Boolean, nullable=False)
-    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), nullable=False, index=True
     )
+
+
+class QueryLogRollup(Base):
+    """시간별 쿼리 로그 집계 (dns_server/domain 단위)."""
+
+    __tablename__ = "query_log_rollups"
+    __table_args__ = (UniqueConstraint("bucket_start", "dns_server", "domain"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    dns_server: Mapped[str] = mapped_column(String(45), nullable=False)
+    domain: Mapped[str] = mapped_column(String(255), nullable=False)
+    query_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    success_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    latency_sum_ms: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    # Counts per LATENCY_BUCKETS_MS upper bound, plus one overflow bucket
+    latency_buckets: Mapped[list[int]] = mapped_column(JSON, nullable=False)
+
+
+class CatalogVersion(Base):
+    """카탈로그(통신사/DNS 서버/ASN 매핑) 변경 버전 카운터."""
+
+    __tablename__ = "catalog_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+CATALOG_VERSION_ID = 1
+CATALOG_MODELS = (ISP, DNSServer, ASNMapping)
+
+
+@event.listens_for(Session, "after_flush")
+def bump_catalog_version(session: Session, _flush_context: Any) -> None:
+    """Bump the catalog version whenever ISPs, DNS servers or ASN mappings change."""
+    changed = any(
+        isinstance(obj, CATALOG_MODELS)
+        for obj in itertools.chain(session.new, session.dirty, session.deleted)
+    )
+    if not changed:
+        return
+
+    table = CatalogVersion.__table__
+    connection = session.connection()
+    result = connection.execute(
+        update(table)
+        .where(table.c.id == CATALOG_VERSION_ID)
+        .values(version=table.c.version + 1, updated_at=func.now())
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(id=CATALOG_VERSION_ID, version=1))
+
+    session.info["catalog_changed"] = True
@@ -0,0 +1,272 @@
+"""Remote IP to ASN lookups with a pooled client and prefix-level caching."""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+import httpx
+
+from src.core.config import settings
+from src.core.metrics import CounterView, Gauge, registry
+from src.services.asn_index import ip_to_int, parse_prefix
+from src.services.shared_cache import SharedCache, shared_cache
+
+PrefixKey = tuple[int, int, int]  # (version, network int, prefix length)
+
+# Shared-cache entries cover this block around the looked-up address when the
+# announced prefix is at least as wide (BGP rarely carries longer prefixes)
+SHARED_BLOCK_LENGTHS = {4: 24, 6: 48}
+
+
+class ASNLookupClient:
+    """BGPView ASN lookups over one long-lived HTTP/2 connection pool.
+
+    Positive results are cached per covering prefix, so every address in an
+    announced /24 is answered by one lookup. Failures and misses are cached per
+    IP for a short time, and concurrent lookups for the same IP share one request.
+    With a ``shared`` cache, results are also shared with the other workers.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport | None = None,
+        shared: SharedCache | None = None,
+    ) -> None:
+        self._transport = transport
+        self.shared = shared
+        self._client: httpx.AsyncClient | None = None
+        self._prefixes: OrderedDict[PrefixKey, tuple[dict, float]] = OrderedDict()
+        self._prefix_lengths: dict[int, set[int]] = {4: set(), 6: set()}
+        self._negative: OrderedDict[str, float] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    async def start(self) -> None:
+        """Open the pooled HTTP client."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.asn_api_url,
+                http2=self._transport is None,
+                transport=self._transport,
+                timeout=settings.asn_http_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.asn_http_max_connections,
+                    max_keepalive_connections=settings.asn_http_max_connections,
+                ),
+                headers={"Accept": "application/json"},
+            )
+
+    async def close(self) -> None:
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _cached(self, ip_address: str) -> tuple[bool, dict | None]:
+        """Return (found, result) from the prefix and negative caches."""
+        now = time.monotonic()
+
+        expires_at = self._negative.get(ip_address)
+        if expires_at is not None:
+            if expires_at > now:
+                return True, None
+            del self._negative[ip_address]
+
+        try:
+            version, address = ip_to_int(ip_address)
+        except ValueError:
+            return True, None
+
+        bits = 32 if version == 4 else 128
+        for length in sorted(self._prefix_lengths[version], reverse=True):
+            host_bits = bits - length
+            key = (version, (address >> host_bits) << host_bits, length)
+            entry = self._prefixes.get(key)
+            if entry is None:
+                continue
+            if entry[1] <= now:
+                del self._prefixes[key]
+                continue
+            self._prefixes.move_to_end(key)
+            return True, entry[0]
+
+        return False, None
+
+    def _store(self, ip_address: str, result: dict | None, ttl: float | None = None) -> None:
+        now = time.monotonic()
+
+        prefix = result.get("prefix") if result else None
+        if result is None or not prefix:
+            self._negative[ip_address] = now + (ttl or settings.asn_cache_negative_ttl)
+            while len(self._negative) > settings.asn_cache_max_entries:
+                self._negative.popitem(last=False)
+            return
+
+        try:
+            key = parse_prefix(prefix)
+        except ValueError:
+            return
+        self._prefixes[key] = (result, now + (ttl or settings.asn_cache_ttl))
+        self._prefix_lengths[key[0]].add(key[2])
+        while len(self._prefixes) > settings.asn_cache_max_entries:
+            self._prefixes.popitem(last=False)
+
+    @staticmethod
+    def _shared_keys(ip_address: str) -> tuple[str, str]:
+        """(covering block key, per-IP key) of an address in the shared cache."""
+        version, address = ip_to_int(ip_address)
+        host_bits = (32 if version == 4 else 128) - SHARED_BLOCK_LENGTHS[version]
+        return f"asn\x00{version}\x00{address >> host_bits}", f"asn\x00ip\x00{ip_address}"
+
+    def _cached_shared(self, ip_address: str) -> tuple[bool, dict | None]:
+        """Look an address up in the shared cache, keeping a local copy of a hit."""
+        if self.shared is None:
+            return False, None
+        try:
+            keys = self._shared_keys(ip_address)
+        except ValueError:
+            return False, None
+
+        for key in keys:
+            found = self.shared.get_json(key)
+            if found is None:
+                continue
+            result, expires_at = found
+            remaining = expires_at - time.time()
+            if remaining < 1:
+                continue
+            self._store(ip_address, result, remaining)
+            self.shared_hits += 1
+            return True, result
+        return False, None
+
+    def _store_shared(self, ip_address: str, result: dict | None) -> None:
+        if self.shared is None:
+            return
+        try:
+            block_key, ip_key = self._shared_keys(ip_address)
+        except ValueError:
+            return
+        if result is None or not result.get("prefix"):
+            self.shared.set_json(ip_key, None, settings.asn_cache_negative_ttl)
+            return
+        try:
+            version, _, length = parse_prefix(result["prefix"])
+        except ValueError:
+            return
+        wide = length <= SHARED_BLOCK_LENGTHS[version]
+        self.shared.set_json(block_key if wide else ip_key, result, settings.asn_cache_ttl)
+
+    async def lookup(self, ip_address: str) -> dict | None:
+        """Return ``{"asn", "as_name", "prefix"}`` for an IP, or None."""
+        found, result = self._cached(ip_address)
+        if not found:
+            found, result = self._cached_shared(ip_address)
+        if found:
+            if result is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return result
+
+        task = self._inflight.get(ip_address)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._fetch_and_store(ip_address))
+        self._inflight[ip_address] = task
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, ip_address: str) -> dict | None:
+        try:
+            result = await self._fetch(ip_address)
+            self._store(ip_address, result)
+            self._store_shared(ip_address, result)
+            return result
+        finally:
+            self._inflight.pop(ip_address, None)
+
+    async def _fetch(self, ip_address: str) -> dict | None:
+        if self._client is None:
+            await self.start()
+        assert self._client is not None
+
+        try:
+            response = await self._client.get(f"/ip/{ip_address}")
+            if response.status_code != 200:
+                self.errors += 1
+                return None
+
+            prefixes = response.json().get("data", {}).get("prefixes", [])
+            if not prefixes:
+                return None
+
+            prefix = prefixes[0]
+            return {
+                "asn": prefix.get("asn", {}).get("asn"),
+                "as_name": prefix.get("asn", {}).get("name"),
+                "prefix": prefix.get("prefix"),
+            }
+
+        except Exception:
+            self.errors += 1
+            return None
+
+    def clear(self) -> None:
+        """Drop cached results and reset counters."""
+        self._prefixes.clear()
+        self._negative.clear()
+        self._prefix_lengths = {4: set(), 6: set()}
+        self.hits = self.negative_hits = self.shared_hits = 0
+        self.misses = self.coalesced = self.errors = 0
+
+    def stats(self) -> dict:
+        """Cache counters and occupancy."""
+        return {
+            "prefix_entries": len(self._prefixes),
+            "negative_entries": len(self._negative),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+        }
+
+
+asn_client = ASNLookupClient(shared=shared_cache)
+
+
+def _asn_cache_ratio() -> list[tuple[tuple[str, ...], float]]:
+    stats = asn_client.stats()
+    answered = stats["hits"] + stats["negative_hits"]
+    total = answered + stats["misses"] + stats["coalesced"]
+    return [((), answered / total if total else 0.0)]
+
+
+registry.register(
+    CounterView(
+        "kresolver_asn_cache_requests",
+        "Remote ASN lookups by cache result",
+        ("result",),
+        collect=lambda: [
+            ((result,), asn_client.stats()[result])
+            for result in ("hits", "negative_hits", "misses", "coalesced", "errors")
+        ],
+    )
+)
+registry.register(
+    Gauge(
+        "kresolver_asn_cache_hit_ratio",
+        "Share of remote ASN lookups answered from cache",
+        collect=_asn_cache_ratio,
+    )
+)
@@ -0,0 +1,209 @@
+"""In-memory ISP/DNS catalog snapshot.
+
+The catalog (ISPs, their DNS servers and ASN mappings) changes rarely, so read
+endpoints serve an immutable snapshot instead of querying the database. Writes
+through the ORM bump the ``catalog_version`` row and invalidate the local
+snapshot on commit; other workers notice the new version by polling it.
+"""
+
+import asyncio
+from collections.abc import Mapping
+from dataclasses import dataclass, fields
+from datetime import datetime
+from types import MappingProxyType
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.core.database import AsyncSessionLocal
+from src.models.dns import CATALOG_VERSION_ID, ISP, ASNMapping, CatalogVersion, DNSServer
+from src.services.isp_service import ISPService
+
+
+@dataclass(frozen=True, slots=True)
+class DNSServerEntry:
+    """Immutable copy of a DNS server row."""
+
+    id: int
+    isp_id: int
+    ip_address: str
+    priority: int
+    region: str | None
+    server_type: str
+    doh_url: str | None
+    dot_hostname: str | None
+    is_anycast: bool
+    is_active: bool
+    notes: str | None
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_orm(cls, server: DNSServer) -> "DNSServerEntry":
+        return cls(**{f.name: getattr(server, f.name) for f in fields(cls)})
+
+
+@dataclass(frozen=True, slots=True)
+class ISPEntry:
+    """Immutable copy of an ISP row with its DNS servers."""
+
+    id: int
+    name: str
+    name_en: str | None
+    country: str
+    isp_type: str
+    is_active: bool
+    created_at: datetime
+    updated_at: datetime
+    dns_servers: tuple[DNSServerEntry, ...]
+
+    @classmethod
+    def from_orm(cls, isp: ISP) -> "ISPEntry":
+        values = {f.name: getattr(isp, f.name) for f in fields(cls) if f.name != "dns_servers"}
+        servers = sorted(isp.dns_servers, key=lambda server: server.id)
+        return cls(**values, dns_servers=tuple(DNSServerEntry.from_orm(s) for s in servers))
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    """Immutable, indexed view of the catalog at one version."""
+
+    version: int
+    isps: tuple[ISPEntry, ...]
+    isps_by_id: Mapping[int, ISPEntry]
+    isps_by_asn: Mapping[int, ISPEntry]
+    servers_by_ip: Mapping[str, tuple[DNSServerEntry, ...]]
+    active_servers: tuple[DNSServerEntry, ...]
+    active_servers_by_isp: Mapping[int, tuple[DNSServerEntry, ...]]
+
+    @classmethod
+    def build(cls, version: int, isps: list[ISP], mappings: list[ASNMapping]) -> "CatalogSnapshot":
+        entries = tuple(ISPEntry.from_orm(isp) for isp in sorted(isps, key=lambda isp: isp.id))
+        by_id = {entry.id: entry for entry in entries}
+
+        # Several ISPs may share an ASN; the lowest ISP id wins
+        by_asn: dict[int, ISPEntry] = {}
+        for mapping in sorted(mappings, key=lambda m: (m.asn, m.isp_id)):
+            if mapping.isp_id in by_id:
+                by_asn.setdefault(mapping.asn, by_id[mapping.isp_id])
+
+        servers = [server for entry in entries for server in entry.dns_servers]
+        by_ip: dict[str, list[DNSServerEntry]] = {}
+        for server in servers:
+            by_ip.setdefault(server.ip_address, []).append(server)
+
+        active = tuple(
+            sorted(
+                (server for server in servers if server.is_active),
+                key=lambda server: (server.priority, server.id),
+            )
+        )
+        active_by_isp: dict[int, list[DNSServerEntry]] = {}
+        for server in active:
+            active_by_isp.setdefault(server.isp_id, []).append(server)
+
+        return cls(
+            version=version,
+            isps=entries,
+            isps_by_id=MappingProxyType(by_id),
+            isps_by_asn=MappingProxyType(by_asn),
+            servers_by_ip=MappingProxyType({ip: tuple(s) for ip, s in by_ip.items()}),
+            active_servers=active,
+            active_servers_by_isp=MappingProxyType({k: tuple(v) for k, v in active_by_isp.items()}),
+        )
+
+
+async def read_catalog_version(db: AsyncSession) -> int:
+    """Read the catalog version counter (0 if never bumped)."""
+    result = await db.execute(
+        select(CatalogVersion.version).where(CatalogVersion.id == CATALOG_VERSION_ID)
+    )
+    return result.scalar_one_or_none() or 0
+
+
+class CatalogStore:
+    """Holds the current catalog snapshot and swaps it when the catalog changes."""
+
+    def __init__(self) -> None:
+        self._snapshot: CatalogSnapshot | None = None
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot | None:
+        """The current snapshot without reloading (None before the first load)."""
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        """Mark the snapshot stale so the next read reloads it."""
+        self._stale = True
+
+    def clear(self) -> None:
+        """Drop the snapshot, so nothing is served until the next load."""
+        self._snapshot = None
+        self._stale = True
+
+    def set(self, snapshot: CatalogSnapshot) -> None:
+        """Serve a snapshot built outside the database (e.g. from an export)."""
+        self._snapshot = snapshot
+        self._stale = False
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        """Return the current snapshot, loading it with ``db`` if missing or stale."""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale:
+            return snapshot
+
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if self._snapshot is not None and not self._stale:
+                return self._snapshot
+            return await self._load(db)
+
+    async def refresh(self, db: AsyncSession) -> CatalogSnapshot:
+        """Rebuild the snapshot from the database and swap it in."""
+        async with self._lock:
+            return await self._load(db)
+
+    async def _load(self, db: AsyncSession) -> CatalogSnapshot:
+        # Clear the flag first so commits during the load mark it stale again
+        self._stale = False
+        try:
+            version = await read_catalog_version(db)
+            isps = await ISPService.get_all_isps(db, include_dns=True)
+            mappings = await ISPService.get_asn_mappings(db)
+        except Exception:
+            self._stale = True
+            raise
+
+        self._snapshot = CatalogSnapshot.build(version, isps, mappings)
+        return self._snapshot
+
+    async def watch(self, interval: float) -> None:
+        """Poll the version counter and reload on change (run as a background task)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    version = await read_catalog_version(db)
+                    if self._snapshot is None or self._stale or version != self._snapshot.version:
+                        await self.refresh(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Catalog refresh failed: {e}")
+
+
+catalog_store = CatalogStore()
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    if session.info.pop("catalog_changed", False):
+        catalog_store.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("catalog_changed", None)
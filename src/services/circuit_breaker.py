@@ -0,0 +1,299 @@
+"""Per-upstream circuit breakers and in-flight limits.
+
+Without them, every query aimed at a resolver that has gone dark waits out the
+full timeout, and a burst of queries to one ISP resolver can get us rate
+limited. Each explicit upstream gets a breaker:
+
+- closed: queries pass and their outcomes are counted over the last
+  ``circuit_window_seconds``. Once ``circuit_min_queries`` were counted and
+  the failed share reaches ``circuit_failure_rate``, the circuit opens.
+- open: queries fail immediately for ``circuit_open_seconds``.
+- half-open: up to ``circuit_half_open_queries`` trial queries pass; a
+  successful trial closes the circuit, a failed one opens it again.
+
+Independently, at most ``upstream_max_inflight`` queries are in flight per
+upstream; further queries wait up to ``upstream_queue_timeout`` for a slot.
+Health probes are never rejected by an open circuit, so they keep measuring
+the upstream while its circuit is open.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from datetime import UTC, datetime
+
+import dns.exception
+
+from src.core.config import settings
+from src.core.metrics import CounterView, Gauge, registry
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Outcomes that show the upstream is answering; everything else counts as a failure
+HEALTHY_RCODES = frozenset({"NOERROR", "NXDOMAIN"})
+
+
+class UpstreamUnavailable(dns.exception.DNSException):
+    """The upstream was not queried: its circuit is open or it has no free slot."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker and in-flight limit for one upstream server."""
+
+    def __init__(self, dns_server: str) -> None:
+        self.dns_server = dns_server
+        self.state = CLOSED
+        self.state_changed_at = time.time()
+        self.opened_until = 0.0  # monotonic
+        self.inflight = 0
+        self.trials = 0
+        self.opens = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.queries = 0  # in the window
+        self.failures = 0
+        self._buckets: deque[list[int]] = deque()  # [second, queries, failures]
+        self._slots = asyncio.Semaphore(settings.upstream_max_inflight)
+
+    def _prune(self, now: float) -> None:
+        oldest = int(now - settings.circuit_window_seconds)
+        while self._buckets and self._buckets[0][0] <= oldest:
+            _, queries, failures = self._buckets.popleft()
+            self.queries -= queries
+            self.failures -= failures
+
+    def _record(self, now: float, failed: bool) -> None:
+        second = int(now)
+        if self._buckets and self._buckets[-1][0] == second:
+            bucket = self._buckets[-1]
+        else:
+            bucket = [second, 0, 0]
+            self._buckets.append(bucket)
+            self._prune(now)
+        bucket[1] += 1
+        bucket[2] += failed
+        self.queries += 1
+        self.failures += failed
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        self.state_changed_at = time.time()
+        self._buckets.clear()
+        self.queries = self.failures = 0
+
+    def _open(self, now: float) -> None:
+        if self.state == CLOSED:
+            print(f"❌ Circuit opened for {self.dns_server}: {self.failures}/{self.queries} failed")
+        self._set_state(OPEN)
+        self.opened_until = now + settings.circuit_open_seconds
+        self.opens += 1
+
+    def is_open(self) -> bool:
+        """True while queries would be rejected without trying."""
+        return self.state == OPEN and time.monotonic() < self.opened_until
+
+    def evictable(self) -> bool:
+        """Whether the breaker can be dropped without closing a circuit or freeing slots."""
+        return self.state == CLOSED and self.inflight == 0 and self.trials == 0
+
+    async def acquire(self, probe: bool = False) -> bool:
+        """Take a slot for one query. Returns whether the query is a half-open trial.
+
+        Raises UpstreamUnavailable when the circuit is open or no slot frees up in time.
+        A ``probe`` (health check) skips the circuit state but still takes a slot.
+        """
+        now = time.monotonic()
+        if self.state == OPEN and not probe:
+            if now < self.opened_until:
+                self.rejected += 1
+                raise UpstreamUnavailable(
+                    f"Circuit open for {self.dns_server} (recent queries failed)",
+                    self.opened_until - now,
+                )
+            self._set_state(HALF_OPEN)
+
+        trial = self.state == HALF_OPEN and not probe
+        if trial:
+            if self.trials >= settings.circuit_half_open_queries:
+                self.rejected += 1
+                raise UpstreamUnavailable(
+                    f"Circuit half-open for {self.dns_server} (trial query in flight)",
+                    settings.dns_timeout,
+                )
+            self.trials += 1
+
+        try:
+            if self._slots.locked():
+                await asyncio.wait_for(self._slots.acquire(), settings.upstream_queue_timeout)
+            else:
+                await self._slots.acquire()
+        except BaseException as e:
+            if trial:
+                self.trials -= 1
+            if not isinstance(e, asyncio.TimeoutError):
+                raise
+            self.queue_timeouts += 1
+            raise UpstreamUnavailable(
+                f"Too many queries in flight to {self.dns_server}", settings.upstream_queue_timeout
+            ) from None
+
+        self.inflight += 1
+        return trial
+
+    def release(self, trial: bool, rcode: str | None) -> None:
+        """Free the slot and record the outcome (``rcode`` None: cancelled, not counted)."""
+        self.inflight -= 1
+        self._slots.release()
+        if trial:
+            self.trials -= 1
+        if rcode is None:
+            return
+
+        failed = rcode not in HEALTHY_RCODES
+        now = time.monotonic()
+        if trial:
+            if failed:
+                self._open(now)
+            else:
+                print(f"✅ Circuit closed for {self.dns_server}")
+                self._set_state(CLOSED)
+            return
+        if self.state != CLOSED:
+            return  # Answers to queries sent before the circuit opened
+
+        self._record(now, failed)
+        if (
+            self.queries >= settings.circuit_min_queries
+            and self.failures >= settings.circuit_failure_rate * self.queries
+        ):
+            self._open(now)
+
+    def stats(self) -> dict:
+        """State, window counters and rejections."""
+        now = time.monotonic()
+        self._prune(now)
+        return {
+            "dns_server": self.dns_server,
+            "state": self.state,
+            "state_changed_at": datetime.fromtimestamp(self.state_changed_at, UTC),
+            "retry_in_s": max(0.0, self.opened_until - now) if self.state == OPEN else None,
+            "queries": self.queries,
+            "failures": self.failures,
+            "failure_rate": self.failures / self.queries if self.queries else None,
+            "inflight": self.inflight,
+            "opens": self.opens,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+        }
+
+
+class CircuitBreakers:
+    """Breakers keyed by upstream address.
+
+    Up to ``circuit_max_upstreams`` are kept, dropping the least recently used
+    idle closed ones first. Open, half-open or busy breakers are never dropped:
+    a fresh breaker would close a tripped circuit and reset the in-flight limit.
+    A dropped breaker's lifetime counters are kept and carried over if the
+    upstream comes back, so the exported counters never go backwards.
+    """
+
+    def __init__(self) -> None:
+        self._breakers: OrderedDict[str, CircuitBreaker] = OrderedDict()
+        self._retired: dict[str, tuple[int, int, int]] = {}  # opens, rejected, queue timeouts
+
+    def get(self, dns_server: str) -> CircuitBreaker:
+        breaker = self._breakers.get(dns_server)
+        if breaker is not None:
+            self._breakers.move_to_end(dns_server)
+            return breaker
+
+        breaker = self._breakers[dns_server] = CircuitBreaker(dns_server)
+        retired = self._retired.pop(dns_server, None)
+        if retired is not None:
+            breaker.opens, breaker.rejected, breaker.queue_timeouts = retired
+        excess = len(self._breakers) - settings.circuit_max_upstreams
+        if excess > 0:
+            idle = [
+                address
+                for address, old in self._breakers.items()
+                if address != dns_server and old.evictable()
+            ]
+            for address in idle[:excess]:
+                old = self._breakers.pop(address)
+                if old.opens or old.rejected or old.queue_timeouts:
+                    self._retired[address] = (old.opens, old.rejected, old.queue_timeouts)
+        return breaker
+
+    def is_open(self, dns_server: str) -> bool:
+        breaker = self._breakers.get(dns_server)
+        return breaker is not None and breaker.is_open()
+
+    def all(self) -> list[CircuitBreaker]:
+        return sorted(self._breakers.values(), key=lambda breaker: breaker.dns_server)
+
+    def counters(self) -> list[tuple[str, int, int, int]]:
+        """Lifetime (opens, rejected, queue timeouts) per upstream, dropped breakers included."""
+        counters = [
+            (breaker.dns_server, breaker.opens, breaker.rejected, breaker.queue_timeouts)
+            for breaker in self._breakers.values()
+        ]
+        counters += [(address, *retired) for address, retired in self._retired.items()]
+        return sorted(counters)
+
+    def clear(self) -> None:
+        self._breakers.clear()
+        self._retired.clear()
+
+
+circuit_breakers = CircuitBreakers()
+
+registry.register(
+    Gauge(
+        "kresolver_upstream_circuit_state",
+        "Circuit breaker state per upstream (0=closed, 1=half-open, 2=open)",
+        ("dns_server",),
+        collect=lambda: [
+            ((breaker.dns_server,), STATE_VALUES[breaker.state])
+            for breaker in circuit_breakers.all()
+        ],
+    )
+)
+registry.register(
+    Gauge(
+        "kresolver_upstream_inflight",
+        "Queries in flight per upstream",
+        ("dns_server",),
+        collect=lambda: [
+            ((breaker.dns_server,), breaker.inflight) for breaker in circuit_breakers.all()
+        ],
+    )
+)
+registry.register(
+    CounterView(
+        "kresolver_upstream_circuit_opens",
+        "Times the circuit of an upstream opened",
+        ("dns_server",),
+        collect=lambda: [
+            ((dns_server,), opens) for dns_server, opens, _, _ in circuit_breakers.counters()
+        ],
+    )
+)
+registry.register(
+    CounterView(
+        "kresolver_upstream_rejected",
+        "Queries failed without being sent, by reason",
+        ("dns_server", "reason"),
+        collect=lambda: [
+            ((dns_server, reason), count)
+            for dns_server, _, rejected, queue_timeouts in circuit_breakers.counters()
+            for reason, count in (("circuit_open", rejected), ("queue_timeout", queue_timeouts))
+        ],
+    )
+)
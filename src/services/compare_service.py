@@ -0,0 +1,108 @@
+"""Cross-ISP resolver comparison service."""
+
+import time
+
+from src.services.catalog import ISPEntry
+from src.services.dns_service import DNSService
+
+
+class CompareService:
+    """Compare how every DNS server answers the same name."""
+
+    @staticmethod
+    def group_answer_sets(results: list[dict]) -> list[dict]:
+        """Group successful results of one record type by identical answer set.
+
+        Groups are ordered largest first; the first group is the majority.
+        """
+        groups: dict[tuple[str, ...], list[str]] = {}
+        for result in results:
+            if result["success"]:
+                groups.setdefault(tuple(sorted(result["answers"])), []).append(result["dns_server"])
+
+        ordered = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+        return [
+            {"answers": list(answers), "dns_servers": servers, "is_majority": index == 0}
+            for index, (answers, servers) in enumerate(ordered)
+        ]
+
+    @staticmethod
+    async def compare(
+        domain: str,
+        isps: list[ISPEntry],
+        record_types: list[str],
+        deadline: float,
+        use_cache: bool = True,
+    ) -> dict:
+        """Query every active server of ``isps`` in parallel.
+
+        Builds an ISP x server x record type matrix of the results.
+        """
+        start_time = time.perf_counter()
+        servers = [server for isp in isps for server in isp.dns_servers if server.is_active]
+        isp_names = {isp.id: isp.name for isp in isps}
+
+        # ISPs can share resolver IPs; query each (ip, record type) once
+        queries = list(
+            dict.fromkeys(
+                (domain, server.ip_address, record_type)
+                for server in servers
+                for record_type in record_types
+            )
+        )
+        results = await DNSService.resolve_fanout(queries, deadline, use_cache)
+        by_key = {(result["dns_server"], result["record_type"]): result for result in results}
+
+        answer_sets = {}
+        majority: dict[str, tuple[str, ...] | None] = {}
+        for record_type in record_types:
+            groups = CompareService.group_answer_sets(
+                [result for result in results if result["record_type"] == record_type]
+            )
+            answer_sets[record_type] = groups
+            majority[record_type] = tuple(groups[0]["answers"]) if groups else None
+
+        isps: dict[int, dict] = {}
+        for server in sorted(servers, key=lambda s: (s.isp_id, s.priority)):
+            group = isps.setdefault(
+                server.isp_id,
+                {
+                    "isp_id": server.isp_id,
+                    "isp_name": isp_names[server.isp_id],
+                    "servers": [],
+                    "diverging_record_types": [],
+                },
+            )
+
+            cells = {}
+            for record_type in record_types:
+                result = by_key[(server.ip_address, record_type)]
+                matches = (
+                    tuple(sorted(result["answers"])) == majority[record_type]
+                    if result["success"]
+                    else None
+                )
+                cells[record_type] = {
+                    "answers": result["answers"],
+                    "response_time_ms": result["response_time_ms"],
+                    "success": result["success"],
+                    "error_message": result["error_message"],
+                    "cached": result["cached"],
+                    "matches_majority": matches,
+                }
+                if matches is False and record_type not in group["diverging_record_types"]:
+                    group["diverging_record_types"].append(record_type)
+
+            group["servers"].append(
+                {"dns_server": server.ip_address, "priority": server.priority, "results": cells}
+            )
+
+        return {
+            "domain": domain,
+            "record_types": record_types,
+            "elapsed_ms": int((time.perf_counter() - start_time) * 1000),
+            "deadline_ms": int(deadline * 1000),
+            "isps": list(isps.values()),
+            "answer_sets": answer_sets,
+            "results": results,
+        }
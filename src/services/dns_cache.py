@@ -0,0 +1,216 @@
+"""In-process DNS answer cache, optionally backed by the shared-memory cache."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+import dns.message
+import dns.rdatatype
+
+from src.core.config import settings
+from src.services.shared_cache import SharedCache, shared_cache
+
+CacheKey = tuple[str, str | None, str, str]
+
+# Rough fixed overhead of a cached result dict, in bytes
+ENTRY_OVERHEAD = 512
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    """Cached resolve result with its expiry."""
+
+    result: dict
+    expires_at: float
+    size: int
+
+
+def make_key(
+    domain: str, dns_server: str | None, record_type: str, transport: str = "udp"
+) -> CacheKey:
+    """Normalize a (domain, dns_server, record_type, transport) cache key."""
+    return (domain.lower().rstrip("."), dns_server or None, record_type.upper(), transport)
+
+
+def negative_ttl(response: dns.message.Message | None) -> int | None:
+    """TTL for a negative answer per RFC 2308: min(SOA TTL, SOA MINIMUM).
+
+    Returns None when the response carries no SOA, in which case the negative
+    answer must not be cached.
+    """
+    if response is None:
+        return None
+
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA and len(rrset) > 0:
+            return min(rrset.ttl, rrset[0].minimum, settings.dns_cache_negative_max_ttl)
+
+    return None
+
+
+class DNSAnswerCache:
+    """TTL-aware LRU cache of resolve results with single-flight lookups.
+
+    Entries are evicted least-recently-used first once the estimated size of all
+    entries exceeds ``max_bytes``. Concurrent lookups for the same key share one
+    upstream query. With a ``shared`` cache, local misses are looked up there
+    and stored results are written there for the other workers.
+    """
+
+    def __init__(self, max_bytes: int, shared: SharedCache | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.current_bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries: OrderedDict[CacheKey, CacheEntry] = OrderedDict()
+        self._inflight: dict[CacheKey, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _estimate_size(key: CacheKey, result: dict) -> int:
+        """Estimate the memory held by one entry."""
+        size = ENTRY_OVERHEAD + sum(len(part) for part in key if part)
+        size += sum(len(answer) + 64 for answer in result["answers"])
+        size += len(result["error_message"] or "")
+        return size
+
+    @staticmethod
+    def _shared_key(key: CacheKey) -> str:
+        return "dns\x00" + "\x00".join(part or "" for part in key)
+
+    def _get_shared(self, key: CacheKey) -> dict | None:
+        """Look ``key`` up in the shared cache and keep a local copy of a hit."""
+        found = self.shared.get_json(self._shared_key(key)) if self.shared else None
+        if found is None:
+            return None
+        result, expires_at = found
+        remaining = expires_at - time.time()
+        if remaining < 1:
+            return None
+        self._store(key, result, remaining)
+        self.shared_hits += 1
+        return {**result, "cached": True, "ttl_remaining": int(remaining)}
+
+    def get(self, key: CacheKey) -> dict | None:
+        """Return a cached result marked as cached, or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return self._get_shared(key)
+
+        remaining = entry.expires_at - time.monotonic()
+        if remaining <= 0:
+            self._remove(key)
+            return self._get_shared(key)
+
+        self._entries.move_to_end(key)
+        return {**entry.result, "cached": True, "ttl_remaining": int(remaining)}
+
+    def set(self, key: CacheKey, result: dict, ttl: int | None) -> bool:
+        """Store a result for ``ttl`` seconds. Returns False if not cacheable."""
+        if ttl is None or ttl <= 0:
+            return False
+
+        ttl = min(ttl, settings.dns_cache_max_ttl)
+        if not self._store(key, result, ttl):
+            return False
+        if self.shared is not None:
+            self.shared.set_json(self._shared_key(key), result, ttl)
+        return True
+
+    def _store(self, key: CacheKey, result: dict, ttl: float) -> bool:
+        size = self._estimate_size(key, result)
+        if size > self.max_bytes:
+            return False
+
+        self._remove(key)
+        self._entries[key] = CacheEntry(result=result, expires_at=time.monotonic() + ttl, size=size)
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+        return True
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+
+    async def get_or_fetch(
+        self,
+        key: CacheKey,
+        fetch: Callable[[], Awaitable[tuple[dict, int | None]]],
+        refresh: bool = False,
+    ) -> dict:
+        """Return a cached result or run ``fetch`` once for all concurrent callers.
+
+        ``fetch`` returns ``(result, ttl)``; ``ttl=None`` means do not cache.
+        With ``refresh`` the cache and in-flight queries are bypassed, but the
+        fresh result still replaces the cached one.
+        """
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+
+            task = self._inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+                result, ttl = await asyncio.shield(task)
+                return {**result, "cached": True, "ttl_remaining": ttl}
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+        if not refresh:
+            self._inflight[key] = task
+
+        result, ttl = await asyncio.shield(task)
+        return {**result, "cached": False, "ttl_remaining": ttl}
+
+    async def _fetch_and_store(
+        self, key: CacheKey, fetch: Callable[[], Awaitable[tuple[dict, int | None]]]
+    ) -> tuple[dict, int | None]:
+        try:
+            result, ttl = await fetch()
+            if ttl is not None:
+                ttl = min(ttl, settings.dns_cache_max_ttl)
+            if not self.set(key, result, ttl):
+                ttl = None
+            return result, ttl
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def clear(self) -> None:
+        """Drop this worker's entries and reset counters (the shared cache is kept)."""
+        self._entries.clear()
+        self.current_bytes = 0
+        self.hits = self.shared_hits = self.misses = self.coalesced = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Cache counters and occupancy."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+
+answer_cache = DNSAnswerCache(settings.dns_cache_max_bytes, shared=shared_cache)
@@ -1,67 +1,419 @@
 """DNS resolution and query service."""
 
+import asyncio
 import time
-from typing import Optional
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Iterable
+from functools import lru_cache
 
+import dns.asyncresolver
+import dns.exception
+import dns.inet
+import dns.message
+import dns.rcode
 import dns.resolver
 
+from src.core.config import settings
+from src.core.metrics import upstream_dns_duration, upstream_dns_responses
+from src.core.profiling import phase
+from src.services.catalog import catalog_store
+from src.services.circuit_breaker import UpstreamUnavailable, circuit_breakers
+from src.services.dns_cache import answer_cache, make_key, negative_ttl
+from src.services.dns_transports import doh_client, dot_pool
+from src.services.latency_stats import recent_latency
+from src.services.udp_engine import udp_engine
+
+
+class RcodeError(dns.exception.DNSException):
+    """Upstream answered with an error rcode other than NXDOMAIN."""
+
+    def __init__(self, rcode: dns.rcode.Rcode) -> None:
+        self.rcode = rcode
+        super().__init__(f"Server returned {dns.rcode.to_text(rcode)}")
+
 
 class DNSService:
     """DNS query and resolution service."""
 
+    # Reusable resolvers keyed by nameserver (None = system default)
+    _resolvers: OrderedDict[str | None, dns.asyncresolver.Resolver] = OrderedDict()
+
     @staticmethod
-    async def resolve_domain(
-        domain: str, dns_server: Optional[str] = None, record_type: str = "A"
+    def get_resolver(dns_server: str | None = None) -> dns.asyncresolver.Resolver:
+        """Get a cached async resolver for the given nameserver."""
+        resolver = DNSService._resolvers.get(dns_server)
+        if resolver is not None:
+            DNSService._resolvers.move_to_end(dns_server)
+            return resolver
+
+        if dns_server:
+            # Explicit nameserver: skip reading /etc/resolv.conf
+            resolver = dns.asyncresolver.Resolver(configure=False)
+            resolver.nameservers = [dns_server]
+            resolver.port = settings.dns_port
+        else:
+            resolver = dns.asyncresolver.Resolver()
+
+        # Retries are driven by resolve_domain, so one attempt per lifetime
+        resolver.timeout = settings.dns_timeout
+        resolver.lifetime = settings.dns_timeout
+
+        DNSService._resolvers[dns_server] = resolver
+        while len(DNSService._resolvers) > settings.dns_resolver_pool_size:
+            DNSService._resolvers.popitem(last=False)
+
+        return resolver
+
+    @staticmethod
+    def select_transport(dns_server: str | None, transport: str = "auto") -> tuple[str, str | None]:
+        """Pick the transport and its endpoint (DoH URL or DoT server name) for a server.
+
+        ``auto`` follows the catalog ``server_type`` of the address and falls back
+        to UDP. Raises ValueError when ``dns_server`` is not an IP address (a
+        hostname would need a blocking lookup) or DoH is requested but no DoH
+        URL is known.
+        """
+        if dns_server and not dns.inet.is_address(dns_server):
+            raise ValueError(f"DNS server must be an IP address: {dns_server}")
+        if not dns_server or transport == "udp":
+            return "udp", None
+
+        catalog = catalog_store.snapshot
+        entries = catalog.servers_by_ip.get(dns_server, ()) if catalog else ()
+
+        if transport == "auto":
+            transport = next(
+                (
+                    entry.server_type
+                    for entry in entries
+                    if (entry.server_type == "doh" and entry.doh_url) or entry.server_type == "dot"
+                ),
+                "udp",
+            )
+            if transport == "udp":
+                return "udp", None
+
+        if transport == "doh":
+            url = next((entry.doh_url for entry in entries if entry.doh_url), None)
+            if url is None:
+                raise ValueError(f"No DoH URL known for {dns_server}")
+            return "doh", url
+
+        return "dot", next((entry.dot_hostname for entry in entries if entry.dot_hostname), None)
+
+    @staticmethod
+    def _result(
+        domain: str,
+        dns_server: str | None,
+        record_type: str,
+        start_time: float,
+        answers: list[str] | None = None,
+        error_message: str | None = None,
+        transport: str = "udp",
+        handshake_ms: float | None = None,
+        negative: bool = False,
     ) -> dict:
-        """Resolve domain using specified DNS server."""
-        start_time = time.time()
+        """Build a resolve result dict.
 
-        try:
-            resolver = dns.resolver.Resolver()
+        ``response_time_ms`` excludes ``handshake_ms`` (connection setup on an
+        encrypted transport), which is reported separately. ``negative`` marks
+        an NXDOMAIN or NODATA answer: unsuccessful, but still an answer.
+        """
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        return {
+            "domain": domain,
+            "dns_server": dns_server or "system_default",
+            "record_type": record_type,
+            "answers": answers or [],
+            "response_time_ms": int(elapsed_ms - (handshake_ms or 0)),
+            "success": error_message is None,
+            "error_message": error_message,
+            "transport": transport,
+            "handshake_time_ms": None if handshake_ms is None else int(handshake_ms),
+            "negative": negative,
+        }
+
+    @staticmethod
+    async def _resolve_udp(
+        domain: str, dns_server: str | None, record_type: str
+    ) -> tuple[list[str], int]:
+        if dns_server and settings.dns_udp_engine_enabled:
+            return await DNSService._resolve_engine(domain, dns_server, record_type)
+
+        resolver = DNSService.get_resolver(dns_server)
+
+        # Query DNS, retrying on timeout
+        for attempt in range(settings.dns_retries + 1):
+            try:
+                answers = await resolver.resolve(domain, record_type)
+                break
+            except dns.exception.Timeout:
+                if attempt >= settings.dns_retries:
+                    raise
+
+        return [str(rdata) for rdata in answers], answers.chaining_result.minimum_ttl
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _query_wire(domain: str, record_type: str) -> bytes:
+        """Encoded query for (domain, record type); probing repeats these across servers."""
+        # EDNS0 with a 1232-byte payload, like the stub resolver, to avoid needless truncation
+        return dns.message.make_query(domain, record_type, use_edns=0, payload=1232).to_wire()
+
+    @staticmethod
+    async def _resolve_engine(
+        domain: str, dns_server: str, record_type: str
+    ) -> tuple[list[str], int]:
+        """Query an explicit nameserver through the multiplexed UDP engine."""
+        wire = DNSService._query_wire(domain, record_type)
+        attempt = 0
+        while True:
+            try:
+                response = await udp_engine.exchange(dns_server, wire, settings.dns_timeout)
+                break
+            except dns.exception.Timeout:
+                if attempt >= settings.dns_retries:
+                    raise
+                attempt += 1
+            except OSError as e:
+                raise dns.exception.DNSException(f"UDP error: {e}") from e
+
+        # The engine already matched the ID and question
+        return DNSService._parse_response(dns.message.from_wire(response))
 
-            if dns_server:
-                resolver.nameservers = [dns_server]
+    @staticmethod
+    async def _exchange_encrypted(
+        query: dns.message.Message, dns_server: str, transport: str, endpoint: str | None
+    ) -> tuple[dns.message.Message, float]:
+        """Send ``query`` over DoH or DoT with retries. Returns (response, handshake ms)."""
+        attempt = 0
+        while True:
+            try:
+                if transport == "doh":
+                    exchange = doh_client.query(endpoint or "", query)
+                else:
+                    exchange = dot_pool.query(dns_server, endpoint, query)
+                return await asyncio.wait_for(exchange, settings.dns_timeout)
+            except TimeoutError:
+                if attempt >= settings.dns_retries:
+                    raise dns.exception.Timeout(timeout=settings.dns_timeout) from None
+                attempt += 1
+            except (ConnectionError, OSError) as e:
+                raise dns.exception.DNSException(f"{transport.upper()} error: {e}") from e
+
+    @staticmethod
+    def _parse_response(
+        response: dns.message.Message, query: dns.message.Message | None = None
+    ) -> tuple[list[str], int]:
+        """Extract answers and TTL, raising the same exceptions as the stub resolver.
+
+        Pass ``query`` to check that ``response`` actually answers it.
+        """
+        if query is not None and not query.is_response(response):
+            raise dns.exception.DNSException("Response does not match the query")
+        if not response.question:
+            raise dns.exception.DNSException("Response has no question")
 
-            # Query DNS
-            answers = resolver.resolve(domain, record_type)
+        qname = response.question[0].name
+        rcode = response.rcode()
+        if rcode == dns.rcode.NXDOMAIN:
+            raise dns.resolver.NXDOMAIN(qnames=[qname], responses={qname: response})
+        if rcode != dns.rcode.NOERROR:
+            raise RcodeError(rcode)
 
-            # Extract results
-            results = [str(rdata) for rdata in answers]
+        chaining = response.resolve_chaining()
+        if chaining.answer is None:
+            raise dns.resolver.NoAnswer(response=response)
+        return [str(rdata) for rdata in chaining.answer], chaining.minimum_ttl
 
-            response_time_ms = int((time.time() - start_time) * 1000)
+    @staticmethod
+    async def _query(
+        domain: str,
+        dns_server: str | None,
+        record_type: str,
+        transport: str = "udp",
+        endpoint: str | None = None,
+        probe: bool = False,
+    ) -> tuple[dict, int | None]:
+        """Query upstream and return the result with its cache TTL (None = uncacheable).
+
+        Explicit servers go through their circuit breaker; a query it rejects
+        fails at once and its result carries ``retry_after`` (seconds). A
+        ``probe`` is sent even while the circuit is open.
+        """
+        start_time = time.perf_counter()
+        handshake_ms: float | None = None
 
-            return {
-                "domain": domain,
-                "dns_server": dns_server or "system_default",
-                "record_type": record_type,
-                "answers": results,
-                "response_time_ms": response_time_ms,
-                "success": True,
-                "error_message": None,
-            }
+        def failure(message: str, negative: bool = False) -> dict:
+            return DNSService._result(
+                domain,
+                dns_server,
+                record_type,
+                start_time,
+                error_message=message,
+                transport=transport,
+                handshake_ms=handshake_ms,
+                negative=negative,
+            )
 
+        breaker = None
+        trial = False
+        if dns_server and settings.circuit_breaker_enabled:
+            breaker = circuit_breakers.get(dns_server)
+            try:
+                trial = await breaker.acquire(probe)
+            except UpstreamUnavailable as e:
+                # Not sent, so not counted as an upstream response either
+                return {**failure(str(e)), "retry_after": e.retry_after}, None
+
+        rcode: str | None = None  # stays None if the query is cancelled
+        try:
+            with phase(f"upstream_dns;{transport}"):
+                if transport == "udp" or not dns_server:
+                    results, ttl = await DNSService._resolve_udp(domain, dns_server, record_type)
+                else:
+                    query = dns.message.make_query(domain, record_type)
+                    response, handshake_ms = await DNSService._exchange_encrypted(
+                        query, dns_server, transport, endpoint
+                    )
+                    results, ttl = DNSService._parse_response(response, query)
+
+            rcode = "NOERROR"
+            result = DNSService._result(
+                domain, dns_server, record_type, start_time, results, None, transport, handshake_ms
+            )
+            return result, ttl
+
+        except dns.resolver.NXDOMAIN as e:
+            rcode = "NXDOMAIN"
+            responses = list(e.responses().values())
+            return failure(str(e), True), negative_ttl(responses[0] if responses else None)
+        except dns.resolver.NoAnswer as e:
+            rcode = "NOERROR"
+            return failure(str(e), True), negative_ttl(e.response())
+        except dns.exception.Timeout as e:
+            rcode = "TIMEOUT"
+            return failure(str(e)), None
+        except RcodeError as e:
+            rcode = dns.rcode.to_text(e.rcode)
+            return failure(str(e)), None
         except dns.exception.DNSException as e:
-            response_time_ms = int((time.time() - start_time) * 1000)
-            return {
-                "domain": domain,
-                "dns_server": dns_server or "system_default",
-                "record_type": record_type,
-                "answers": [],
-                "response_time_ms": response_time_ms,
-                "success": False,
-                "error_message": str(e),
-            }
+            rcode = "ERROR"
+            return failure(str(e)), None
         except Exception as e:
-            response_time_ms = int((time.time() - start_time) * 1000)
-            return {
-                "domain": domain,
-                "dns_server": dns_server or "system_default",
-                "record_type": record_type,
-                "answers": [],
-                "response_time_ms": response_time_ms,
-                "success": False,
-                "error_message": f"Unexpected error: {str(e)}",
-            }
+            rcode = "ERROR"
+            return failure(f"Unexpected error: {str(e)}"), None
+        finally:
+            if breaker is not None:
+                breaker.release(trial, rcode)
+            if rcode is not None:
+                elapsed = time.perf_counter() - start_time
+                if dns_server and rcode not in ("TIMEOUT", "ERROR"):
+                    recent_latency.observe(dns_server, elapsed * 1000)
+                if settings.metrics_enabled:
+                    server = dns_server or "system_default"
+                    upstream_dns_duration.observe(elapsed, server, transport)
+                    upstream_dns_responses.inc(server, rcode)
+
+    @staticmethod
+    async def resolve_domain(
+        domain: str,
+        dns_server: str | None = None,
+        record_type: str = "A",
+        use_cache: bool = True,
+        transport: str = "auto",
+        probe: bool = False,
+    ) -> dict:
+        """Resolve domain using specified DNS server.
+
+        Answers are served from the TTL-aware answer cache unless ``use_cache`` is
+        False, which forces a fresh upstream query (for latency measurement).
+        ``transport`` is "udp", "doh", "dot" or "auto" (see select_transport).
+        ``probe`` marks health checks, which an open circuit does not reject.
+        """
+        transport, endpoint = DNSService.select_transport(dns_server, transport)
+
+        def fetch() -> Awaitable[tuple[dict, int | None]]:
+            return DNSService._query(domain, dns_server, record_type, transport, endpoint, probe)
+
+        if not settings.dns_cache_enabled:
+            result, _ = await fetch()
+            return {**result, "cached": False, "ttl_remaining": None}
+
+        return await answer_cache.get_or_fetch(
+            make_key(domain, dns_server, record_type, transport),
+            fetch,
+            refresh=not use_cache,
+        )
+
+    @staticmethod
+    async def resolve_many(
+        queries: Iterable[tuple[str, str | None, str]],
+        concurrency: int,
+        use_cache: bool = True,
+        transport: str = "auto",
+    ) -> AsyncIterator[dict]:
+        """Resolve (domain, dns_server, record_type) queries concurrently.
+
+        At most ``concurrency`` queries are in flight; results are yielded in
+        completion order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(domain: str, dns_server: str | None, record_type: str) -> dict:
+            async with semaphore:
+                return await DNSService.resolve_domain(
+                    domain, dns_server, record_type, use_cache, transport
+                )
+
+        tasks = [asyncio.ensure_future(run(*query)) for query in queries]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def resolve_fanout(
+        queries: list[tuple[str, str | None, str]],
+        deadline: float,
+        use_cache: bool = True,
+    ) -> list[dict]:
+        """Resolve all queries in parallel under a global deadline (seconds).
+
+        Results keep the order of ``queries``; anything still pending at the
+        deadline is cancelled and reported as a failure.
+        """
+        if not queries:
+            return []
+
+        start_time = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(
+                DNSService.resolve_domain(domain, dns_server, record_type, use_cache)
+            )
+            for domain, dns_server, record_type in queries
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for (domain, dns_server, record_type), task in zip(queries, tasks, strict=True):
+            if task in done:
+                results.append(task.result())
+            else:
+                timed_out = DNSService._result(
+                    domain,
+                    dns_server,
+                    record_type,
+                    start_time,
+                    error_message=f"Deadline exceeded ({deadline:.2f}s)",
+                    transport=DNSService.select_transport(dns_server)[0],
+                )
+                results.append({**timed_out, "cached": False, "ttl_remaining": None})
+        return results
 
     @staticmethod
     def generate_command_examples(domain: str, dns_server: str) -> list[dict]:
@@ -0,0 +1,315 @@
+"""Encrypted DNS transports: DNS-over-HTTPS and DNS-over-TLS.
+
+Both keep connections open across queries so the reported latency of an
+encrypted resolver is the query itself, not a fresh TLS handshake. Each
+exchange returns the DNS response together with the connection setup time it
+paid (0 on a reused connection).
+"""
+
+import asyncio
+import secrets
+import ssl
+import time
+from typing import Any
+
+import dns.message
+import httpx
+
+from src.core.config import settings
+
+DOH_CONTENT_TYPE = "application/dns-message"
+
+DoTKey = tuple[str, int, str | None]  # (address, port, TLS server name)
+
+
+class DoHClient:
+    """RFC 8484 client sharing one HTTP/2 connection pool across requests.
+
+    Concurrent queries to the same DoH endpoint are multiplexed as streams on
+    one connection. Connection setup time comes from httpx trace events.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self.requests = 0
+        self.handshakes = 0
+
+    async def start(self) -> None:
+        """Open the pooled HTTP client."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self._transport is None,
+                transport=self._transport,
+                timeout=settings.dns_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.doh_max_connections,
+                    max_keepalive_connections=settings.doh_max_connections,
+                    keepalive_expiry=settings.encrypted_dns_idle_timeout,
+                ),
+                headers={"Accept": DOH_CONTENT_TYPE},
+            )
+
+    async def close(self) -> None:
+        """Close the pooled HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def query(
+        self, url: str, query: dns.message.Message
+    ) -> tuple[dns.message.Message, float]:
+        """POST ``query`` to ``url``. Returns (response, handshake ms)."""
+        if self._client is None:
+            await self.start()
+        assert self._client is not None
+
+        handshake = 0.0
+        started: dict[str, float] = {}
+
+        async def trace(event: str, _info: dict[str, Any]) -> None:
+            nonlocal handshake
+            if not event.startswith(("connection.connect_tcp.", "connection.start_tls.")):
+                return
+            step, _, phase = event.rpartition(".")
+            if phase == "started":
+                started[step] = time.perf_counter()
+            elif phase == "complete" and step in started:
+                handshake += time.perf_counter() - started.pop(step)
+
+        # RFC 8484 4.1: use ID 0 so responses stay cacheable by HTTP caches
+        query.id = 0
+        self.requests += 1
+        try:
+            response = await self._client.post(
+                url,
+                content=query.to_wire(),
+                headers={"Content-Type": DOH_CONTENT_TYPE},
+                extensions={"trace": trace},
+            )
+        except httpx.HTTPError as e:
+            raise ConnectionError(str(e) or type(e).__name__) from e
+        if handshake:
+            self.handshakes += 1
+        if response.status_code != 200:
+            raise ConnectionError(f"DoH server returned HTTP {response.status_code}")
+        return dns.message.from_wire(response.content), handshake * 1000
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "handshakes": self.handshakes}
+
+
+class _ResumingContext(ssl.SSLContext):
+    """Client TLS context that offers the last session of a server name on reconnect."""
+
+    sessions: dict[str | None, ssl.SSLSession]
+
+    def wrap_bio(  # type: ignore[override]
+        self,
+        incoming: ssl.MemoryBIO,
+        outgoing: ssl.MemoryBIO,
+        server_side: bool = False,
+        server_hostname: str | None = None,
+        session: ssl.SSLSession | None = None,
+    ) -> ssl.SSLObject:
+        if session is None and not server_side:
+            session = self.sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+
+class DoTConnection:
+    """One RFC 7858 TLS connection with pipelined, out-of-order queries.
+
+    Queries are written as soon as they arrive, each with a unique message ID;
+    a reader task matches responses back to their waiters by ID.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        handshake_ms: float,
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.handshake_ms = handshake_ms
+        self.last_used = time.monotonic()
+        self._pending: dict[int, asyncio.Future] = {}
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def open(
+        cls, address: str, port: int, server_name: str | None, context: _ResumingContext
+    ) -> "DoTConnection":
+        start_time = time.perf_counter()
+        reader, writer = await asyncio.open_connection(
+            address, port, ssl=context, server_hostname=server_name or address
+        )
+        return cls(reader, writer, (time.perf_counter() - start_time) * 1000)
+
+    @property
+    def closed(self) -> bool:
+        return self._reader_task.done() or self.writer.is_closing()
+
+    @property
+    def session_reused(self) -> bool:
+        ssl_object = self.writer.get_extra_info("ssl_object")
+        return bool(ssl_object and ssl_object.session_reused)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def query(self, query: dns.message.Message) -> dns.message.Message:
+        """Send ``query`` (its ID is reassigned) and wait for the matching response."""
+        if self.closed:
+            raise ConnectionError("DoT connection closed")
+
+        message_id = secrets.randbits(16)
+        while message_id in self._pending:
+            message_id = secrets.randbits(16)
+        query.id = message_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        self.last_used = time.monotonic()
+        try:
+            wire = query.to_wire()
+            self.writer.write(len(wire).to_bytes(2, "big") + wire)
+            await self.writer.drain()
+            return await future
+        finally:
+            self._pending.pop(message_id, None)
+
+    async def _read_loop(self) -> None:
+        error: Exception = ConnectionError("DoT connection closed by server")
+        try:
+            while True:
+                length = int.from_bytes(await self.reader.readexactly(2), "big")
+                response = dns.message.from_wire(await self.reader.readexactly(length))
+                future = self._pending.get(response.id)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except asyncio.CancelledError:
+            error = ConnectionError("DoT connection closed")
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            error = ConnectionError(f"DoT connection failed: {e}")
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    def remember_session(self, context: _ResumingContext, server_name: str | None) -> None:
+        """Store the (possibly new) TLS session ticket for later reconnects."""
+        ssl_object = self.writer.get_extra_info("ssl_object")
+        if ssl_object is not None and ssl_object.session is not None:
+            context.sessions[server_name] = ssl_object.session
+
+    def close(self) -> None:
+        self._reader_task.cancel()
+        self.writer.close()
+
+
+class DoTPool:
+    """Long-lived DoT connections, one per (address, port, server name).
+
+    Connections are opened on first use (concurrent first queries share one
+    handshake), reused while alive, and replaced after
+    ``encrypted_dns_idle_timeout`` seconds idle. Reconnects resume the previous
+    TLS session when the server supports it.
+    """
+
+    def __init__(self, cafile: str | None = None) -> None:
+        self.cafile = cafile
+        self._context: _ResumingContext | None = None
+        self._connections: dict[DoTKey, DoTConnection] = {}
+        self._connecting: dict[DoTKey, asyncio.Task] = {}
+        self.handshakes = 0
+        self.resumed = 0
+        self.queries = 0
+
+    @property
+    def context(self) -> _ResumingContext:
+        if self._context is None:
+            context = _ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            if self.cafile:
+                context.load_verify_locations(self.cafile)
+            else:
+                context.load_default_certs()
+            context.sessions = {}
+            self._context = context
+        return self._context
+
+    async def _connection(self, key: DoTKey) -> tuple[DoTConnection, float]:
+        """Return a live connection and the handshake time this caller waited for."""
+        connection = self._connections.get(key)
+        if connection is not None and not connection.closed:
+            idle = time.monotonic() - connection.last_used
+            if idle < settings.encrypted_dns_idle_timeout or connection.pending:
+                return connection, 0.0
+            connection.close()
+
+        task = self._connecting.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._open(key))
+            self._connecting[key] = task
+        connection = await asyncio.shield(task)
+        return connection, connection.handshake_ms
+
+    async def _open(self, key: DoTKey) -> DoTConnection:
+        address, port, server_name = key
+        try:
+            connection = await DoTConnection.open(address, port, server_name, self.context)
+        finally:
+            self._connecting.pop(key, None)
+        self.handshakes += 1
+        if connection.session_reused:
+            self.resumed += 1
+        self._connections[key] = connection
+        return connection
+
+    async def query(
+        self,
+        address: str,
+        server_name: str | None,
+        query: dns.message.Message,
+        port: int | None = None,
+    ) -> tuple[dns.message.Message, float]:
+        """Send ``query`` over a pooled connection. Returns (response, handshake ms)."""
+        key = (address, port or settings.dot_port, server_name)
+        self.queries += 1
+
+        connection, handshake_ms = await self._connection(key)
+        try:
+            response = await connection.query(query)
+        except ConnectionError:
+            if handshake_ms:
+                raise
+            # The server may have closed an idle connection; retry once on a fresh one
+            connection, handshake_ms = await self._connection(key)
+            response = await connection.query(query)
+
+        connection.remember_session(self.context, server_name or address)
+        return response, handshake_ms
+
+    async def close(self) -> None:
+        """Close every pooled connection."""
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+    def stats(self) -> dict:
+        return {
+            "connections": sum(not c.closed for c in self._connections.values()),
+            "handshakes": self.handshakes,
+            "resumed": self.resumed,
+            "queries": self.queries,
+        }
+
+
+doh_client = DoHClient()
+dot_pool = DoTPool()
@@ -0,0 +1,200 @@
+"""Background DNS server health probing."""
+
+import asyncio
+import json
+import time
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any
+
+from src.core.config import settings
+from src.services.catalog import DNSServerEntry, catalog_store
+from src.services.dns_service import DNSService
+from src.services.latency_stats import worker_count, write_checkpoint
+
+
+@dataclass(slots=True)
+class ServerHealth:
+    """Measured health of one DNS server address."""
+
+    ip_address: str
+    ewma_latency_ms: float | None = None
+    loss_rate: float = 0.0  # EWMA of failed probes
+    probes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_probe_at: float | None = None
+    last_healthy_at: float | None = None
+    last_error: str | None = None
+
+    @property
+    def healthy(self) -> bool:
+        return (
+            self.consecutive_failures < settings.health_unhealthy_after
+            and self.loss_rate <= settings.health_max_loss_rate
+        )
+
+    def observe(self, success: bool, latency_ms: float, error: str | None, now: float) -> None:
+        """Fold one probe result into the moving averages."""
+        alpha = settings.health_ewma_alpha
+        self.probes += 1
+        self.last_probe_at = now
+        self.loss_rate += alpha * ((0.0 if success else 1.0) - self.loss_rate)
+
+        if success:
+            self.consecutive_failures = 0
+            self.last_error = None
+            if self.ewma_latency_ms is None:
+                self.ewma_latency_ms = latency_ms
+            else:
+                self.ewma_latency_ms += alpha * (latency_ms - self.ewma_latency_ms)
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+
+        if self.healthy:
+            self.last_healthy_at = now
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``burst`` at once."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HealthProber:
+    """Periodically probes every active DNS server with a canary query.
+
+    Probes are paced by a token bucket (``health_probe_rate`` per second) and
+    capped at ``health_probe_concurrency`` in flight, so large catalogs are
+    probed smoothly instead of in one burst. Each address is probed once per
+    round even when several ISPs list it. Every launcher worker probes on its
+    own, so each gets an equal share of the rate.
+    """
+
+    def __init__(self) -> None:
+        self._health: dict[str, ServerHealth] = {}
+        self.rounds = 0
+
+    def get(self, ip_address: str) -> ServerHealth | None:
+        """Health of one address, or None if it was never probed."""
+        return self._health.get(ip_address)
+
+    def all(self) -> list[ServerHealth]:
+        return sorted(self._health.values(), key=lambda health: health.ip_address)
+
+    def is_healthy(self, ip_address: str) -> bool:
+        """False only for servers measured unhealthy; unprobed servers count as healthy."""
+        health = self._health.get(ip_address)
+        return health is None or health.healthy
+
+    def rank(self, server: DNSServerEntry) -> tuple:
+        """Sort key: healthy first, then lowest EWMA latency, then priority."""
+        health = self._health.get(server.ip_address)
+        latency = (
+            health.ewma_latency_ms
+            if health and health.ewma_latency_ms is not None
+            else float("inf")
+        )
+        return (not self.is_healthy(server.ip_address), latency, server.priority, server.id)
+
+    async def probe(self, ip_address: str) -> ServerHealth:
+        """Send one canary query to ``ip_address`` and record the result."""
+        result = await DNSService.resolve_domain(
+            settings.health_probe_domain, ip_address, "A", use_cache=False, probe=True
+        )
+        health = self._health.get(ip_address)
+        if health is None:
+            health = self._health[ip_address] = ServerHealth(ip_address)
+        health.observe(
+            result["success"], result["response_time_ms"], result["error_message"], time.time()
+        )
+        return health
+
+    async def probe_all(self, addresses: list[str], bucket: TokenBucket) -> None:
+        """Probe each address once, paced by ``bucket``."""
+        semaphore = asyncio.Semaphore(settings.health_probe_concurrency)
+
+        async def run(ip_address: str) -> None:
+            try:
+                await self.probe(ip_address)
+            finally:
+                semaphore.release()
+
+        tasks = []
+        try:
+            for ip_address in addresses:
+                await semaphore.acquire()
+                await bucket.acquire()
+                tasks.append(asyncio.ensure_future(run(ip_address)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        # Forget addresses that left the catalog
+        for ip_address in set(self._health) - set(addresses):
+            del self._health[ip_address]
+        self.rounds += 1
+
+    async def run_forever(self, interval: float) -> None:
+        """Probe the catalog every ``interval`` seconds (run as a background task)."""
+        bucket = TokenBucket(
+            settings.health_probe_rate / worker_count(), settings.health_probe_burst
+        )
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                catalog = catalog_store.snapshot
+                if catalog is not None:
+                    addresses = list(dict.fromkeys(s.ip_address for s in catalog.active_servers))
+                    await self.probe_all(addresses, bucket)
+                    if settings.health_snapshot_path:
+                        await asyncio.to_thread(
+                            write_checkpoint, settings.health_snapshot_path, self.to_dict()
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ DNS health probe round failed: {e}")
+            await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+
+    def clear(self) -> None:
+        self._health.clear()
+        self.rounds = 0
+
+    # Snapshots
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"servers": [asdict(health) for health in self._health.values()]}
+
+    def load(self, path: str) -> int:
+        """Restore a snapshot file if it exists. Returns the number of servers loaded."""
+        snapshot = Path(path)
+        if not snapshot.exists():
+            return 0
+        names = {f.name for f in fields(ServerHealth)}
+        for item in json.loads(snapshot.read_text(encoding="utf-8")).get("servers", []):
+            health = ServerHealth(**{k: v for k, v in item.items() if k in names})
+            self._health[health.ip_address] = health
+        return len(self._health)
+
+
+health_prober = HealthProber()
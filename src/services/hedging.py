@@ -0,0 +1,130 @@
+"""Hedged resolution across an ISP's DNS servers ("ISP mode").
+
+A resolve against one address waits out the full timeout when that server
+drops the packet. In ISP mode the query goes to the ISP's primary server
+first; if it has not answered within that server's recent p95 latency (the
+hedge delay), the next server is queried too, and the first definitive answer
+wins. Since only the slowest ~5% of queries are hedged, the extra upstream
+load stays small. A server that fails outright is failed over immediately.
+"""
+
+import asyncio
+from collections.abc import Sequence
+
+from src.core.config import settings
+from src.core.metrics import isp_resolves
+from src.services.catalog import DNSServerEntry
+from src.services.circuit_breaker import circuit_breakers
+from src.services.dns_service import DNSService
+from src.services.health_prober import health_prober
+from src.services.latency_stats import recent_latency
+
+
+class HedgedResolver:
+    """Resolve against a list of servers, hedging slow ones."""
+
+    @staticmethod
+    def hedge_delay(dns_server: str) -> float:
+        """Seconds to wait for ``dns_server`` before also querying the next server."""
+        delay_ms = recent_latency.quantile(
+            dns_server, settings.dns_hedge_quantile, settings.dns_hedge_min_samples
+        )
+        if delay_ms is None:
+            delay_ms = settings.dns_hedge_default_delay_ms
+        delay_ms = min(
+            max(delay_ms, settings.dns_hedge_min_delay_ms), settings.dns_hedge_max_delay_ms
+        )
+        return delay_ms / 1000
+
+    @staticmethod
+    def order_servers(servers: Sequence[DNSServerEntry]) -> list[DNSServerEntry]:
+        """Servers measured healthy and with a closed circuit first, then by priority."""
+        unique = {server.ip_address: server for server in reversed(servers)}
+        return sorted(
+            unique.values(),
+            key=lambda server: (
+                circuit_breakers.is_open(server.ip_address),
+                not health_prober.is_healthy(server.ip_address),
+                server.priority,
+                server.id,
+            ),
+        )
+
+    @staticmethod
+    def _definitive(result: dict) -> bool:
+        # NXDOMAIN/NODATA is an answer, too (entries cached before the flag lack it)
+        return result["success"] or result.get("negative", False)
+
+    @staticmethod
+    async def resolve(
+        domain: str,
+        servers: Sequence[DNSServerEntry],
+        record_type: str = "A",
+        use_cache: bool = True,
+        transport: str = "auto",
+    ) -> dict:
+        """Resolve through ``servers`` in order, returning the first definitive answer.
+
+        The result is that server's resolve result plus ``hedged`` (whether more
+        than one server was queried). When every server fails, the first
+        server's failure is returned. Losing queries are not cancelled
+        upstream; their answers still fill the cache.
+        """
+        ordered = HedgedResolver.order_servers(servers)
+        if not ordered:
+            raise ValueError("No DNS servers to query")
+
+        pending: set[asyncio.Task] = set()
+        failures: list[dict] = []
+        launched = 0
+
+        def launch() -> str:
+            nonlocal launched
+            dns_server = ordered[launched].ip_address
+            launched += 1
+            pending.add(
+                asyncio.ensure_future(
+                    DNSService.resolve_domain(domain, dns_server, record_type, use_cache, transport)
+                )
+            )
+            return dns_server
+
+        current = launch()
+        try:
+            while pending:
+                delay = HedgedResolver.hedge_delay(current) if launched < len(ordered) else None
+                done, pending = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    current = launch()  # Hedge: the current server is slower than usual
+                    continue
+
+                for task in done:
+                    result = task.result()
+                    if HedgedResolver._definitive(result):
+                        HedgedResolver._count(result, ordered[0].ip_address, launched)
+                        return {**result, "hedged": launched > 1}
+                    failures.append(result)
+
+                if not pending and launched < len(ordered):
+                    current = launch()  # Fail over right away
+        finally:
+            for task in pending:
+                task.cancel()
+
+        HedgedResolver._count(None, ordered[0].ip_address, launched)
+        first = next((r for r in failures if r["dns_server"] == ordered[0].ip_address), failures[0])
+        return {**first, "hedged": launched > 1}
+
+    @staticmethod
+    def _count(result: dict | None, primary: str, launched: int) -> None:
+        if not settings.metrics_enabled:
+            return
+        if result is None:
+            outcome = "failed"
+        elif result["dns_server"] != primary:
+            outcome = "hedge"
+        else:
+            outcome = "primary_hedged" if launched > 1 else "primary"
+        isp_resolves.inc(outcome)
@@ -1,13 +1,15 @@
 """ISP detection and management service."""
 
-from typing import Optional
-
-import httpx
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from src.models.dns import ASNMapping, DNSServer, ISP
+from src.core.config import settings
+from src.core.metrics import Timer, asn_lookup_duration
+from src.core.profiling import phase
+from src.models.dns import ISP, ASNMapping, DNSServer
+from src.services.asn_client import asn_client
+from src.services.asn_index import get_asn_index
 
 
 class ISPService:
@@ -23,7 +25,7 @@ class ISPService:
         return list(result.scalars().all())
 
     @staticmethod
-    async def get_isp_by_id(db: AsyncSession, isp_id: int, include_dns: bool = False) -> Optional[ISP]:
+    async def get_isp_by_id(db: AsyncSession, isp_id: int, include_dns: bool = False) -> ISP | None:
         """Get ISP by ID."""
         if include_dns:
             result = await db.execute(
@@ -45,23 +47,26 @@ class ISPService:
         return list(result.scalars().all())
 
     @staticmethod
-    async def detect_isp_from_ip(db: AsyncSession, ip_address: str) -> Optional[dict]:
+    async def get_asn_mappings(db: AsyncSession) -> list[ASNMapping]:
+        """Get all ASN to ISP mappings."""
+        result = await db.execute(select(ASNMapping).order_by(ASNMapping.asn, ASNMapping.isp_id))
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def detect_isp_from_ip(db: AsyncSession, ip_address: str) -> dict | None:
         """Detect ISP from IP address using ASN lookup."""
+        from src.services.catalog import catalog_store
+
         # Try to get ASN info from IP
-        asn_info = await ISPService._get_asn_from_ip(ip_address)
+        with phase("asn_lookup"):
+            asn_info = await ISPService._get_asn_from_ip(ip_address)
 
         if not asn_info:
             return None
 
-        # Find ISP by ASN
-        result = await db.execute(
-            select(ISP)
-            .join(ASNMapping)
-            .where(ASNMapping.asn == asn_info["asn"])
-            .options(selectinload(ISP.dns_servers))
-        )
-
-        isp = result.scalar_one_or_none()
+        # Find ISP by ASN in the catalog snapshot
+        catalog = await catalog_store.get(db)
+        isp = catalog.isps_by_asn.get(asn_info["asn"])
 
         return {
             "ip_address": ip_address,
@@ -72,29 +77,64 @@ class ISPService:
         }
 
     @staticmethod
-    async def _get_asn_from_ip(ip_address: str) -> Optional[dict]:
-        """Get ASN information from IP address using Team Cymru service."""
-        try:
-            # Use Team Cymru's whois service (free, no API key needed)
-            # Alternative: MaxMind GeoIP2 (requires license key)
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                response = await client.get(
-                    f"https://api.bgpview.io/ip/{ip_address}",
-                    headers={"Accept": "application/json"},
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    prefixes = data.get("data", {}).get("prefixes", [])
-
-                    if prefixes:
-                        prefix = prefixes[0]
-                        return {
-                            "asn": prefix.get("asn", {}).get("asn"),
-                            "as_name": prefix.get("asn", {}).get("name"),
-                        }
-
-        except Exception:
-            pass
-
-        return None
+    async def detect_isps(
+        db: AsyncSession, ip_addresses: list[str]
+    ) -> tuple[list[dict], list[str]]:
+        """Detect the ISPs of many addresses or CIDRs with one pass over the local ASN index.
+
+        Returns the results of the distinct valid inputs in address order and
+        the invalid inputs. There is no remote fallback; raises RuntimeError
+        when the local index is not loaded.
+        """
+        from src.services.catalog import catalog_store
+
+        index = get_asn_index()
+        if index is None:
+            raise RuntimeError("ASN index is not loaded (set ASN_DB_PATH)")
+
+        with phase("asn_lookup"), Timer(asn_lookup_duration, "index_batch"):
+            matches = index.lookup_many(ip_addresses)
+
+        catalog = await catalog_store.get(db)
+        results = []
+        for ip_address, asn_info in matches.items():
+            isp = catalog.isps_by_asn.get(asn_info["asn"]) if asn_info else None
+            results.append(
+                {
+                    "ip_address": ip_address,
+                    "asn": asn_info["asn"] if asn_info else None,
+                    "as_name": asn_info["as_name"] if asn_info else None,
+                    "isp": isp,
+                    "detected": isp is not None,
+                }
+            )
+
+        invalid = [
+            ip_address for ip_address in dict.fromkeys(ip_addresses) if ip_address not in matches
+        ]
+        return results, invalid
+
+    @staticmethod
+    async def _get_asn_from_ip(ip_address: str) -> dict | None:
+        """Get ASN information from IP address.
+
+        Uses the local prefix index when loaded, falling back to the remote
+        lookup if enabled.
+        """
+        index = get_asn_index()
+        if index is not None:
+            with Timer(asn_lookup_duration, "index"):
+                asn_info = index.lookup(ip_address)
+            if asn_info:
+                return asn_info
+
+        if not settings.asn_http_fallback:
+            return None
+
+        with Timer(asn_lookup_duration, "http"):
+            return await ISPService._get_asn_from_http(ip_address)
+
+    @staticmethod
+    async def _get_asn_from_http(ip_address: str) -> dict | None:
+        """Get ASN information from IP address using the BGPView API."""
+        return await asn_client.lookup(ip_address)
@@ -0,0 +1,392 @@
+"""In-memory latency statistics per DNS server and ISP.
+
+Every upstream query is recorded into a mergeable log-bucketed latency sketch
+(HDR-style: bucket boundaries grow geometrically, so any quantile is accurate
+to ``stats_relative_accuracy``). Sketches are kept per fixed time window and
+per dimension key; a stats query merges the windows it covers, so its cost
+depends on the number of buckets, not on query volume. Windows are
+periodically checkpointed to a JSON file and restored on startup.
+"""
+
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+from collections import OrderedDict, deque
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from src.core.config import settings
+
+WORKER_INDEX_ENV = "KRESOLVER_WORKER_INDEX"  # set by the pre-fork launcher
+WORKER_COUNT_ENV = "KRESOLVER_WORKER_COUNT"  # set by the pre-fork launcher
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+StatsKey = tuple[str, str]  # (dimension, key): ("server", "8.8.8.8") or ("isp", "1")
+
+
+class LatencySketch:
+    """Log-bucketed latency histogram with bounded relative error.
+
+    A value ``v`` lands in bucket ``ceil(log(v) / log(gamma))``; reporting the
+    bucket midpoint keeps the relative error within ``accuracy``. Sketches with
+    the same accuracy merge by adding bucket counts.
+    """
+
+    __slots__ = ("accuracy", "gamma", "_log_gamma", "bins", "zero_count", "count", "total", "max")
+
+    # Values at or below this (ms) count as zero
+    MIN_VALUE = 0.01
+
+    def __init__(self, accuracy: float = 0.01) -> None:
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float, count: int = 1) -> None:
+        """Record ``count`` observations of ``value`` milliseconds."""
+        if value <= self.MIN_VALUE:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add another sketch's observations into this one."""
+        if other.accuracy != self.accuracy:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float | None:
+        """Estimated value at quantile ``q`` (0..1), or None if empty."""
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return min(2 * self.gamma**index / (self.gamma + 1), self.max)
+        return self.max
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero": self.zero_count,
+            "count": self.count,
+            "total": self.total,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], accuracy: float) -> "LatencySketch":
+        sketch = cls(accuracy)
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.zero_count = data["zero"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.max = data["max"]
+        return sketch
+
+
+@dataclass(slots=True)
+class StatsCell:
+    """Query counters and latency sketch for one key in one window.
+
+    Latency is only recorded for successful queries; failures (mostly
+    timeouts) would otherwise dominate the upper percentiles.
+    """
+
+    latency: LatencySketch
+    queries: int = 0
+    successes: int = 0
+
+    def merge(self, other: "StatsCell") -> None:
+        self.latency.merge(other.latency)
+        self.queries += other.queries
+        self.successes += other.successes
+
+    def summary(self) -> dict[str, Any]:
+        p50, p90, p99 = (self.latency.quantile(q) for q in PERCENTILES)
+        return {
+            "queries": self.queries,
+            "successes": self.successes,
+            "success_rate": self.successes / self.queries if self.queries else None,
+            "p50_ms": p50,
+            "p90_ms": p90,
+            "p99_ms": p99,
+            "max_ms": self.latency.max if self.latency.count else None,
+        }
+
+
+@dataclass(slots=True)
+class _Window:
+    start: int
+    cells: dict[StatsKey, StatsCell] = field(default_factory=dict)
+
+
+class LatencyStats:
+    """Windowed latency sketches per DNS server and ISP."""
+
+    def __init__(
+        self,
+        window_seconds: int | None = None,
+        retention_seconds: int | None = None,
+        accuracy: float | None = None,
+    ) -> None:
+        self.window_seconds = window_seconds or settings.stats_window_seconds
+        self.retention_seconds = retention_seconds or settings.stats_retention_seconds
+        self.accuracy = accuracy or settings.stats_relative_accuracy
+        self._windows: dict[int, _Window] = {}
+        self._current: _Window | None = None
+
+    def _window(self, now: float) -> _Window:
+        start = int(now // self.window_seconds * self.window_seconds)
+        current = self._current
+        if current is not None and current.start == start:
+            return current
+
+        window = self._windows.get(start)
+        if window is None:
+            window = self._windows[start] = _Window(start)
+            self._prune(now)
+        self._current = window
+        return window
+
+    def _prune(self, now: float) -> None:
+        oldest = now - self.retention_seconds - self.window_seconds
+        for start in [start for start in self._windows if start < oldest]:
+            del self._windows[start]
+
+    def record(
+        self,
+        dns_server: str,
+        isp_ids: Iterable[int],
+        response_time_ms: float | None,
+        success: bool,
+        now: float | None = None,
+    ) -> None:
+        """Record one upstream query for its server and ISPs."""
+        cells = self._window(time.time() if now is None else now).cells
+        keys = [("server", dns_server)] + [("isp", str(isp_id)) for isp_id in isp_ids]
+        for key in keys:
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = StatsCell(LatencySketch(self.accuracy))
+            cell.queries += 1
+            if success:
+                cell.successes += 1
+                if response_time_ms is not None:
+                    cell.latency.add(response_time_ms)
+
+    def _merged(self, dimension: str, window_s: int, now: float | None) -> dict[str, StatsCell]:
+        since = (time.time() if now is None else now) - window_s
+        merged: dict[str, StatsCell] = {}
+        for window in self._windows.values():
+            # Include a window if any part of it falls inside the range
+            if window.start + self.window_seconds <= since:
+                continue
+            for (cell_dimension, key), cell in window.cells.items():
+                if cell_dimension != dimension:
+                    continue
+                target = merged.get(key)
+                if target is None:
+                    target = merged[key] = StatsCell(LatencySketch(self.accuracy))
+                target.merge(cell)
+        return merged
+
+    def summary(self, dimension: str, window_s: int, now: float | None = None) -> dict[str, dict]:
+        """Per-key summaries over the last ``window_s`` seconds."""
+        return {key: cell.summary() for key, cell in self._merged(dimension, window_s, now).items()}
+
+    def timeseries(
+        self, dimension: str, key: str, window_s: int, now: float | None = None
+    ) -> list[dict]:
+        """Per-window summaries for one key over the last ``window_s`` seconds, oldest first."""
+        since = (time.time() if now is None else now) - window_s
+        points = []
+        for start in sorted(self._windows):
+            if start + self.window_seconds <= since:
+                continue
+            cell = self._windows[start].cells.get((dimension, key))
+            if cell is not None:
+                points.append({"window_start": start, **cell.summary()})
+        return points
+
+    def clear(self) -> None:
+        self._windows.clear()
+        self._current = None
+
+    # Checkpoints
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "window_seconds": self.window_seconds,
+            "accuracy": self.accuracy,
+            "windows": [
+                {
+                    "start": window.start,
+                    "cells": [
+                        {
+                            "dimension": dimension,
+                            "key": key,
+                            "queries": cell.queries,
+                            "successes": cell.successes,
+                            "latency": cell.latency.to_dict(),
+                        }
+                        for (dimension, key), cell in window.cells.items()
+                    ],
+                }
+                for window in self._windows.values()
+            ],
+        }
+
+    def load_dict(self, data: dict[str, Any], now: float | None = None) -> int:
+        """Restore windows from a checkpoint. Returns the number of windows loaded.
+
+        Checkpoints written with a different window size or accuracy are ignored.
+        """
+        if (
+            data.get("window_seconds") != self.window_seconds
+            or data.get("accuracy") != self.accuracy
+        ):
+            return 0
+
+        for item in data.get("windows", []):
+            window = self._windows.setdefault(item["start"], _Window(item["start"]))
+            for cell_data in item["cells"]:
+                cell = StatsCell(
+                    LatencySketch.from_dict(cell_data["latency"], self.accuracy),
+                    cell_data["queries"],
+                    cell_data["successes"],
+                )
+                key = (cell_data["dimension"], cell_data["key"])
+                existing = window.cells.get(key)
+                if existing is None:
+                    window.cells[key] = cell
+                else:
+                    existing.merge(cell)
+        self._prune(time.time() if now is None else now)
+        return len(self._windows)
+
+    def save(self, path: str) -> None:
+        """Write a checkpoint atomically."""
+        write_checkpoint(path, self.to_dict())
+
+    def load(self, path: str) -> int:
+        """Restore a checkpoint file if it exists."""
+        checkpoint = Path(path)
+        if not checkpoint.exists():
+            return 0
+        return self.load_dict(json.loads(checkpoint.read_text(encoding="utf-8")))
+
+    async def checkpoint_forever(self, path: str, interval: float) -> None:
+        """Checkpoint every ``interval`` seconds (run as a background task)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Serialize on the loop so the snapshot is consistent, write in a thread
+                await asyncio.to_thread(write_checkpoint, path, self.to_dict())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Latency stats checkpoint failed: {e}")
+
+
+class RecentLatency:
+    """The last ``size`` response times of each DNS server.
+
+    Hedge delays should follow a server's current latency, which windowed
+    sketches smooth over. Only the ``max_servers`` most recently used servers
+    are kept.
+    """
+
+    def __init__(self, size: int, max_servers: int) -> None:
+        self.size = size
+        self.max_servers = max_servers
+        self._samples: OrderedDict[str, deque[float]] = OrderedDict()
+
+    def observe(self, dns_server: str, latency_ms: float) -> None:
+        samples = self._samples.get(dns_server)
+        if samples is None:
+            samples = self._samples[dns_server] = deque(maxlen=self.size)
+            while len(self._samples) > self.max_servers:
+                self._samples.popitem(last=False)
+        else:
+            self._samples.move_to_end(dns_server)
+        samples.append(latency_ms)
+
+    def quantile(self, dns_server: str, q: float, min_samples: int = 1) -> float | None:
+        """Latency at quantile ``q`` (0..1), or None with fewer than ``min_samples``."""
+        samples = self._samples.get(dns_server)
+        if samples is None or len(samples) < max(min_samples, 1):
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+
+def write_checkpoint(path: str, data: dict[str, Any]) -> None:
+    """Write JSON to ``path`` via a uniquely named temporary file and rename.
+
+    The temporary name is unique so that workers sharing ``path`` never
+    write into each other's half-finished file.
+    """
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=target.parent, prefix=f"{target.name}.", suffix=".tmp")
+    tmp = Path(name)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(data, separators=(",", ":")))
+        tmp.replace(target)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def worker_checkpoint_path(path: str) -> str:
+    """``path`` with the launcher's worker index appended (``stats.json.0``).
+
+    Each worker keeps its own stats, so each needs its own checkpoint. The
+    index survives worker restarts, so a replacement restores its
+    predecessor's file. Outside the launcher ``path`` is used as is.
+    """
+    worker = os.environ.get(WORKER_INDEX_ENV)
+    if worker is None or not path:
+        return path
+    target = Path(path)
+    return str(target.with_name(f"{target.name}.{worker}"))
+
+
+def worker_count() -> int:
+    """Number of workers started by the launcher (1 outside the launcher)."""
+    return max(1, int(os.environ.get(WORKER_COUNT_ENV, "1")))
+
+
+latency_stats = LatencyStats()
+recent_latency = RecentLatency(settings.dns_hedge_window, settings.dns_hedge_max_servers)
@@ -0,0 +1,324 @@
+"""QueryLog partition management, hourly rollups and retention.
+
+On PostgreSQL ``query_logs`` is range-partitioned on ``created_at`` (see the
+Alembic migration). This module keeps partitions created ahead of time, rolls
+raw rows up into ``query_log_rollups`` per dns_server/domain/hour, and enforces
+retention by dropping whole partitions once they are older than the retention
+window and fully rolled up. Rollups also run on other databases; partition
+management is skipped there.
+"""
+
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import and_, delete, func, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.models.dns import QueryLog, QueryLogRollup
+
+# Upper bounds (inclusive) of the rollup latency histogram; one overflow bucket follows
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# pg_try_advisory_xact_lock key, so only one worker runs maintenance at a time
+ADVISORY_LOCK_KEY = 0x4B5245534F4C  # "KRESOL"
+
+ROLLUP_CHUNK = timedelta(days=1)
+
+Partition = tuple[str, datetime, datetime]  # (name, start, end)
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def floor_hour(moment: datetime) -> datetime:
+    """Truncate to the start of the hour."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def partition_start(moment: datetime, interval: str) -> datetime:
+    """Start of the day or month partition containing ``moment``."""
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start if interval == "day" else start.replace(day=1)
+
+
+def next_partition_start(start: datetime, interval: str) -> datetime:
+    """Start of the partition following the one starting at ``start``."""
+    if interval == "day":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start: datetime, interval: str) -> str:
+    """``query_logs_pYYYY_MM`` or ``query_logs_pYYYY_MM_DD``."""
+    suffix = start.strftime("%Y_%m_%d" if interval == "day" else "%Y_%m")
+    return f"{QueryLog.__tablename__}_p{suffix}"
+
+
+def planned_partitions(now: datetime, interval: str, ahead: int) -> list[Partition]:
+    """The current partition plus ``ahead`` future ones."""
+    partitions = []
+    start = partition_start(now, interval)
+    for _ in range(ahead + 1):
+        end = next_partition_start(start, interval)
+        partitions.append((partition_name(start, interval), start, end))
+        start = end
+    return partitions
+
+
+def parse_partition_bound(expression: str) -> tuple[datetime, datetime] | None:
+    """Parse ``FOR VALUES FROM ('...') TO ('...')``; None for DEFAULT or open bounds."""
+    match = _BOUND_RE.search(expression)
+    if match is None:
+        return None
+    return datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))
+
+
+def overlaps(start: datetime, end: datetime, partitions: list[Partition]) -> bool:
+    """Whether [start, end) intersects any existing partition."""
+    return any(start < other_end and other_start < end for _, other_start, other_end in partitions)
+
+
+def expired_partitions(
+    partitions: list[Partition], cutoff: datetime, rolled_up_to: datetime | None
+) -> list[str]:
+    """Partitions entirely older than ``cutoff`` whose rows are already rolled up."""
+    if rolled_up_to is None:
+        return []
+    limit = min(cutoff, rolled_up_to)
+    return [name for name, _, end in sorted(partitions, key=lambda p: p[1]) if end <= limit]
+
+
+class QueryLogMaintenance:
+    """Periodic partition, rollup and retention jobs for ``query_logs``."""
+
+    def __init__(
+        self, session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal
+    ) -> None:
+        self.session_factory = session_factory
+        self.last_run: datetime | None = None
+        self.last_result: dict[str, Any] = {}
+
+    @staticmethod
+    def _dialect(session: AsyncSession) -> str:
+        return session.get_bind().dialect.name
+
+    @staticmethod
+    async def db_now(session: AsyncSession) -> datetime:
+        """Current time as the database stores ``created_at`` (naive, server clock)."""
+        if QueryLogMaintenance._dialect(session) == "postgresql":
+            return await session.scalar(select(literal_column("localtimestamp")))
+        return datetime.fromisoformat(await session.scalar(select(func.datetime("now"))))
+
+    # Partitions (PostgreSQL only)
+
+    @staticmethod
+    async def list_partitions(session: AsyncSession) -> list[Partition]:
+        """Existing bounded partitions of ``query_logs``."""
+        result = await session.execute(
+            text(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                "FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = CAST(:parent AS regclass)"
+            ),
+            {"parent": QueryLog.__tablename__},
+        )
+        partitions = []
+        for name, expression in result:
+            bound = parse_partition_bound(expression or "")
+            if bound is not None:
+                partitions.append((name, *bound))
+        return partitions
+
+    @staticmethod
+    async def ensure_partitions(session: AsyncSession, now: datetime) -> list[str]:
+        """Create the current and upcoming partitions. Returns the created names."""
+        existing = await QueryLogMaintenance.list_partitions(session)
+        created = []
+        for name, start, end in planned_partitions(
+            now, settings.query_log_partition_interval, settings.query_log_partitions_ahead
+        ):
+            # Skip periods already covered, e.g. after switching between day and month
+            if overlaps(start, end, existing):
+                continue
+            try:
+                async with session.begin_nested():
+                    await session.execute(
+                        text(
+                            f'CREATE TABLE "{name}" PARTITION OF {QueryLog.__tablename__} '
+                            f"FOR VALUES FROM ('{start.isoformat(' ')}') TO ('{end.isoformat(' ')}')"
+                        )
+                    )
+            except Exception as e:
+                # Usually rows for this period already landed in the default partition
+                print(f"❌ Query log partition {name} not created: {e}")
+                continue
+            existing.append((name, start, end))
+            created.append(name)
+        return created
+
+    @staticmethod
+    async def drop_expired_partitions(session: AsyncSession, now: datetime) -> list[str]:
+        """Drop partitions past retention that are fully covered by rollups."""
+        cutoff = now - timedelta(days=settings.query_log_retention_days)
+        rolled_up_to = await QueryLogMaintenance.rolled_up_to(session)
+        expired = expired_partitions(
+            await QueryLogMaintenance.list_partitions(session), cutoff, rolled_up_to
+        )
+        for name in expired:
+            await session.execute(text(f'DROP TABLE "{name}"'))
+        return expired
+
+    # Rollups
+
+    @staticmethod
+    async def rolled_up_to(session: AsyncSession) -> datetime | None:
+        """End of the last rolled-up hour, or None if nothing was rolled up yet."""
+        latest = await session.scalar(select(func.max(QueryLogRollup.bucket_start)))
+        if latest is None:
+            return None
+        if isinstance(latest, str):
+            latest = datetime.fromisoformat(latest)
+        return latest + timedelta(hours=1)
+
+    @staticmethod
+    def _rollup_select(dialect: str, start: datetime, end: datetime) -> Any:
+        created_at = QueryLog.created_at
+        if dialect == "postgresql":
+            bucket = func.date_trunc("hour", created_at)
+            json_array = func.json_build_array
+        else:
+            bucket = func.strftime("%Y-%m-%d %H:00:00.000000", created_at)
+            json_array = func.json_array
+
+        latency = QueryLog.response_time_ms
+        histogram = []
+        lower = None
+        for upper in LATENCY_BUCKETS_MS:
+            condition = (
+                latency <= upper if lower is None else and_(latency > lower, latency <= upper)
+            )
+            histogram.append(func.count().filter(condition))
+            lower = upper
+        histogram.append(func.count().filter(latency > lower))
+
+        return (
+            select(
+                bucket.label("bucket_start"),
+                QueryLog.dns_server,
+                QueryLog.domain,
+                func.count().label("query_count"),
+                func.count().filter(QueryLog.success.is_(True)).label("success_count"),
+                func.coalesce(func.sum(latency), 0).label("latency_sum_ms"),
+                json_array(*histogram).label("latency_buckets"),
+            )
+            .where(created_at >= start, created_at < end)
+            .group_by(bucket, QueryLog.dns_server, QueryLog.domain)
+        )
+
+    @staticmethod
+    async def rollup(session: AsyncSession, now: datetime) -> int:
+        """Roll complete hours up into ``query_log_rollups``. Returns rows upserted.
+
+        Starts at the last rolled-up hour (or the oldest log) and stops
+        ``query_log_rollup_delay`` seconds behind ``now`` so buffered writes
+        land first. Hours are recomputed as a whole, so reruns are idempotent.
+        """
+        dialect = QueryLogMaintenance._dialect(session)
+        end = floor_hour(now - timedelta(seconds=settings.query_log_rollup_delay))
+
+        start = await QueryLogMaintenance.rolled_up_to(session)
+        if start is None:
+            oldest = await session.scalar(select(func.min(QueryLog.created_at)))
+            if oldest is None:
+                return 0
+            start = floor_hour(oldest)
+
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        columns = [
+            "bucket_start",
+            "dns_server",
+            "domain",
+            "query_count",
+            "success_count",
+            "latency_sum_ms",
+            "latency_buckets",
+        ]
+
+        upserted = 0
+        while start < end:
+            chunk_end = min(start + ROLLUP_CHUNK, end)
+            statement = insert(QueryLogRollup).from_select(
+                columns, QueryLogMaintenance._rollup_select(dialect, start, chunk_end)
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=["bucket_start", "dns_server", "domain"],
+                set_={name: statement.excluded[name] for name in columns[3:]},
+            )
+            result = await session.execute(statement)
+            upserted += max(result.rowcount, 0)
+            start = chunk_end
+        return upserted
+
+    @staticmethod
+    async def drop_expired_rollups(session: AsyncSession, now: datetime) -> int:
+        """Delete rollups older than ``query_log_rollup_retention_days``."""
+        cutoff = now - timedelta(days=settings.query_log_rollup_retention_days)
+        result = await session.execute(
+            delete(QueryLogRollup).where(QueryLogRollup.bucket_start < cutoff)
+        )
+        return max(result.rowcount, 0)
+
+    # Scheduling
+
+    async def run_once(self, now: datetime | None = None) -> dict[str, Any]:
+        """Run one maintenance pass. Skipped if another worker holds the lock."""
+        async with self.session_factory() as session:
+            postgres = self._dialect(session) == "postgresql"
+            if postgres:
+                locked = await session.scalar(
+                    select(func.pg_try_advisory_xact_lock(ADVISORY_LOCK_KEY))
+                )
+                if not locked:
+                    await session.rollback()
+                    return {"skipped": True}
+
+            now = now or await self.db_now(session)
+            result: dict[str, Any] = {"skipped": False, "created": [], "dropped": []}
+            if postgres:
+                result["created"] = await self.ensure_partitions(session, now)
+            result["rolled_up"] = await self.rollup(session, now)
+            if postgres:
+                result["dropped"] = await self.drop_expired_partitions(session, now)
+            result["rollups_deleted"] = await self.drop_expired_rollups(session, now)
+            await session.commit()
+
+        self.last_run = now
+        self.last_result = result
+        return result
+
+    async def run_forever(self, interval: float) -> None:
+        """Run maintenance every ``interval`` seconds (run as a background task)."""
+        while True:
+            try:
+                result = await self.run_once()
+                if result.get("created") or result.get("dropped"):
+                    print(
+                        f"🗂️ Query log partitions created: {result['created']}, "
+                        f"dropped: {result['dropped']}"
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Query log maintenance failed: {e}")
+            await asyncio.sleep(interval)
+
+
+query_log_maintenance = QueryLogMaintenance()
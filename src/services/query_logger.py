@@ -0,0 +1,174 @@
+"""Write-behind QueryLog pipeline."""
+
+import asyncio
+import time
+from typing import Any
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal
+from src.core.metrics import CounterView, query_log_write_duration, registry
+from src.models.dns import QueryLog
+
+_STOP = object()
+
+
+class QueryLogWriter:
+    """Buffers QueryLog rows in a bounded queue and writes them in batches.
+
+    A background task drains the queue and issues one multi-row INSERT per
+    batch, flushing when ``query_log_batch_size`` rows are pending or
+    ``query_log_flush_interval`` seconds have passed. When the queue is full,
+    ``query_log_overflow_policy`` decides whether rows are dropped (and counted)
+    or the caller waits for room.
+    """
+
+    def __init__(
+        self, session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal
+    ) -> None:
+        self.session_factory = session_factory
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the background writer task."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.query_log_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush pending rows and stop the writer."""
+        if not self.running or self._queue is None or self._task is None:
+            return
+
+        queue, task = self._queue, self._task
+
+        async def drain() -> None:
+            # Under the "block" policy a full queue makes the sentinel wait too
+            await queue.put(_STOP)
+            await task
+
+        try:
+            await asyncio.wait_for(drain(), timeout=settings.query_log_shutdown_timeout)
+        except TimeoutError:
+            task.cancel()
+            print(f"❌ Query log writer did not finish, {queue.qsize()} rows lost")
+        self._task = None
+
+    async def submit(self, row: dict[str, Any]) -> bool:
+        """Queue one QueryLog row. Returns False if it was dropped."""
+        if not self.running or self._queue is None:
+            self.dropped += 1
+            return False
+
+        if settings.query_log_overflow_policy == "block":
+            await self._queue.put(row)
+        else:
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                return False
+
+        self.enqueued += 1
+        return True
+
+    async def submit_many(self, rows: list[dict[str, Any]]) -> int:
+        """Queue several rows. Returns how many were accepted."""
+        accepted = 0
+        for row in rows:
+            accepted += await self.submit(row)
+        return accepted
+
+    async def flush(self) -> None:
+        """Wait until every queued row has been written (or failed)."""
+        if self.running and self._queue is not None:
+            await self._queue.join()
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+
+        while True:
+            first = await queue.get()
+            if first is _STOP:
+                queue.task_done()
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = loop.time() + settings.query_log_flush_interval
+
+            while len(batch) < settings.query_log_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(queue.get(), timeout)
+                except TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    queue.task_done()
+                    break
+                batch.append(row)
+
+            await self._write(batch)
+            for _ in batch:
+                queue.task_done()
+
+            if stopping:
+                return
+
+    async def _write(self, batch: list[dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(QueryLog), batch)
+                await session.commit()
+            self.written += len(batch)
+            self.batches += 1
+            query_log_write_duration.observe(time.perf_counter() - start, "ok")
+        except Exception as e:
+            self.failed += len(batch)
+            query_log_write_duration.observe(time.perf_counter() - start, "error")
+            print(f"❌ Query log write failed ({len(batch)} rows): {e}")
+
+    def stats(self) -> dict:
+        """Writer counters."""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+query_log_writer = QueryLogWriter()
+
+registry.register(
+    CounterView(
+        "kresolver_query_log_rows",
+        "QueryLog rows by outcome",
+        ("outcome",),
+        collect=lambda: [
+            ((outcome,), query_log_writer.stats()[outcome])
+            for outcome in ("enqueued", "dropped", "written", "failed")
+        ],
+    )
+)
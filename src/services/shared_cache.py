@@ -0,0 +1,268 @@
+"""Shared-memory L2 cache for workers on the same host.
+
+Every uvicorn worker keeps its own in-process caches, so without this each
+worker warms up separately and sends its own upstream queries. This cache is
+a fixed-size hash table in a memory-mapped file (put it on ``/dev/shm``)
+that all workers map, so an answer fetched by one worker is a hit in the
+others. Total memory is ``shared_cache_slots * shared_cache_slot_size``.
+
+Layout: a header page, then ``slots`` fixed-size slots grouped into sets of
+``ways``. A key hashes (blake2b, stable across processes) to one set; an
+insert replaces the same key, an empty or expired slot, or the slot that
+expires first. Entries that do not fit in a slot are not cached here.
+
+Reads take no lock: each slot has a sequence counter that a writer makes odd
+while it writes and even again when done, and a reader copies the slot and
+only uses it if the counter was even and unchanged across the copy (a
+seqlock). Writers serialize on an ``flock`` of the file, which is cheap
+because writes only happen on upstream cache misses. A writer that dies
+mid-write leaves the counter odd; the next writer of that slot keeps it odd
+while rewriting the slot, so readers never accept the torn copy.
+"""
+
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any
+
+from src.core.config import settings
+from src.core.metrics import CounterView, registry
+
+MAGIC = b"KRSC0001"
+_HEADER = struct.Struct("<8sIII")  # magic, slots, slot size, ways
+HEADER_SIZE = mmap.PAGESIZE
+# seq, unused, key hash, expires_at (wall clock), key length, value length
+_SLOT = struct.Struct("<IIQdHH")
+_SEQ = struct.Struct("<I")
+
+
+def key_hash(key: bytes) -> int:
+    # Python's hash() is randomized per process, so it cannot be shared
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class SharedCache:
+    """Byte-keyed cache in a memory-mapped file shared by processes on one host.
+
+    Disabled (every ``get`` misses and ``set`` is a no-op) when ``path`` is
+    empty or the file cannot be mapped. The file is opened lazily in each
+    process, so workers forked from a parent that already used it get their
+    own mapping and lock.
+    """
+
+    def __init__(self, path: str, slots: int, slot_size: int, ways: int) -> None:
+        self.path = path
+        self.ways = max(1, ways)
+        self.slots = max(self.ways, slots - slots % self.ways)
+        self.slot_size = slot_size
+        self.max_payload = slot_size - _SLOT.size
+        self._map: mmap.mmap | None = None
+        self._fd: int | None = None
+        self._pid: int | None = None
+        self._failed = False
+        self.hits = 0
+        self.misses = 0
+        self.torn_reads = 0
+        self.writes = 0
+        self.evictions = 0
+        self.oversized = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path) and not self._failed
+
+    def _open(self) -> mmap.mmap | None:
+        """Map the file, creating and formatting it if needed (once per process)."""
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        if not self.enabled:
+            return None
+
+        size = HEADER_SIZE + self.slots * self.slot_size
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    current = os.fstat(fd).st_size
+                    if current == 0:
+                        os.ftruncate(fd, size)
+                    elif current != size:
+                        raise ValueError(f"size {current} does not match the configured {size}")
+                    mapped = mmap.mmap(fd, size)
+                    header = _HEADER.unpack_from(mapped, 0)
+                    if header[0] != MAGIC:
+                        _HEADER.pack_into(mapped, 0, MAGIC, self.slots, self.slot_size, self.ways)
+                    elif header[1:] != (self.slots, self.slot_size, self.ways):
+                        mapped.close()
+                        raise ValueError(f"layout {header[1:]} does not match the configuration")
+                finally:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            except BaseException:
+                os.close(fd)
+                raise
+        except (OSError, ValueError) as e:
+            print(f"❌ Shared cache disabled ({self.path}): {e}")
+            self._failed = True
+            return None
+
+        self._map, self._fd, self._pid = mapped, fd, os.getpid()
+        return mapped
+
+    def open(self) -> bool:
+        """Map the file now instead of on first use; False if disabled."""
+        return self._open() is not None
+
+    def _set_offset(self, hashed: int) -> int:
+        return HEADER_SIZE + (hashed % (self.slots // self.ways)) * self.ways * self.slot_size
+
+    def get(self, key: bytes) -> tuple[bytes, float] | None:
+        """Return ``(value, expires_at)`` for ``key`` if present and unexpired."""
+        mapped = self._open()
+        if mapped is None:
+            return None
+
+        hashed = key_hash(key)
+        now = time.time()
+        base = self._set_offset(hashed)
+        for way in range(self.ways):
+            offset = base + way * self.slot_size
+            seq = _SEQ.unpack_from(mapped, offset)[0]
+            if seq & 1:
+                continue  # Being written
+            slot = mapped[offset : offset + self.slot_size]
+            if _SEQ.unpack_from(mapped, offset)[0] != seq:
+                self.torn_reads += 1
+                continue
+            _, _, slot_hash, expires_at, key_len, value_len = _SLOT.unpack_from(slot, 0)
+            if slot_hash != hashed or expires_at <= now:
+                continue
+            start = _SLOT.size
+            if slot[start : start + key_len] != key:
+                continue
+            self.hits += 1
+            return slot[start + key_len : start + key_len + value_len], expires_at
+
+        self.misses += 1
+        return None
+
+    def set(self, key: bytes, value: bytes, expires_at: float) -> bool:
+        """Store ``value`` until ``expires_at`` (``time.time()`` seconds)."""
+        mapped = self._open()
+        if mapped is None:
+            return False
+        if len(key) + len(value) > self.max_payload:
+            self.oversized += 1
+            return False
+
+        hashed = key_hash(key)
+        now = time.time()
+        base = self._set_offset(hashed)
+        assert self._fd is not None
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Same key, else a free or expired slot, else the one expiring first
+            target = None
+            victim, victim_expiry = base, float("inf")
+            for way in range(self.ways):
+                offset = base + way * self.slot_size
+                _, _, slot_hash, slot_expiry, key_len, _ = _SLOT.unpack_from(mapped, offset)
+                start = offset + _SLOT.size
+                if slot_hash == hashed and mapped[start : start + key_len] == key:
+                    target = offset
+                    break
+                if slot_hash == 0 or slot_expiry <= now:
+                    slot_expiry = float("-inf")
+                if slot_expiry < victim_expiry:
+                    victim, victim_expiry = offset, slot_expiry
+            if target is None:
+                target = victim
+                if victim_expiry != float("-inf"):
+                    self.evictions += 1
+
+            writing = _SEQ.unpack_from(mapped, target)[0] | 1  # already odd after a crash
+            _SEQ.pack_into(mapped, target, writing)  # odd: readers skip the slot
+            _SLOT.pack_into(mapped, target, writing, 0, hashed, expires_at, len(key), len(value))
+            start = target + _SLOT.size
+            mapped[start : start + len(key) + len(value)] = key + value
+            _SEQ.pack_into(mapped, target, (writing + 1) & 0xFFFFFFFF)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self.writes += 1
+        return True
+
+    def get_json(self, key: str) -> tuple[Any, float] | None:
+        """``get`` for a JSON value under a str key."""
+        found = self.get(key.encode())
+        if found is None:
+            return None
+        return json.loads(found[0]), found[1]
+
+    def set_json(self, key: str, value: Any, ttl: float) -> bool:
+        """``set`` a JSON-serializable value for ``ttl`` seconds."""
+        payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+        return self.set(key.encode(), payload, time.time() + ttl)
+
+    def clear(self) -> None:
+        """Empty the table for every process and reset this process's counters."""
+        mapped = self._open()
+        if mapped is not None:
+            assert self._fd is not None
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for slot in range(self.slots):
+                    offset = HEADER_SIZE + slot * self.slot_size
+                    writing = _SEQ.unpack_from(mapped, offset)[0] | 1
+                    _SLOT.pack_into(mapped, offset, writing, 0, 0, 0.0, 0, 0)
+                    _SEQ.pack_into(mapped, offset, (writing + 1) & 0xFFFFFFFF)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.hits = self.misses = self.torn_reads = self.writes = 0
+        self.evictions = self.oversized = 0
+
+    def close(self) -> None:
+        """Unmap the file (it stays on disk for other workers)."""
+        if self._map is not None and self._pid == os.getpid():
+            self._map.close()
+            if self._fd is not None:
+                os.close(self._fd)
+        self._map = self._fd = self._pid = None
+
+    def stats(self) -> dict:
+        """This process's counters and the table size."""
+        return {
+            "enabled": int(self.enabled),
+            "slots": self.slots if self.enabled else 0,
+            "bytes": HEADER_SIZE + self.slots * self.slot_size if self.enabled else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "torn_reads": self.torn_reads,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "oversized": self.oversized,
+        }
+
+
+shared_cache = SharedCache(
+    settings.shared_cache_path,
+    settings.shared_cache_slots,
+    settings.shared_cache_slot_size,
+    settings.shared_cache_ways,
+)
+
+registry.register(
+    CounterView(
+        "kresolver_shared_cache_requests",
+        "Shared-memory cache operations in this worker by result",
+        ("result",),
+        collect=lambda: [
+            ((result,), shared_cache.stats()[result])
+            for result in ("hits", "misses", "torn_reads", "writes", "evictions", "oversized")
+        ],
+    )
+)
@@ -0,0 +1,346 @@
+"""Multiplexed asyncio UDP query engine for explicit nameservers.
+
+Instead of a resolver call (and a fresh socket) per query, every upstream gets
+a small pool of long-lived UDP sockets. Queries on a socket are told apart by
+a random message ID, and responses are matched on the ID and the raw question
+bytes without being parsed, so the only parse is the caller's. Per-query
+timeouts run on a shared timer wheel, so a query costs one set insertion
+instead of its own event-loop timer. Truncated responses are retried over TCP.
+"""
+
+import asyncio
+import math
+import secrets
+import socket
+from collections.abc import Callable
+
+import dns.exception
+import dns.inet
+import dns.message
+
+from src.core.config import settings
+
+UpstreamKey = tuple[str, int]  # (address, port)
+
+_HEADER = 12
+_QR = 0x80  # in the third header byte
+_TC = 0x02
+
+
+def question_end(wire: bytes) -> int:
+    """Offset just past the first question of a wire-format message."""
+    end = _HEADER
+    while wire[end]:
+        if wire[end] & 0xC0:
+            raise ValueError("Compressed question name")
+        end += wire[end] + 1
+    return end + 5  # root label, qtype, qclass
+
+
+def matches(response: bytes, question: bytes) -> bool:
+    """True if ``response`` is a response carrying ``question`` (case-insensitive name)."""
+    if len(response) < _HEADER + len(question) or not response[2] & _QR:
+        return False
+    echoed = response[_HEADER : _HEADER + len(question)]
+    return echoed == question or echoed.lower() == question.lower()
+
+
+class Timer:
+    """Handle for a callback scheduled on a TimerWheel."""
+
+    __slots__ = ("tick", "callback", "wheel")
+
+    def __init__(self, tick: int, callback: Callable[[], None], wheel: "TimerWheel") -> None:
+        self.tick = tick
+        self.callback = callback
+        self.wheel: TimerWheel | None = wheel
+
+    def cancel(self) -> None:
+        if self.wheel is not None:
+            self.wheel._remove(self)
+            self.wheel = None
+
+
+class TimerWheel:
+    """Hashed timer wheel driven by a single event-loop callback per tick.
+
+    Timers fire up to one ``resolution`` late. The wheel only ticks while it
+    holds timers, so an idle engine costs nothing.
+    """
+
+    def __init__(self, resolution: float = 0.01, slots: int = 512) -> None:
+        self.resolution = resolution
+        self._slots: list[set[Timer]] = [set() for _ in range(slots)]
+        self._tick = 0  # last processed tick
+        self._count = 0
+        self._handle: asyncio.TimerHandle | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _now(self, loop: asyncio.AbstractEventLoop) -> int:
+        return int(loop.time() / self.resolution)
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """Call ``callback`` after ``delay`` seconds (rounded up to a tick)."""
+        loop = asyncio.get_running_loop()
+        now = self._now(loop)
+        if self._handle is not None and self._loop is not loop:
+            self.close()  # the previous loop is gone, and its timers with it
+        if self._handle is None:
+            self._tick = now
+            self._loop = loop
+        timer = Timer(max(now + math.ceil(delay / self.resolution), self._tick + 1), callback, self)
+        self._slots[timer.tick % len(self._slots)].add(timer)
+        self._count += 1
+        if self._handle is None:
+            self._handle = loop.call_later(self.resolution, self._advance)
+        return timer
+
+    def _remove(self, timer: Timer) -> None:
+        slot = self._slots[timer.tick % len(self._slots)]
+        if timer in slot:
+            slot.remove(timer)
+            self._count -= 1
+
+    def _advance(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = self._now(loop)
+        while self._tick < now and self._count:
+            self._tick += 1
+            slot = self._slots[self._tick % len(self._slots)]
+            # Timers more than one revolution out share the slot; keep those
+            due = [timer for timer in slot if timer.tick <= self._tick]
+            for timer in due:
+                slot.remove(timer)
+                self._count -= 1
+                timer.wheel = None
+                timer.callback()
+        self._tick = max(self._tick, now)
+        self._handle = loop.call_later(self.resolution, self._advance) if self._count else None
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        for slot in self._slots:
+            slot.clear()
+        self._count = 0
+
+
+class _UpstreamSocket(asyncio.DatagramProtocol):
+    """One connected UDP socket carrying many in-flight queries."""
+
+    def __init__(self, engine: "UDPQueryEngine") -> None:
+        self.engine = engine
+        self.transport: asyncio.DatagramTransport | None = None
+        self.pending: dict[int, tuple[bytes, asyncio.Future]] = {}  # ID -> (question, waiter)
+        self.sent = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = transport  # type: ignore[assignment]
+
+    @property
+    def closed(self) -> bool:
+        return self.transport is None or self.transport.is_closing()
+
+    def datagram_received(self, data: bytes, _addr: tuple) -> None:
+        entry = self.pending.get(int.from_bytes(data[:2], "big"))
+        if entry is None or not matches(data, entry[0]):
+            # Late, stray or spoofed: same ID but a different question is not ours
+            self.engine.unmatched += 1
+            return
+        future = entry[1]
+        if not future.done():
+            future.set_result(data)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors (e.g. port unreachable) on a connected socket fail everything in flight
+        self._fail(exc)
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._fail(exc or ConnectionError("UDP socket closed"))
+
+    def _fail(self, exc: Exception) -> None:
+        for _, future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def close_when_idle(self) -> None:
+        if not self.pending and self.transport is not None:
+            self.transport.close()
+
+
+class UDPQueryEngine:
+    """Sends DNS queries over pooled, multiplexed UDP sockets.
+
+    Each upstream gets up to ``dns_udp_sockets_per_upstream`` sockets bound to
+    random source ports, used round-robin. A socket is replaced after
+    ``dns_udp_socket_max_queries`` queries so source ports keep changing.
+    Ports and message IDs come from the OS CSPRNG (``secrets``): answers end
+    up in the shared cache, so an off-path spoofer must not predict them.
+    """
+
+    def __init__(self) -> None:
+        self.wheel = TimerWheel(settings.dns_timer_resolution)
+        self._pools: dict[UpstreamKey, list[_UpstreamSocket]] = {}
+        self._turn: dict[UpstreamKey, int] = {}
+        self._locks: dict[UpstreamKey, asyncio.Lock] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.queries = 0
+        self.timeouts = 0
+        self.tcp_fallbacks = 0
+        self.unmatched = 0
+
+    async def _open(self, key: UpstreamKey) -> _UpstreamSocket:
+        """Open a UDP socket to ``key`` from a random source port."""
+        address, port = key
+        family = dns.inet.af_for_address(address)  # ValueError for hostnames: never resolved here
+        any_address = "::" if family == socket.AF_INET6 else "0.0.0.0"
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            for _ in range(8):
+                try:
+                    sock.bind((any_address, 1024 + secrets.randbelow(65536 - 1024)))
+                    break
+                except OSError:
+                    continue
+            else:
+                sock.bind((any_address, 0))  # let the OS pick
+            sock.connect((address, port))
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+
+        loop = asyncio.get_running_loop()
+        _, protocol = await loop.create_datagram_endpoint(lambda: _UpstreamSocket(self), sock=sock)
+        return protocol
+
+    async def _socket(self, key: UpstreamKey) -> _UpstreamSocket:
+        """Pick the next pooled socket for ``key``, opening or replacing sockets as needed."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sockets belong to the loop that opened them
+            self._pools.clear()
+            self._locks.clear()
+            self._loop = loop
+
+        pool = self._pools.get(key)
+        turn = self._turn.get(key, 0)
+        self._turn[key] = turn + 1
+        if pool is not None and len(pool) >= settings.dns_udp_sockets_per_upstream:
+            upstream = pool[turn % len(pool)]
+            if upstream.sent < settings.dns_udp_socket_max_queries and not upstream.closed:
+                return upstream
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            pool = self._pools.setdefault(key, [])
+            for upstream in list(pool):
+                if upstream.closed or upstream.sent >= settings.dns_udp_socket_max_queries:
+                    pool.remove(upstream)
+                    upstream.close_when_idle()
+            while len(pool) < settings.dns_udp_sockets_per_upstream:
+                pool.append(await self._open(key))
+            return pool[turn % len(pool)]
+
+    async def exchange(
+        self, address: str, wire: bytes, timeout: float, port: int | None = None
+    ) -> bytes:
+        """Send a wire-format query and return the raw response.
+
+        The query gets a fresh random ID; the response carries the same ID.
+        Raises dns.exception.Timeout when no matching response arrives in
+        ``timeout`` seconds, and OSError for socket errors.
+        """
+        key = (address, port or settings.dns_port)
+        question = wire[_HEADER : question_end(wire)]
+        upstream = await self._socket(key)
+        assert upstream.transport is not None
+
+        message_id = secrets.randbits(16)
+        while message_id in upstream.pending:
+            message_id = secrets.randbits(16)
+        wire = message_id.to_bytes(2, "big") + wire[2:]
+
+        future = asyncio.get_running_loop().create_future()
+
+        def expire() -> None:
+            if not future.done():
+                self.timeouts += 1
+                future.set_exception(dns.exception.Timeout(timeout=timeout))
+
+        timer = self.wheel.schedule(timeout, expire)
+        upstream.pending[message_id] = (question, future)
+        upstream.sent += 1
+        self.queries += 1
+        try:
+            upstream.transport.sendto(wire)
+            response = await future
+        finally:
+            timer.cancel()
+            del upstream.pending[message_id]
+            if upstream.sent >= settings.dns_udp_socket_max_queries:
+                upstream.close_when_idle()
+
+        if response[2] & _TC:
+            self.tcp_fallbacks += 1
+            response = await asyncio.wait_for(self._exchange_tcp(key, wire, question), timeout)
+        return response
+
+    async def _exchange_tcp(self, key: UpstreamKey, wire: bytes, question: bytes) -> bytes:
+        """One-shot TCP exchange for a query whose UDP response was truncated."""
+        reader, writer = await asyncio.open_connection(*key)
+        try:
+            writer.write(len(wire).to_bytes(2, "big") + wire)
+            await writer.drain()
+            while True:
+                length = int.from_bytes(await reader.readexactly(2), "big")
+                response = await reader.readexactly(length)
+                if response[:2] == wire[:2] and matches(response, question):
+                    return response
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionError("TCP connection closed by server") from e
+        finally:
+            writer.close()
+
+    async def query(
+        self,
+        address: str,
+        query: dns.message.Message,
+        timeout: float,
+        port: int | None = None,
+    ) -> dns.message.Message:
+        """Message-level wrapper around exchange(); ``query.id`` is updated to the ID sent."""
+        response = dns.message.from_wire(
+            await self.exchange(address, query.to_wire(), timeout, port)
+        )
+        query.id = response.id
+        return response
+
+    async def close(self) -> None:
+        """Close every pooled socket and stop the timer wheel."""
+        for pool in self._pools.values():
+            for upstream in pool:
+                if upstream.transport is not None:
+                    upstream.transport.close()
+        self._pools.clear()
+        self._turn.clear()
+        self._locks.clear()
+        self.wheel.close()
+
+    def stats(self) -> dict:
+        return {
+            "upstreams": len(self._pools),
+            "sockets": sum(len(pool) for pool in self._pools.values()),
+            "in_flight": len(self.wheel),
+            "queries": self.queries,
+            "timeouts": self.timeouts,
+            "tcp_fallbacks": self.tcp_fallbacks,
+            "unmatched": self.unmatched,
+        }
+
+
+udp_engine = UDPQueryEngine()
@@ -1,16 +1,23 @@
 """Test configuration and fixtures."""
 
 import asyncio
-from typing import AsyncGenerator, Generator
+from collections.abc import AsyncGenerator, Generator
 
 import pytest
 from httpx import ASGITransport, AsyncClient
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from src.core.database import Base, get_db
+from benchmarks.stub_dns import StubDNSServer
+from src.core.config import settings
+from src.core.database import AsyncSessionLocal, Base, get_db
 from src.main import app
+from src.services.catalog import catalog_store
+from src.services.circuit_breaker import circuit_breakers
+from src.services.dns_cache import answer_cache
+from src.services.dns_service import DNSService
+from src.services.query_logger import QueryLogWriter, query_log_writer
 
 # Test database URL (in-memory SQLite for fast tests)
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -24,6 +31,12 @@ def event_loop() -> Generator:
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+def fresh_catalog() -> None:
+    """Each test gets its own database, so drop any cached catalog snapshot."""
+    catalog_store.clear()
+
+
 @pytest.fixture
 async def db_engine():
     """Create test database engine."""
@@ -45,29 +58,52 @@ async def db_engine():
 
 
 @pytest.fixture
-async def db_session(db_engine) -> AsyncGenerator[AsyncSession, None]:
+async def db_session(db_engine) -> AsyncGenerator[AsyncSession]:
     """Create test database session."""
-    async_session = sessionmaker(
-        db_engine, class_=AsyncSession, expire_on_commit=False
-    )
+    async_session = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
 
     async with async_session() as session:
         yield session
 
 
 @pytest.fixture
-async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
+async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient]:
     """Create test client with overridden dependencies."""
 
-    async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
+    async def override_get_db() -> AsyncGenerator[AsyncSession]:
         yield db_session
 
     app.dependency_overrides[get_db] = override_get_db
 
-    async with AsyncClient(
-        transport=ASGITransport(app=app),
-        base_url="http://test"
-    ) as ac:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+async def stub_dns(monkeypatch: pytest.MonkeyPatch):
+    """Run a stub DNS server and point the resolver port at it."""
+    async with StubDNSServer(slow_latency=0.5) as server:
+        monkeypatch.setattr(settings, "dns_port", server.port)
+        monkeypatch.setattr(settings, "dns_timeout", 1.0)
+        monkeypatch.setattr(settings, "dns_retries", 0)
+        DNSService._resolvers.clear()
+        answer_cache.clear()
+        circuit_breakers.clear()
+        yield server
+    DNSService._resolvers.clear()
+    answer_cache.clear()
+    circuit_breakers.clear()
+
+
+@pytest.fixture
+async def log_writer(db_engine) -> AsyncGenerator[QueryLogWriter]:
+    """Run the query log writer against the test database."""
+    query_log_writer.session_factory = async_sessionmaker(
+        db_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    query_log_writer.start()
+    yield query_log_writer
+    await query_log_writer.stop()
+    query_log_writer.session_factory = AsyncSessionLocal
@@ -1,10 +1,16 @@
 """API endpoint tests."""
 
+import json
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.models.dns import DNSServer, ISP
+from src.core.config import settings
+from src.models.dns import ISP, ASNMapping, DNSServer, QueryLog
+from src.services import asn_index
+from src.services.asn_index import PrefixIndex
 
 
 @pytest.mark.asyncio
@@ -95,11 +101,201 @@ async def test_resolve_domain(client: AsyncClient):
 @pytest.mark.asyncio
 async def test_get_command_examples(client: AsyncClient):
     """Test command examples endpoint."""
-    response = await client.get(
-        "/api/resolve/examples?domain=google.com&dns_server=8.8.8.8"
-    )
+    response = await client.get("/api/resolve/examples?domain=google.com&dns_server=8.8.8.8")
     assert response.status_code == 200
     data = response.json()
     assert len(data) > 0
     assert any(ex["platform"] == "windows" for ex in data)
     assert any(ex["platform"] == "linux" for ex in data)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_resolve_batch_streams_ndjson(
+    client: AsyncClient, db_session: AsyncSession, log_writer
+):
+    """Test batch resolution streams one NDJSON line per query and logs once."""
+    batches = log_writer.batches
+    response = await client.post(
+        "/api/resolve/batch",
+        json={
+            "domains": ["a.example.test", "nx.example.test"],
+            "dns_servers": ["127.0.0.1"],
+            "record_types": ["A", "AAAA"],
+            "concurrency": 2,
+        },
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 4
+    assert {(line["domain"], line["record_type"]) for line in lines} == {
+        ("a.example.test", "A"),
+        ("a.example.test", "AAAA"),
+        ("nx.example.test", "A"),
+        ("nx.example.test", "AAAA"),
+    }
+    assert sum(line["success"] for line in lines) == 2
+
+    await log_writer.flush()
+    assert log_writer.batches - batches == 1
+    logged = await db_session.scalar(select(func.count()).select_from(QueryLog))
+    assert logged == 4
+
+
+@pytest.mark.asyncio
+async def test_resolve_batch_too_large(client: AsyncClient):
+    """Test that oversized batches are rejected."""
+    response = await client.post(
+        "/api/resolve/batch",
+        json={"domains": [f"d{i}.test" for i in range(1001)]},
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_resolve_rejects_hostname_dns_server(client: AsyncClient):
+    """Test that DNS servers must be IP addresses, never resolved hostnames."""
+    for dns_server in ("localhost", "not an ip"):
+        response = await client.post(
+            "/api/resolve", json={"domain": "a.example.test", "dns_server": dns_server}
+        )
+        assert response.status_code == 400
+        assert "IP address" in response.json()["detail"]
+
+    response = await client.post(
+        "/api/resolve/batch",
+        json={"domains": ["a.example.test"], "dns_servers": ["127.0.0.1", "localhost"]},
+    )
+    assert response.status_code == 400
+
+
+async def _add_isp(db_session: AsyncSession, name: str, ips: list[str]) -> ISP:
+    isp = ISP(name=name, country="KR", isp_type="landline")
+    db_session.add(isp)
+    await db_session.flush()
+    for priority, ip in enumerate(ips, start=1):
+        db_session.add(DNSServer(isp_id=isp.id, ip_address=ip, priority=priority))
+    await db_session.commit()
+    return isp
+
+
+@pytest.mark.asyncio
+async def test_compare_resolvers(client: AsyncClient, db_session: AsyncSession, stub_dns):
+    """Test cross-ISP comparison groups answers by ISP."""
+    await _add_isp(db_session, "ISP A", ["127.0.0.1"])
+    await _add_isp(db_session, "ISP B", ["127.0.0.1"])
+
+    response = await client.post(
+        "/api/resolve/compare",
+        json={"domain": "compare.example.test", "record_types": ["A", "AAAA"]},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [isp["isp_name"] for isp in data["isps"]] == ["ISP A", "ISP B"]
+
+    cell = data["isps"][0]["servers"][0]["results"]["A"]
+    assert cell["answers"] == ["127.0.0.1"]
+    assert cell["matches_majority"] is True
+    assert data["answer_sets"]["A"][0]["is_majority"] is True
+    assert data["isps"][1]["diverging_record_types"] == []
+    # Shared resolver IPs are queried once per record type
+    assert stub_dns.queries == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_compare_resolvers_deadline(client: AsyncClient, db_session: AsyncSession):
+    """Test that the comparison returns at the deadline instead of waiting."""
+    await _add_isp(db_session, "ISP A", ["127.0.0.1"])
+
+    response = await client.post(
+        "/api/resolve/compare",
+        json={"domain": "slow.example.test", "deadline_ms": 100, "no_cache": True},
+    )
+    data = response.json()
+    cell = data["isps"][0]["servers"][0]["results"]["A"]
+    assert cell["success"] is False
+    assert "Deadline exceeded" in cell["error_message"]
+    assert data["elapsed_ms"] < 400
+
+
+@pytest.mark.asyncio
+async def test_detect_isp_with_local_index(
+    client: AsyncClient, db_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+):
+    """Test ISP detection from the local ASN index without the HTTP fallback."""
+    monkeypatch.setattr(settings, "asn_http_fallback", False)
+    monkeypatch.setattr(
+        asn_index, "_asn_index", PrefixIndex.build([("168.126.0.0/16", 4766, "KIXS-AS-KR")])
+    )
+    isp = await _add_isp(db_session, "KT", ["168.126.63.1"])
+    db_session.add(ASNMapping(isp_id=isp.id, asn=4766, as_name="KT Corporation"))
+    await db_session.commit()
+
+    response = await client.post("/api/detect-isp", json={"ip_address": "168.126.63.1"})
+    data = response.json()
+    assert data["detected"] is True
+    assert data["asn"] == 4766
+    assert data["isp"]["name"] == "KT"
+
+    response = await client.post("/api/detect-isp", json={"ip_address": "8.8.8.8"})
+    assert response.json()["detected"] is False
+
+
+@pytest.mark.asyncio
+async def test_detect_isp_batch(
+    client: AsyncClient, db_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+):
+    """Test bulk ISP detection in records and columnar form."""
+    monkeypatch.setattr(
+        asn_index,
+        "_asn_index",
+        PrefixIndex.build([("168.126.0.0/16", 4766, "KIXS-AS-KR"), ("2001:db8::/32", 64500, None)]),
+    )
+    isp = await _add_isp(db_session, "KT", ["168.126.63.1"])
+    db_session.add(ASNMapping(isp_id=isp.id, asn=4766, as_name="KT Corporation"))
+    await db_session.commit()
+
+    addresses = [
+        "8.8.8.8",
+        "2001:db8::1",
+        "168.126.63.1",
+        "168.126.0.0/24",
+        "bogus",
+        "168.126.63.1",
+    ]
+    response = await client.post("/api/detect-isp/batch", json={"ip_addresses": addresses})
+    data = response.json()
+    assert data["count"] == 4
+    assert data["detected"] == 2
+    assert data["invalid"] == ["bogus"]
+    assert [result["ip_address"] for result in data["results"]] == [
+        "8.8.8.8",
+        "168.126.0.0/24",
+        "168.126.63.1",
+        "2001:db8::1",
+    ]
+    assert data["results"][2]["isp"]["name"] == "KT"
+    assert data["results"][3]["asn"] == 64500
+    assert data["results"][3]["detected"] is False
+
+    response = await client.post(
+        "/api/detect-isp/batch", json={"ip_addresses": addresses, "format": "columnar"}
+    )
+    data = response.json()
+    assert data["results"] is None
+    assert data["columns"]["asn"] == [None, 4766, 4766, 64500]
+    assert data["columns"]["isp_id"] == [None, isp.id, isp.id, None]
+    assert [item["name"] for item in data["isps"]] == ["KT"]
+
+
+@pytest.mark.asyncio
+async def test_cache_stats(client: AsyncClient):
+    """Test cache stats endpoint."""
+    response = await client.get("/api/cache/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert "hits" in data["resolve"]
+    assert "hits" in data["asn"]
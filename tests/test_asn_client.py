@@ -0,0 +1,69 @@
+"""Remote ASN lookup client tests."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from src.services.asn_client import ASNLookupClient
+
+
+def _bgpview(prefix: str, asn: int, name: str) -> dict:
+    return {"data": {"prefixes": [{"prefix": prefix, "asn": {"asn": asn, "name": name}}]}}
+
+
+@pytest.fixture
+def requests() -> list[str]:
+    return []
+
+
+@pytest.fixture
+async def asn_lookup(requests: list[str]):
+    """ASN client backed by a mock BGPView transport."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        ip = request.url.path.rsplit("/", 1)[-1]
+        requests.append(ip)
+        await asyncio.sleep(0.01)
+        if ip.startswith("211.36."):
+            return httpx.Response(200, json=_bgpview("211.36.0.0/16", 9318, "SKB-AS"))
+        if ip.startswith("10."):
+            return httpx.Response(200, json={"data": {"prefixes": []}})
+        return httpx.Response(503)
+
+    client = ASNLookupClient(transport=httpx.MockTransport(handler))
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_results_cached_per_prefix(asn_lookup: ASNLookupClient, requests: list[str]):
+    """Test that one lookup answers every address in the covering prefix."""
+    first = await asn_lookup.lookup("211.36.1.1")
+    second = await asn_lookup.lookup("211.36.200.7")
+    assert first == {"asn": 9318, "as_name": "SKB-AS", "prefix": "211.36.0.0/16"}
+    assert second == first
+    assert requests == ["211.36.1.1"]
+    assert asn_lookup.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_are_negatively_cached(asn_lookup: ASNLookupClient, requests: list[str]):
+    """Test that upstream errors and empty results are cached briefly."""
+    assert await asn_lookup.lookup("8.8.8.8") is None
+    assert await asn_lookup.lookup("8.8.8.8") is None
+    assert await asn_lookup.lookup("10.0.0.1") is None
+    assert await asn_lookup.lookup("10.0.0.1") is None
+    assert requests == ["8.8.8.8", "10.0.0.1"]
+    stats = asn_lookup.stats()
+    assert stats["negative_hits"] == 2
+    assert stats["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_coalesced(asn_lookup: ASNLookupClient, requests: list[str]):
+    """Test that concurrent lookups for the same IP send one request."""
+    results = await asyncio.gather(*(asn_lookup.lookup("211.36.1.1") for _ in range(5)))
+    assert all(result["asn"] == 9318 for result in results)
+    assert requests == ["211.36.1.1"]
+    assert asn_lookup.stats()["coalesced"] == 4
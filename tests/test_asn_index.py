@@ -0,0 +1,136 @@
+"""Local IP to ASN index tests."""
+
+import gzip
+import random
+from pathlib import Path
+
+import pytest
+
+from src.services import asn_index
+from src.services.asn_index import PrefixIndex, read_csv, read_pfx2as
+
+
+def _index() -> PrefixIndex:
+    return PrefixIndex.build(
+        [
+            ("211.0.0.0/8", 4766, "KT"),
+            ("211.36.0.0/16", 9318, "SK Broadband"),
+            ("211.36.128.0/24", 17858, "LG U+"),
+            ("1.1.1.0/24", 13335, "Cloudflare"),
+            ("2001:db8::/32", 64500, "Example v6"),
+            ("2001:db8:1::/48", 64501, None),
+        ]
+    )
+
+
+def test_longest_prefix_match():
+    """Test that the most specific covering prefix wins."""
+    index = _index()
+    assert index.lookup("211.1.2.3")["asn"] == 4766
+    assert index.lookup("211.36.1.1")["asn"] == 9318
+    assert index.lookup("211.36.128.7") == {
+        "asn": 17858,
+        "as_name": "LG U+",
+        "prefix": "211.36.128.0/24",
+    }
+    # Back in the enclosing prefixes after the more specific one ends
+    assert index.lookup("211.36.129.0")["asn"] == 9318
+    assert index.lookup("211.37.0.0")["asn"] == 4766
+    assert index.lookup("211.255.255.255")["prefix"] == "211.0.0.0/8"
+
+
+def test_ipv6_lookup():
+    """Test IPv6 longest-prefix matching."""
+    index = _index()
+    assert index.lookup("2001:db8::1")["asn"] == 64500
+    assert index.lookup("2001:db8:1::1") == {
+        "asn": 64501,
+        "as_name": None,
+        "prefix": "2001:db8:1::/48",
+    }
+    assert index.lookup("2001:db9::1") is None
+
+
+def test_misses_and_invalid_input():
+    """Test uncovered and invalid addresses."""
+    index = _index()
+    assert index.lookup("8.8.8.8") is None
+    assert index.lookup("not-an-ip") is None
+    assert len(index) == 6
+
+
+def test_adjacent_ranges_are_merged():
+    """Test that contiguous ranges of the same prefix collapse."""
+    index = PrefixIndex.build([("10.0.0.0/8", 1, None), ("10.1.0.0/16", 2, None)])
+    assert index.range_count == 3
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_lookup_many_matches_lookup(vectorized: bool, monkeypatch: pytest.MonkeyPatch):
+    """Test that bulk lookups (NumPy or not) agree with single lookups."""
+    if not vectorized:
+        monkeypatch.setattr(asn_index, "np", None)
+    elif asn_index.np is None:
+        pytest.skip("numpy is not installed")
+
+    index = _index()
+    rng = random.Random(3)
+    addresses = [f"211.36.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(500)]
+    addresses += ["1.1.1.1", "0.0.0.0", "255.255.255.255", "2001:db8:1::5", "::1", "nope"]
+
+    results = index.lookup_many(addresses + addresses[:50])
+    assert results == {address: index.lookup(address) for address in addresses if address != "nope"}
+    assert list(results)[:2] == ["0.0.0.0", "1.1.1.1"]
+    assert index.lookup_many(["211.36.128.0/24"])["211.36.128.0/24"]["asn"] == 17858
+
+
+def test_save_and_open_mmap(tmp_path: Path):
+    """Test that a saved index maps back with identical lookups."""
+    index = _index()
+    path = tmp_path / "asn.idx"
+    index.save(path)
+    mapped = PrefixIndex.from_file(path)
+
+    addresses = ["211.1.2.3", "211.36.128.7", "211.36.129.0", "1.1.1.1", "8.8.8.8"]
+    addresses += ["2001:db8::1", "2001:db8:1::5", "2001:db9::1", "::1"]
+    assert [mapped.lookup(address) for address in addresses] == [
+        index.lookup(address) for address in addresses
+    ]
+    assert mapped.lookup_many(addresses) == index.lookup_many(addresses)
+    assert len(mapped) == len(index) and mapped.range_count == index.range_count
+
+    (tmp_path / "bad.idx").write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        PrefixIndex.open_mmap(tmp_path / "bad.idx")
+
+
+def test_read_pfx2as_handles_moas():
+    """Test pfx2as parsing with multi-origin ASNs and AS sets."""
+    lines = [
+        "1.0.0.0\t24\t13335\n",
+        "1.0.4.0\t22\t38803_56203\n",
+        "1.0.8.0\t21\t4134,4812\n",
+        "bad\n",
+    ]
+    assert list(read_pfx2as(lines)) == [
+        ("1.0.0.0/24", 13335, None),
+        ("1.0.4.0/22", 38803, None),
+        ("1.0.8.0/21", 4134, None),
+    ]
+
+
+def test_read_csv_skips_header():
+    """Test CSV parsing with a header and AS-prefixed numbers."""
+    lines = ["prefix,asn,as_name\n", "1.1.1.0/24,AS13335,Cloudflare\n", "8.8.8.0/24,15169\n"]
+    assert list(read_csv(lines)) == [
+        ("1.1.1.0/24", 13335, "Cloudflare"),
+        ("8.8.8.0/24", 15169, None),
+    ]
+
+
+def test_from_file_gzipped_pfx2as(tmp_path: Path):
+    """Test loading a gzipped pfx2as file."""
+    path = tmp_path / "routeviews-rv2.pfx2as.gz"
+    with gzip.open(path, "wt") as f:
+        f.write("168.126.0.0\t16\t4766\n")
+    assert PrefixIndex.from_file(path).lookup("168.126.63.1")["asn"] == 4766
@@ -0,0 +1,127 @@
+"""Resolver benchmarking CLI tests."""
+
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.stub_dns import StubDNSServer
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPT = ROOT / "scripts" / "benchmark_resolvers.py"
+
+
+def _load_script():
+    spec = importlib.util.spec_from_file_location("benchmark_resolvers", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _server(server_id: int, ip_address: str) -> dict:
+    return {
+        "id": server_id,
+        "isp_id": 1,
+        "ip_address": ip_address,
+        "priority": server_id,
+        "created_at": "2025-01-01T00:00:00",
+        "updated_at": "2025-01-01T00:00:00",
+    }
+
+
+def test_find_disagreements():
+    """Test that negative or disjoint answers disagree and overlapping ones do not."""
+    bench = _load_script()
+    outcome = bench.Outcome
+    results = {
+        "10.0.0.1": [
+            outcome("answers", 5, ("1.1.1.1", "1.1.1.2")),
+            outcome("negative", 5),
+            outcome("answers", 5, ("1.1.1.1",)),
+        ],
+        "10.0.0.2": [
+            outcome("answers", 5, ("1.1.1.2", "1.1.1.3")),
+            outcome("negative", 5),
+            outcome("negative", 5),
+        ],
+        "10.0.0.3": [
+            outcome("answers", 5, ("9.9.9.9",)),
+            outcome("answers", 5, ("6.6.6.6",)),
+            outcome("failed", 200),
+        ],
+        "10.0.0.4": [outcome("failed", 200), outcome("failed", 200), outcome("failed", 200)],
+    }
+
+    domains = ["cdn.example", "nx.example", "split.example"]
+    disagreements = bench.find_disagreements(domains, results)
+    assert [item["domain"] for item in disagreements] == domains
+    assert disagreements[0]["majority"] == ["1.1.1.1", "1.1.1.2", "1.1.1.3"]
+    assert [server["dns_server"] for server in disagreements[0]["dissenting"]] == ["10.0.0.3"]
+    # Answering a name the majority says does not exist (NXDOMAIN hijacking)
+    assert disagreements[1]["majority"] is None
+    assert disagreements[1]["dissenting"] == [
+        {"dns_server": "10.0.0.3", "answers": ["6.6.6.6"], "error_message": None}
+    ]
+    # One server answers, one says the name does not exist: neither side is the majority
+    assert disagreements[2]["majority_servers"] == 0
+    assert [server["dns_server"] for server in disagreements[2]["dissenting"]] == [
+        "10.0.0.1",
+        "10.0.0.2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_benchmark_from_catalog_export(tmp_path: Path):
+    """Test a cold and warm run against a healthy and a dark server."""
+    catalog = [
+        {
+            "id": 1,
+            "name": "테스트",
+            "name_en": "Test ISP",
+            "created_at": "2025-01-01T00:00:00",
+            "updated_at": "2025-01-01T00:00:00",
+            "dns_servers": [_server(1, "127.0.0.1"), _server(2, "127.0.0.2")],
+        }
+    ]
+    catalog_path = tmp_path / "catalog.json"
+    catalog_path.write_text(json.dumps(catalog), encoding="utf-8")
+    domains_path = tmp_path / "domains.txt"
+    domains_path.write_text("# top sites\n1,a.example.test\nnx.example.test\nA.example.test.\n")
+    out_path = tmp_path / "run.json"
+
+    async with (
+        StubDNSServer() as healthy,
+        StubDNSServer(host="127.0.0.2", port=healthy.port, loss=1.0) as dark,
+    ):
+        env = {**os.environ, "DNS_PORT": str(healthy.port), "DNS_TIMEOUT": "0.2"}
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            str(SCRIPT),
+            str(domains_path),
+            "--catalog",
+            str(catalog_path),
+            "--qps",
+            "0",
+            "--out",
+            str(out_path),
+            env={**env, "DNS_RETRIES": "0"},
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await asyncio.wait_for(process.communicate(), 60)
+        assert process.returncode == 0, stderr.decode()
+
+    report = json.loads(out_path.read_text(encoding="utf-8"))
+    assert report["config"]["domains"] == 2
+    fast, slow = report["servers"]
+    assert fast["dns_server"] == "127.0.0.1" and fast["isps"] == ["테스트"]
+    for name in ("cold", "warm"):
+        assert fast[name]["answered"] == 2 and fast[name]["failure_rate"] == 0
+        assert slow[name]["failed"] == 2 and slow[name]["p50_ms"] is None
+    assert report["disagreements"] == []
+    assert dark.queries == 4 and healthy.queries == 4
+    assert "127.0.0.1" in stdout.decode().splitlines()[1]
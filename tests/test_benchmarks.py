@@ -0,0 +1,32 @@
+"""Microbenchmark suite tests."""
+
+import json
+
+from benchmarks.micro import BASELINE, BENCHMARKS, compare
+
+
+def test_benchmarks_run_and_match_baseline():
+    """Test that every benchmark runs once and has a stored baseline."""
+    for setup in BENCHMARKS.values():
+        setup()()
+    baseline = json.loads(BASELINE.read_text(encoding="utf-8"))["results"]
+    assert set(baseline) == set(BENCHMARKS)
+
+
+def test_compare_flags_regressions():
+    """Test the regression threshold and added/removed benchmarks."""
+    baseline = {"a": {"ns_per_op": 100.0}, "b": {"ns_per_op": 100.0}, "gone": {"ns_per_op": 1.0}}
+    current = {"a": {"ns_per_op": 115.0}, "b": {"ns_per_op": 50.0}, "new": {"ns_per_op": 1.0}}
+
+    rows, regressed = compare(current, baseline, threshold=0.2)
+    assert not regressed
+    assert {row["name"]: row["status"] for row in rows} == {
+        "a": "ok",
+        "b": "improved",
+        "gone": "missing",
+        "new": "new",
+    }
+
+    current["a"]["ns_per_op"] = 130.0
+    rows, regressed = compare(current, baseline, threshold=0.2)
+    assert regressed and rows[0]["status"] == "regressed" and rows[0]["change"] == 0.3
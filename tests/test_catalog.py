@@ -0,0 +1,116 @@
+"""Catalog snapshot tests."""
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.dns import ISP, ASNMapping, DNSServer
+from src.services.catalog import catalog_store, read_catalog_version
+
+
+async def _seed(db_session: AsyncSession) -> tuple[ISP, ISP]:
+    first = ISP(name="SK브로드밴드", country="KR", isp_type="both")
+    second = ISP(name="SK텔레콤", country="KR", isp_type="mobile")
+    db_session.add_all([first, second])
+    await db_session.flush()
+    db_session.add_all(
+        [
+            DNSServer(isp_id=first.id, ip_address="210.220.163.82", priority=2),
+            DNSServer(isp_id=first.id, ip_address="219.250.36.130", priority=1),
+            DNSServer(isp_id=second.id, ip_address="210.220.163.82", priority=1, is_active=False),
+            ASNMapping(isp_id=second.id, asn=9318),
+            ASNMapping(isp_id=first.id, asn=9318),
+        ]
+    )
+    await db_session.commit()
+    return first, second
+
+
+@pytest.mark.asyncio
+async def test_snapshot_indexes(db_session: AsyncSession):
+    """Test snapshot lookups by id, ASN and server IP."""
+    first, second = await _seed(db_session)
+    catalog = await catalog_store.get(db_session)
+
+    assert [isp.name for isp in catalog.isps] == ["SK브로드밴드", "SK텔레콤"]
+    assert catalog.isps_by_asn[9318].id == first.id
+    assert len(catalog.servers_by_ip["210.220.163.82"]) == 2
+    assert [s.ip_address for s in catalog.active_servers_by_isp[first.id]] == [
+        "219.250.36.130",
+        "210.220.163.82",
+    ]
+    assert second.id not in catalog.active_servers_by_isp
+    with pytest.raises(AttributeError):
+        catalog.isps[0].name = "changed"  # type: ignore[misc]
+
+
+@pytest.mark.asyncio
+async def test_orm_writes_bump_version_and_invalidate(db_session: AsyncSession):
+    """Test that ORM catalog writes bump the version row and reload the snapshot."""
+    await _seed(db_session)
+    catalog = await catalog_store.get(db_session)
+    assert catalog.version == await read_catalog_version(db_session) > 0
+
+    db_session.add(ISP(name="LG U+", country="KR", isp_type="both"))
+    await db_session.commit()
+
+    reloaded = await catalog_store.get(db_session)
+    assert reloaded is not catalog
+    assert reloaded.version > catalog.version
+    assert len(reloaded.isps) == 3
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_snapshot(client: AsyncClient, db_session: AsyncSession):
+    """Test that read endpoints do not see changes that bypass the version counter."""
+    first, _ = await _seed(db_session)
+    assert (await client.get(f"/api/isps/{first.id}")).json()["name"] == "SK브로드밴드"
+
+    # A bulk UPDATE does not go through the ORM unit of work, so no invalidation
+    await db_session.execute(update(ISP).where(ISP.id == first.id).values(name="renamed"))
+    await db_session.commit()
+    assert (await client.get(f"/api/isps/{first.id}")).json()["name"] == "SK브로드밴드"
+
+    catalog_store.invalidate()
+    assert (await client.get(f"/api/isps/{first.id}")).json()["name"] == "renamed"
+
+    response = await client.get("/api/dns")
+    assert [server["priority"] for server in response.json()] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_catalog_responses_are_prerendered(client: AsyncClient, db_session: AsyncSession):
+    """Test compression, ETag revalidation and re-rendering after a catalog write."""
+    first, _ = await _seed(db_session)
+
+    response = await client.get("/api/isps", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"].startswith("public, max-age=")
+    assert "Accept-Encoding" in response.headers["vary"]
+    etag = response.headers["etag"]
+    assert etag.endswith('-gz"')
+    assert [isp["name"] for isp in response.json()] == ["SK브로드밴드", "SK텔레콤"]
+
+    identity = await client.get("/api/isps", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.json() == response.json()
+
+    # A tag for any encoding revalidates the same content
+    for tag in (etag, identity.headers["etag"], f"W/{etag}"):
+        not_modified = await client.get("/api/isps", headers={"If-None-Match": tag})
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+
+    isp = await client.get(f"/api/isps/{first.id}")
+    assert isp.json()["dns_servers"][0]["ip_address"] == "210.220.163.82"
+    assert (await client.get("/api/isps/999999")).status_code == 404
+    assert (await client.get("/api/dns", params={"isp_id": 999999})).json() == []
+
+    db_session.add(ISP(name="LG U+", country="KR", isp_type="both"))
+    await db_session.commit()
+    changed = await client.get("/api/isps", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert len(changed.json()) == 3
@@ -0,0 +1,165 @@
+"""Circuit breaker and in-flight limit tests."""
+
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from benchmarks.stub_dns import StubDNSServer
+from src.core.config import settings
+from src.services.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakers,
+    UpstreamUnavailable,
+)
+
+
+async def _query(breaker: CircuitBreaker, rcode: str) -> None:
+    trial = await breaker.acquire()
+    breaker.release(trial, rcode)
+
+
+@pytest.mark.asyncio
+async def test_opens_fails_fast_and_recovers(monkeypatch: pytest.MonkeyPatch):
+    """Test closed -> open -> half-open -> closed/open transitions."""
+    monkeypatch.setattr(settings, "circuit_min_queries", 4)
+    monkeypatch.setattr(settings, "circuit_failure_rate", 0.5)
+    monkeypatch.setattr(settings, "circuit_open_seconds", 0.05)
+    breaker = CircuitBreaker("10.0.0.1")
+
+    for rcode in ("NOERROR", "NXDOMAIN", "TIMEOUT"):
+        await _query(breaker, rcode)
+    assert breaker.state == CLOSED
+    await _query(breaker, "SERVFAIL")
+    assert breaker.state == OPEN
+
+    with pytest.raises(UpstreamUnavailable) as excinfo:
+        await breaker.acquire()
+    assert 0 < excinfo.value.retry_after <= 0.05
+
+    # After the open period one trial passes; a failed trial opens the circuit again
+    await asyncio.sleep(0.06)
+    trial = await breaker.acquire()
+    assert trial is True and breaker.state == HALF_OPEN
+    with pytest.raises(UpstreamUnavailable):
+        await breaker.acquire()
+    breaker.release(trial, "TIMEOUT")
+    assert breaker.state == OPEN
+
+    await asyncio.sleep(0.06)
+    await _query(breaker, "NOERROR")
+    assert breaker.state == CLOSED
+    stats = breaker.stats()
+    assert stats["opens"] == 2
+    assert stats["rejected"] == 2
+    assert stats["queries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_probes_bypass_open_circuit(monkeypatch: pytest.MonkeyPatch):
+    """Test that health probes are sent while the circuit is open and leave it alone."""
+    monkeypatch.setattr(settings, "circuit_min_queries", 1)
+    breaker = CircuitBreaker("10.0.0.1")
+    await _query(breaker, "TIMEOUT")
+    assert breaker.state == OPEN
+
+    trial = await breaker.acquire(probe=True)
+    assert trial is False and breaker.inflight == 1
+    breaker.release(trial, "NOERROR")
+    assert breaker.state == OPEN
+    assert breaker.stats()["rejected"] == 0
+
+
+@pytest.mark.asyncio
+async def test_eviction_keeps_open_and_busy_breakers(monkeypatch: pytest.MonkeyPatch):
+    """Test that only idle closed breakers are dropped over the bound."""
+    monkeypatch.setattr(settings, "circuit_max_upstreams", 2)
+    monkeypatch.setattr(settings, "circuit_min_queries", 1)
+    breakers = CircuitBreakers()
+    await _query(breakers.get("10.0.0.1"), "TIMEOUT")  # open
+    await breakers.get("10.0.0.2").acquire()  # busy
+    breakers.get("10.0.0.3")
+    breakers.get("10.0.0.4")
+
+    kept = [breaker.dns_server for breaker in breakers.all()]
+    assert kept == ["10.0.0.1", "10.0.0.2", "10.0.0.4"]
+    assert breakers.is_open("10.0.0.1")
+    assert breakers.get("10.0.0.2").inflight == 1
+
+
+@pytest.mark.asyncio
+async def test_eviction_keeps_counters(monkeypatch: pytest.MonkeyPatch):
+    """Test that a dropped breaker's lifetime counters stay exported and carry over."""
+    monkeypatch.setattr(settings, "circuit_max_upstreams", 1)
+    monkeypatch.setattr(settings, "circuit_min_queries", 1)
+    monkeypatch.setattr(settings, "circuit_open_seconds", 0.01)
+    breakers = CircuitBreakers()
+    breaker = breakers.get("10.0.0.1")
+    await _query(breaker, "TIMEOUT")
+    with pytest.raises(UpstreamUnavailable):
+        await breaker.acquire()
+    await asyncio.sleep(0.02)
+    await _query(breaker, "NOERROR")  # closed again, now evictable
+
+    breakers.get("10.0.0.2")
+    assert [breaker.dns_server for breaker in breakers.all()] == ["10.0.0.2"]
+    assert breakers.counters() == [("10.0.0.1", 1, 1, 0), ("10.0.0.2", 0, 0, 0)]
+
+    breaker = breakers.get("10.0.0.1")
+    assert (breaker.opens, breaker.rejected) == (1, 1)
+    assert breakers.counters() == [("10.0.0.1", 1, 1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_inflight_limit(monkeypatch: pytest.MonkeyPatch):
+    """Test that queries beyond the in-flight cap wait for a slot, then fail."""
+    monkeypatch.setattr(settings, "upstream_max_inflight", 1)
+    monkeypatch.setattr(settings, "upstream_queue_timeout", 0.05)
+    breaker = CircuitBreaker("10.0.0.1")
+
+    first = await breaker.acquire()
+    waiting = asyncio.create_task(breaker.acquire())
+    await asyncio.sleep(0.01)
+    breaker.release(first, "NOERROR")
+    breaker.release(await waiting, "NOERROR")
+
+    await breaker.acquire()
+    with pytest.raises(UpstreamUnavailable):
+        await breaker.acquire()
+    assert breaker.stats()["queue_timeouts"] == 1
+    assert breaker.inflight == 1
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_returns_503(
+    client: AsyncClient, stub_dns: StubDNSServer, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a dark upstream opens its circuit and later requests fail fast."""
+    monkeypatch.setattr(settings, "dns_timeout", 0.1)
+    monkeypatch.setattr(settings, "circuit_min_queries", 2)
+    stub_dns.loss = 1.0
+
+    for _ in range(2):
+        response = await client.post(
+            "/api/resolve", json={"domain": "dark.example.test", "dns_server": "127.0.0.1"}
+        )
+        assert response.json()["success"] is False
+
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/resolve", json={"domain": "dark.example.test", "dns_server": "127.0.0.1"}
+    )
+    assert time.perf_counter() - start < settings.dns_timeout
+    assert response.status_code == 503
+    assert "Circuit open" in response.json()["detail"]
+    assert int(response.headers["retry-after"]) >= 1
+    assert stub_dns.queries == 2
+
+    circuits = (await client.get("/api/circuits")).json()
+    assert circuits[0]["dns_server"] == "127.0.0.1"
+    assert circuits[0]["state"] == "open"
+    assert circuits[0]["rejected"] == 1
@@ -0,0 +1,35 @@
+"""Cross-ISP comparison tests."""
+
+from src.services.compare_service import CompareService
+
+
+def _result(dns_server: str, answers: list[str], success: bool = True) -> dict:
+    return {"dns_server": dns_server, "answers": answers, "success": success}
+
+
+def test_group_answer_sets_majority_first():
+    """Test that identical answer sets are grouped with the majority first."""
+    groups = CompareService.group_answer_sets(
+        [
+            _result("1.1.1.1", ["1.2.3.4"]),
+            _result("8.8.8.8", ["5.6.7.8"]),
+            _result("9.9.9.9", ["5.6.7.8"]),
+            _result("168.126.63.1", [], success=False),
+        ]
+    )
+    assert groups[0] == {
+        "answers": ["5.6.7.8"],
+        "dns_servers": ["8.8.8.8", "9.9.9.9"],
+        "is_majority": True,
+    }
+    assert groups[1]["dns_servers"] == ["1.1.1.1"]
+    assert groups[1]["is_majority"] is False
+    assert len(groups) == 2
+
+
+def test_group_answer_sets_ignores_answer_order():
+    """Test that answer order does not split groups."""
+    groups = CompareService.group_answer_sets(
+        [_result("a", ["1.1.1.1", "2.2.2.2"]), _result("b", ["2.2.2.2", "1.1.1.1"])]
+    )
+    assert len(groups) == 1
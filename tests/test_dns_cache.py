@@ -0,0 +1,59 @@
+"""DNS answer cache tests."""
+
+import time
+
+from src.services.dns_cache import DNSAnswerCache, make_key
+
+
+def _result(domain: str) -> dict:
+    return {
+        "domain": domain,
+        "dns_server": "8.8.8.8",
+        "record_type": "A",
+        "answers": ["127.0.0.1"],
+        "response_time_ms": 10,
+        "success": True,
+        "error_message": None,
+    }
+
+
+def test_make_key_normalizes():
+    """Test that cache keys ignore case and trailing dots."""
+    assert make_key("Example.COM.", "8.8.8.8", "a") == make_key("example.com", "8.8.8.8", "A")
+    assert make_key("example.com", "", "A") == make_key("example.com", None, "A")
+
+
+def test_uncacheable_ttl_is_not_stored():
+    """Test that missing or zero TTLs are not cached."""
+    cache = DNSAnswerCache(max_bytes=1 << 20)
+    assert cache.set(make_key("a.test", None, "A"), _result("a.test"), None) is False
+    assert cache.set(make_key("a.test", None, "A"), _result("a.test"), 0) is False
+    assert len(cache) == 0
+
+
+def test_expired_entry_is_dropped():
+    """Test that entries disappear once their TTL runs out."""
+    cache = DNSAnswerCache(max_bytes=1 << 20)
+    key = make_key("a.test", None, "A")
+    cache.set(key, _result("a.test"), 1)
+    cache._entries[key].expires_at = time.monotonic() - 1
+    assert cache.get(key) is None
+    assert cache.current_bytes == 0
+
+
+def test_lru_eviction_under_memory_budget():
+    """Test that the least recently used entry is evicted first."""
+    key_a, key_b, key_c = (make_key(f"{name}.test", None, "A") for name in "abc")
+    size = DNSAnswerCache._estimate_size(key_a, _result("a.test"))
+    cache = DNSAnswerCache(max_bytes=size * 2)
+
+    cache.set(key_a, _result("a.test"), 60)
+    cache.set(key_b, _result("b.test"), 60)
+    assert cache.get(key_a) is not None  # a is now most recently used
+    cache.set(key_c, _result("c.test"), 60)
+
+    assert cache.get(key_b) is None
+    assert cache.get(key_a) is not None
+    assert cache.get(key_c) is not None
+    assert cache.evictions == 1
+    assert cache.current_bytes <= cache.max_bytes
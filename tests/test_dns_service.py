@@ -0,0 +1,101 @@
+"""DNS service tests against a local stub server."""
+
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.stub_dns import StubDNSServer
+from src.core.config import settings
+from src.services.dns_service import DNSService
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_resolve_against_stub():
+    """Test resolving an A record from the stub server."""
+    result = await DNSService.resolve_domain("example.test", "127.0.0.1", "A")
+    assert result["success"] is True
+    assert result["answers"] == ["127.0.0.1"]
+    assert result["dns_server"] == "127.0.0.1"
+
+
+@pytest.mark.asyncio
+async def test_resolver_is_reused(stub_dns: StubDNSServer):
+    """Test that resolvers are cached per nameserver."""
+    first = DNSService.get_resolver("127.0.0.1")
+    second = DNSService.get_resolver("127.0.0.1")
+    assert first is second
+    assert first.nameservers == ["127.0.0.1"]
+    assert first.port == stub_dns.port
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_slow_upstream_does_not_block():
+    """Test that a slow query does not stall concurrent fast queries."""
+    slow = asyncio.create_task(DNSService.resolve_domain("slow.example.test", "127.0.0.1"))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    fast = await DNSService.resolve_domain("fast.example.test", "127.0.0.1")
+    elapsed = time.perf_counter() - start
+
+    assert fast["success"] is True
+    assert elapsed < 0.3
+    assert not slow.done()
+    assert (await slow)["success"] is True
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_retried(stub_dns: StubDNSServer, monkeypatch: pytest.MonkeyPatch):
+    """Test that timeouts are retried and then reported as failures."""
+    monkeypatch.setattr(settings, "dns_timeout", 0.2)
+    monkeypatch.setattr(settings, "dns_retries", 1)
+    DNSService._resolvers.clear()
+
+    result = await DNSService.resolve_domain("slow.example.test", "127.0.0.1")
+    assert result["success"] is False
+    assert stub_dns.queries >= 2
+
+
+@pytest.mark.asyncio
+async def test_answer_is_cached(stub_dns: StubDNSServer):
+    """Test that repeated lookups are served from the cache until forced fresh."""
+    first = await DNSService.resolve_domain("cached.example.test", "127.0.0.1")
+    second = await DNSService.resolve_domain("cached.example.test", "127.0.0.1")
+    fresh = await DNSService.resolve_domain("cached.example.test", "127.0.0.1", use_cache=False)
+
+    assert first["cached"] is False
+    assert first["ttl_remaining"] == stub_dns.ttl
+    assert second["cached"] is True
+    assert 0 < second["ttl_remaining"] <= stub_dns.ttl
+    assert second["answers"] == first["answers"]
+    assert fresh["cached"] is False
+    assert stub_dns.queries == 2
+
+
+@pytest.mark.asyncio
+async def test_negative_answers_use_soa_minimum(stub_dns: StubDNSServer):
+    """Test NXDOMAIN and NODATA caching with the SOA minimum TTL."""
+    nxdomain = await DNSService.resolve_domain("nx.example.test", "127.0.0.1")
+    nodata = await DNSService.resolve_domain("example.test", "127.0.0.1", "MX")
+    assert nxdomain["success"] is False
+    assert nxdomain["ttl_remaining"] == 60
+    assert nodata["success"] is False
+    assert nodata["ttl_remaining"] == 60
+
+    again = await DNSService.resolve_domain("nx.example.test", "127.0.0.1")
+    assert again["cached"] is True
+    assert stub_dns.queries == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_coalesced(stub_dns: StubDNSServer):
+    """Test that concurrent identical lookups send one upstream query."""
+    results = await asyncio.gather(
+        *(DNSService.resolve_domain("slow.example.test", "127.0.0.1") for _ in range(10))
+    )
+    assert all(result["success"] for result in results)
+    assert sum(not result["cached"] for result in results) == 1
+    assert stub_dns.queries == 1
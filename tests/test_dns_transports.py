@@ -0,0 +1,168 @@
+"""DoH and DoT transport tests."""
+
+import asyncio
+import shutil
+import subprocess
+
+import dns.message
+import httpx
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.stub_dns import StubDoTServer, build_response
+from src.core.config import settings
+from src.models.dns import ISP, DNSServer
+from src.services import dns_service
+from src.services.dns_cache import answer_cache
+from src.services.dns_transports import DoHClient, DoTPool
+
+
+@pytest.fixture
+def tls_cert(tmp_path):
+    """Self-signed certificate for dot.test / 127.0.0.1."""
+    if shutil.which("openssl") is None:
+        pytest.skip("openssl not available")
+    cert, key = tmp_path / "cert.pem", tmp_path / "key.pem"
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "ec",
+            "-pkeyopt",
+            "ec_paramgen_curve:prime256v1",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=dot.test",
+            "-addext",
+            "subjectAltName=DNS:dot.test,IP:127.0.0.1",
+            "-keyout",
+            str(key),
+            "-out",
+            str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return str(cert), str(key)
+
+
+@pytest.fixture
+async def dot_server(tls_cert, monkeypatch: pytest.MonkeyPatch):
+    async with StubDoTServer(*tls_cert, slow_latency=0.3) as server:
+        monkeypatch.setattr(settings, "dot_port", server.port)
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_dot_pipelines_on_one_connection_and_resumes(dot_server, tls_cert):
+    """Test out-of-order pipelining, handshake reporting and TLS session resumption."""
+    pool = DoTPool(cafile=tls_cert[0])
+    try:
+        slow = dns.message.make_query("slow.example.test", "A")
+        fast = [dns.message.make_query(f"q{i}.example.test", "A") for i in range(5)]
+
+        slow_task = asyncio.ensure_future(pool.query("127.0.0.1", "dot.test", slow))
+        await asyncio.sleep(0.05)
+        results = await asyncio.gather(*(pool.query("127.0.0.1", "dot.test", q) for q in fast))
+        assert not slow_task.done()
+        for query, (response, handshake_ms) in zip(fast, results, strict=True):
+            assert query.is_response(response)
+            assert handshake_ms == 0
+
+        response, handshake_ms = await slow_task
+        assert slow.is_response(response) and handshake_ms > 0
+        assert dot_server.connections == 1
+        assert pool.stats()["handshakes"] == 1
+
+        # The server drops the connection; the next query reconnects with the saved session
+        dot_server.drop_connections()
+        await asyncio.sleep(0.05)
+        response, handshake_ms = await pool.query(
+            "127.0.0.1", "dot.test", dns.message.make_query("again.example.test", "A")
+        )
+        assert handshake_ms > 0
+        assert dot_server.connections == 2
+        assert pool.stats()["resumed"] == 1
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("dot_server")
+async def test_resolve_uses_catalog_transport(
+    client: AsyncClient,
+    db_session: AsyncSession,
+    tls_cert,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that transport=auto follows server_type for DoH and DoT servers."""
+    requests = []
+
+    def doh_handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        query = dns.message.from_wire(request.content)
+        return httpx.Response(
+            200,
+            content=build_response(query).to_wire(),
+            headers={"Content-Type": "application/dns-message"},
+        )
+
+    doh_client = DoHClient(transport=httpx.MockTransport(doh_handler))
+    monkeypatch.setattr(dns_service, "doh_client", doh_client)
+    monkeypatch.setattr(dns_service, "dot_pool", DoTPool(cafile=tls_cert[0]))
+    answer_cache.clear()
+
+    isp = ISP(name="Encrypted ISP", country="KR", isp_type="landline")
+    db_session.add(isp)
+    await db_session.flush()
+    db_session.add_all(
+        [
+            DNSServer(
+                isp_id=isp.id,
+                ip_address="10.9.9.9",
+                server_type="doh",
+                doh_url="https://doh.test/dns-query",
+            ),
+            DNSServer(
+                isp_id=isp.id,
+                ip_address="127.0.0.1",
+                server_type="dot",
+                dot_hostname="dot.test",
+            ),
+        ]
+    )
+    await db_session.commit()
+    await client.get("/api/isps")  # load the catalog snapshot
+
+    response = await client.post(
+        "/api/resolve", json={"domain": "doh.example.test", "dns_server": "10.9.9.9"}
+    )
+    data = response.json()
+    assert data["success"] is True
+    assert data["transport"] == "doh"
+    assert data["answers"] == ["127.0.0.1"]
+    assert str(requests[0].url) == "https://doh.test/dns-query"
+    assert requests[0].headers["content-type"] == "application/dns-message"
+
+    response = await client.post(
+        "/api/resolve",
+        json={"domain": "nx.example.test", "dns_server": "127.0.0.1", "no_cache": True},
+    )
+    data = response.json()
+    assert data["transport"] == "dot"
+    assert data["success"] is False
+    assert "does not exist" in data["error_message"]
+    assert data["handshake_time_ms"] is not None
+
+    response = await client.post(
+        "/api/resolve",
+        json={"domain": "x.example.test", "dns_server": "127.0.0.1", "transport": "doh"},
+    )
+    assert response.status_code == 400
+
+    await dns_service.dot_pool.close()
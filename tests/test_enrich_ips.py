@@ -0,0 +1,66 @@
+"""Offline IP enrichment CLI tests."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _enrich(tmp_path: Path, input_path: Path, *args: str) -> subprocess.CompletedProcess:
+    asn_db = tmp_path / "asn.csv"
+    asn_db.write_text("10.0.0.0/8,64500,TEST\n10.1.0.0/16,64501,\n2001:db8::/32,64502,V6\n")
+    return subprocess.run(
+        [sys.executable, str(ROOT / "scripts" / "enrich_ips.py"), str(input_path)]
+        + ["--index", str(asn_db), "--no-isp", "--chunk-lines", "2", *args],
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+    )
+
+
+def test_enrich_csv_in_order_across_workers(tmp_path: Path):
+    """Test that CSV rows are enriched and written in input order by the pool."""
+    rows = ["10.1.2.3", "10.200.0.1", "192.0.2.1", "[2001:db8::5]:443", "bad", "10.1.0.9:8080"]
+    input_path = tmp_path / "access.csv"
+    input_path.write_text("ts,client_ip\n" + "".join(f"{i},{ip}\n" for i, ip in enumerate(rows)))
+    output_path = tmp_path / "out.csv"
+
+    result = _enrich(
+        tmp_path, input_path, "--ip-field", "client_ip", "--workers", "2", "-o", str(output_path)
+    )
+
+    assert output_path.read_text().splitlines() == [
+        "ts,client_ip,asn,as_name,isp_id,isp_name",
+        "0,10.1.2.3,64501,,,",
+        "1,10.200.0.1,64500,TEST,,",
+        "2,192.0.2.1,,,,",
+        "3,[2001:db8::5]:443,64502,V6,,",
+        "4,bad,,,,",
+        "5,10.1.0.9:8080,64501,,,",
+    ]
+    assert "✅ Done: 6 lines" in result.stderr
+
+
+def test_enrich_ndjson_and_text(tmp_path: Path):
+    """Test NDJSON key paths and whitespace-separated log lines."""
+    input_path = tmp_path / "events.ndjson"
+    input_path.write_text('{"req": {"ip": "10.0.0.1"}}\n{"req": {}}\nnot json\n')
+    result = _enrich(tmp_path, input_path, "--ip-field", "req.ip", "--workers", "0")
+    lines = result.stdout.splitlines()
+    assert json.loads(lines[0]) == {
+        "req": {"ip": "10.0.0.1"},
+        "asn": 64500,
+        "as_name": "TEST",
+        "isp_id": None,
+        "isp_name": None,
+    }
+    assert json.loads(lines[1])["asn"] is None
+    assert lines[2] == "not json"
+
+    input_path = tmp_path / "access.log"
+    input_path.write_text('10.1.0.1 - - [01/Jan/2025:00:00:00 +0900] "GET / HTTP/1.1" 200 512\n')
+    result = _enrich(tmp_path, input_path, "--workers", "0")
+    assert result.stdout.endswith("200 512\t64501\t-\t-\t-\n")
@@ -0,0 +1,107 @@
+"""DNS server health prober tests."""
+
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.models.dns import ISP, DNSServer
+from src.services.health_prober import HealthProber, ServerHealth, TokenBucket, health_prober
+from src.services.latency_stats import write_checkpoint
+
+
+@pytest.fixture
+def prober():
+    health_prober.clear()
+    yield health_prober
+    health_prober.clear()
+
+
+def test_health_ewma_and_unhealthy_threshold(monkeypatch: pytest.MonkeyPatch):
+    """Test EWMA latency/loss and that consecutive failures mark a server unhealthy."""
+    monkeypatch.setattr(settings, "health_ewma_alpha", 0.5)
+    monkeypatch.setattr(settings, "health_unhealthy_after", 2)
+    monkeypatch.setattr(settings, "health_max_loss_rate", 1.0)
+    health = ServerHealth("10.0.0.1")
+
+    health.observe(True, 10, None, now=1.0)
+    health.observe(True, 30, None, now=2.0)
+    assert health.ewma_latency_ms == 20
+    assert health.loss_rate == 0.0 and health.healthy
+
+    health.observe(False, 1000, "timeout", now=3.0)
+    assert health.loss_rate == 0.5 and health.healthy
+    health.observe(False, 1000, "timeout", now=4.0)
+    assert not health.healthy
+    assert health.last_healthy_at == 3.0
+    assert health.ewma_latency_ms == 20
+
+    health.observe(True, 20, None, now=5.0)
+    assert health.healthy and health.last_error is None
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_after_burst():
+    """Test that the bucket allows a burst and then paces at its rate."""
+    bucket = TokenBucket(rate=100, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        await bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_probe_and_rank_servers(
+    client: AsyncClient,
+    db_session: AsyncSession,
+    stub_dns,
+    prober,
+    tmp_path,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test probing, snapshots and latency-ranked / healthy-only server listings."""
+    monkeypatch.setattr(settings, "health_probe_domain", "canary.example.test")
+    isp = ISP(name="Probe ISP", country="KR", isp_type="landline")
+    db_session.add(isp)
+    await db_session.flush()
+    db_session.add_all(
+        [
+            DNSServer(isp_id=isp.id, ip_address="10.0.0.1", priority=1),
+            DNSServer(isp_id=isp.id, ip_address="10.0.0.2", priority=2),
+            DNSServer(isp_id=isp.id, ip_address="127.0.0.1", priority=3),
+        ]
+    )
+    await db_session.commit()
+
+    await prober.probe_all(["127.0.0.1"], TokenBucket(rate=100, burst=1))
+    stub_health = prober.get("127.0.0.1")
+    assert stub_health.probes == 1 and stub_health.healthy
+    assert stub_dns.queries == 1
+
+    # 10.0.0.1 is measured dead, 10.0.0.2 is unprobed
+    dead = prober._health["10.0.0.1"] = ServerHealth("10.0.0.1")
+    for now in range(settings.health_unhealthy_after):
+        dead.observe(False, 1000, "timeout", now=float(now))
+
+    response = await client.get("/api/dns", params={"sort": "latency"})
+    assert [s["ip_address"] for s in response.json()] == ["127.0.0.1", "10.0.0.2", "10.0.0.1"]
+
+    response = await client.get("/api/dns", params={"healthy_only": True})
+    assert [s["ip_address"] for s in response.json()] == ["10.0.0.2", "127.0.0.1"]
+
+    response = await client.get("/api/isps", params={"sort": "latency", "healthy_only": True})
+    assert [s["ip_address"] for s in response.json()[0]["dns_servers"]] == ["127.0.0.1", "10.0.0.2"]
+
+    health = (await client.get("/api/dns/health")).json()
+    assert [(h["ip_address"], h["healthy"]) for h in health] == [
+        ("10.0.0.1", False),
+        ("127.0.0.1", True),
+    ]
+
+    path = tmp_path / "health.json"
+    write_checkpoint(str(path), prober.to_dict())
+    restored = HealthProber()
+    assert restored.load(str(path)) == 2
+    assert restored.get("10.0.0.1").consecutive_failures == settings.health_unhealthy_after
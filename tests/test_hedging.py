@@ -0,0 +1,132 @@
+"""Hedged ISP-mode resolution tests."""
+
+import time
+from datetime import UTC, datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.stub_dns import StubDNSServer
+from src.core.config import settings
+from src.models.dns import ISP, DNSServer
+from src.services.catalog import DNSServerEntry, catalog_store
+from src.services.hedging import HedgedResolver
+from src.services.latency_stats import RecentLatency, recent_latency
+
+
+def _server(server_id: int, ip_address: str, priority: int) -> DNSServerEntry:
+    now = datetime(2025, 1, 1, tzinfo=UTC)
+    return DNSServerEntry(
+        id=server_id,
+        isp_id=1,
+        ip_address=ip_address,
+        priority=priority,
+        region=None,
+        server_type="standard",
+        doh_url=None,
+        dot_hostname=None,
+        is_anycast=False,
+        is_active=True,
+        notes=None,
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def test_hedge_delay_follows_recent_p95(monkeypatch: pytest.MonkeyPatch):
+    """Test that the hedge delay is the recent p95, clamped, with a default until warmed up."""
+    latency = RecentLatency(size=100, max_servers=2)
+    monkeypatch.setattr("src.services.hedging.recent_latency", latency)
+    monkeypatch.setattr(settings, "dns_hedge_min_samples", 20)
+
+    assert HedgedResolver.hedge_delay("10.0.0.1") == settings.dns_hedge_default_delay_ms / 1000
+    for ms in range(1, 101):
+        latency.observe("10.0.0.1", float(ms))
+    assert HedgedResolver.hedge_delay("10.0.0.1") == pytest.approx(0.096)
+
+    for _ in range(100):
+        latency.observe("10.0.0.1", 5000.0)
+    assert HedgedResolver.hedge_delay("10.0.0.1") == settings.dns_hedge_max_delay_ms / 1000
+
+    # Least recently used servers are dropped
+    latency.observe("10.0.0.2", 1.0)
+    latency.observe("10.0.0.3", 1.0)
+    assert latency.quantile("10.0.0.1", 0.5) is None
+
+
+@pytest.mark.asyncio
+async def test_hedges_to_secondary_when_primary_drops(
+    stub_dns: StubDNSServer, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that a dropping primary is hedged after the delay instead of timing out."""
+    monkeypatch.setattr(settings, "dns_hedge_default_delay_ms", 50.0)
+    recent_latency.clear()
+    servers = [_server(2, "127.0.0.2", 2), _server(1, "127.0.0.1", 1)]
+
+    # Healthy primary: no hedge, the secondary is never queried
+    async with StubDNSServer(host="127.0.0.2", port=stub_dns.port) as secondary:
+        result = await HedgedResolver.resolve("fast.example.test", servers, use_cache=False)
+        assert result["success"] is True
+        assert result["dns_server"] == "127.0.0.1"
+        assert result["hedged"] is False
+        assert secondary.queries == 0
+
+        stub_dns.loss = 1.0
+        start = time.perf_counter()
+        result = await HedgedResolver.resolve("lossy.example.test", servers, use_cache=False)
+        elapsed = time.perf_counter() - start
+
+    assert result["success"] is True
+    assert result["dns_server"] == "127.0.0.2"
+    assert result["hedged"] is True
+    assert elapsed < settings.dns_timeout / 2
+
+
+@pytest.mark.asyncio
+async def test_negative_answer_is_definitive(
+    stub_dns: StubDNSServer, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that NXDOMAIN ends the resolve even when answers are not cached."""
+    monkeypatch.setattr(settings, "dns_cache_enabled", False)
+    servers = [_server(1, "127.0.0.1", 1), _server(2, "127.0.0.2", 2)]
+
+    async with StubDNSServer(host="127.0.0.2", port=stub_dns.port) as secondary:
+        result = await HedgedResolver.resolve("nx.example.test", servers)
+
+    assert result["success"] is False
+    assert result["negative"] is True
+    assert result["ttl_remaining"] is None
+    assert result["hedged"] is False
+    assert secondary.queries == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_resolve_isp_mode(client: AsyncClient, db_session: AsyncSession):
+    """Test resolving by ISP through the API."""
+    isp = ISP(name="Test ISP", name_en="Test ISP")
+    db_session.add(isp)
+    await db_session.flush()
+    db_session.add(DNSServer(isp_id=isp.id, ip_address="127.0.0.1", priority=1))
+    await db_session.commit()
+    await catalog_store.refresh(db_session)
+
+    response = await client.post(
+        "/api/resolve", json={"domain": "isp.example.test", "isp_id": isp.id}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["isp_id"] == isp.id
+    assert data["dns_server"] == "127.0.0.1"
+    assert data["answers"] == ["127.0.0.1"]
+    assert data["hedged"] is False
+
+    response = await client.post(
+        "/api/resolve",
+        json={"domain": "isp.example.test", "isp_id": isp.id, "dns_server": "127.0.0.1"},
+    )
+    assert response.status_code == 400
+
+    response = await client.post("/api/resolve", json={"domain": "isp.example.test", "isp_id": 999})
+    assert response.status_code == 404
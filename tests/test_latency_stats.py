@@ -0,0 +1,130 @@
+"""Latency statistics tests."""
+
+import json
+import random
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.dns import ISP, DNSServer
+from src.services.latency_stats import (
+    WORKER_COUNT_ENV,
+    WORKER_INDEX_ENV,
+    LatencySketch,
+    LatencyStats,
+    latency_stats,
+    worker_checkpoint_path,
+    worker_count,
+    write_checkpoint,
+)
+
+
+def test_sketch_quantiles_within_accuracy():
+    """Test that merged sketch quantiles stay within the relative error bound."""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(20_000)]
+    left, right = LatencySketch(0.01), LatencySketch(0.01)
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+
+    values.sort()
+    assert left.count == len(values)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(left.quantile(q) - exact) / exact <= 0.011
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_windows_summary_timeseries_and_checkpoint(tmp_path):
+    """Test windowed summaries, pruning and checkpoint round trips."""
+    stats = LatencyStats(window_seconds=60, retention_seconds=600, accuracy=0.01)
+    for i in range(100):
+        stats.record("1.1.1.1", [1], 10.0, True, now=1000.0 + i)
+    stats.record("1.1.1.1", [1], None, False, now=1100.0)
+    stats.record("8.8.8.8", [], 50.0, True, now=1100.0)
+
+    summary = stats.summary("server", 300, now=1150.0)
+    assert summary["1.1.1.1"]["queries"] == 101
+    assert summary["1.1.1.1"]["success_rate"] == pytest.approx(100 / 101)
+    assert summary["1.1.1.1"]["p99_ms"] == pytest.approx(10.0, rel=0.01)
+    assert summary["8.8.8.8"]["p50_ms"] == pytest.approx(50.0, rel=0.01)
+    assert stats.summary("isp", 300, now=1150.0)["1"]["queries"] == 101
+
+    points = stats.timeseries("server", "1.1.1.1", 300, now=1150.0)
+    assert [point["window_start"] for point in points] == [960, 1020, 1080]
+    assert sum(point["queries"] for point in points) == 101
+
+    path = tmp_path / "stats.json"
+    stats.save(str(path))
+    restored = LatencyStats(window_seconds=60, retention_seconds=600, accuracy=0.01)
+    assert restored.load_dict(stats.to_dict(), now=1150.0) == 3
+    assert restored.load(str(tmp_path / "missing.json")) == 0
+    assert restored.summary("server", 300, now=1150.0) == summary
+
+    # A window far in the future prunes everything past retention
+    stats.record("1.1.1.1", [1], 10.0, True, now=5000.0)
+    assert list(stats.summary("server", 600, now=5000.0)) == ["1.1.1.1"]
+    assert stats.summary("server", 600, now=5000.0)["1.1.1.1"]["queries"] == 1
+
+
+def test_checkpoint_path_per_worker(monkeypatch: pytest.MonkeyPatch):
+    """Test that launcher workers checkpoint to separate files."""
+    monkeypatch.delenv(WORKER_INDEX_ENV, raising=False)
+    assert (
+        worker_checkpoint_path("/var/lib/kresolver/stats.json") == "/var/lib/kresolver/stats.json"
+    )
+    monkeypatch.setenv(WORKER_INDEX_ENV, "3")
+    assert worker_checkpoint_path("") == ""
+    assert (
+        worker_checkpoint_path("/var/lib/kresolver/stats.json") == "/var/lib/kresolver/stats.json.3"
+    )
+
+
+def test_shared_checkpoint_write(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """Test that checkpoint writes leave no temporary files and split the worker count."""
+    path = tmp_path / "health.json"
+    write_checkpoint(str(path), {"worker": 0})
+    write_checkpoint(str(path), {"worker": 1})
+    assert json.loads(path.read_text()) == {"worker": 1}
+    assert [p.name for p in tmp_path.iterdir()] == ["health.json"]
+
+    monkeypatch.delenv(WORKER_COUNT_ENV, raising=False)
+    assert worker_count() == 1
+    monkeypatch.setenv(WORKER_COUNT_ENV, "4")
+    assert worker_count() == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_stats_endpoints(client: AsyncClient, db_session: AsyncSession):
+    """Test that upstream queries show up per server and per ISP, cache hits do not."""
+    latency_stats.clear()
+    isp = ISP(name="Stub ISP", country="KR", isp_type="landline")
+    db_session.add(isp)
+    await db_session.flush()
+    db_session.add(DNSServer(isp_id=isp.id, ip_address="127.0.0.1", priority=1))
+    await db_session.commit()
+    await client.get("/api/isps")  # load the catalog snapshot
+
+    for name in ("a.example.test", "b.example.test", "a.example.test", "nx.example.test"):
+        await client.post("/api/resolve", json={"domain": name, "dns_server": "127.0.0.1"})
+
+    servers = (await client.get("/api/stats/servers")).json()
+    assert len(servers) == 1
+    assert servers[0]["dns_server"] == "127.0.0.1"
+    assert servers[0]["isp_ids"] == [isp.id]
+    assert servers[0]["queries"] == 3
+    assert servers[0]["successes"] == 2
+    assert servers[0]["p50_ms"] is not None
+
+    isps = (await client.get("/api/stats/isps", params={"window_s": 60})).json()
+    assert [(s["isp_id"], s["isp_name"], s["queries"]) for s in isps] == [(isp.id, "Stub ISP", 3)]
+
+    series = (await client.get("/api/stats/timeseries", params={"isp_id": isp.id})).json()
+    assert sum(point["queries"] for point in series["points"]) == 3
+
+    response = await client.get("/api/stats/timeseries")
+    assert response.status_code == 400
@@ -0,0 +1,76 @@
+"""Pre-fork launcher tests."""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _children(pid: int) -> list[int]:
+    return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+
+
+def _wait_for(condition, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if condition():
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError("condition not met in time")
+
+
+def test_prefork_workers_share_port_and_restart(tmp_path: Path):
+    """Test preloading, SO_REUSEPORT workers, restart of a dead worker and graceful stop."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    asn_db = tmp_path / "asn.csv"
+    asn_db.write_text("10.0.0.0/8,64500,TEST\n", encoding="utf-8")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{tmp_path}/launcher.db",
+        "ASN_DB_PATH": str(asn_db),
+        "HEALTH_PROBE_ENABLED": "false",
+        "QUERY_LOG_MAINTENANCE_ENABLED": "false",
+    }
+    command = [
+        sys.executable,
+        "-m",
+        "src.launcher",
+        "--workers",
+        "2",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+    ]
+    master = subprocess.Popen(
+        command, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        _wait_for(lambda: httpx.get(url).status_code == 200 and len(_children(master.pid)) == 2)
+
+        os.kill(_children(master.pid)[0], signal.SIGKILL)
+        _wait_for(lambda: len(_children(master.pid)) == 2 and httpx.get(url).status_code == 200)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        output, _ = master.communicate(timeout=30)
+
+    assert master.returncode == 0
+    assert "ASN index preloaded: 1 prefixes" in output
+    assert "✅ ASN index loaded" not in output  # workers inherit the master's index
+    assert "exited (-9), restarting" in output
+    assert output.count("Preloading") == 1
@@ -0,0 +1,102 @@
+"""Query log partition, rollup and retention tests."""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import settings
+from src.models.dns import QueryLog, QueryLogRollup
+from src.services.log_maintenance import (
+    QueryLogMaintenance,
+    expired_partitions,
+    parse_partition_bound,
+    planned_partitions,
+)
+
+
+def test_planned_partitions_roll_over_year():
+    """Test monthly and daily partition planning."""
+    monthly = planned_partitions(datetime(2026, 11, 20, 13, 5), "month", 2)
+    assert [name for name, _, _ in monthly] == [
+        "query_logs_p2026_11",
+        "query_logs_p2026_12",
+        "query_logs_p2027_01",
+    ]
+    assert monthly[-1][1:] == (datetime(2027, 1, 1), datetime(2027, 2, 1))
+
+    daily = planned_partitions(datetime(2026, 2, 28, 23, 59), "day", 1)
+    assert daily == [
+        ("query_logs_p2026_02_28", datetime(2026, 2, 28), datetime(2026, 3, 1)),
+        ("query_logs_p2026_03_01", datetime(2026, 3, 1), datetime(2026, 3, 2)),
+    ]
+
+
+def test_partition_bounds_and_expiry():
+    """Test bound parsing and that only rolled-up partitions past retention expire."""
+    bound = "FOR VALUES FROM ('2026-01-01 00:00:00') TO ('2026-02-01 00:00:00')"
+    assert parse_partition_bound(bound) == (datetime(2026, 1, 1), datetime(2026, 2, 1))
+    assert parse_partition_bound("DEFAULT") is None
+
+    partitions = [
+        ("query_logs_p2026_02", datetime(2026, 2, 1), datetime(2026, 3, 1)),
+        ("query_logs_p2026_01", datetime(2026, 1, 1), datetime(2026, 2, 1)),
+        ("query_logs_p2026_03", datetime(2026, 3, 1), datetime(2026, 4, 1)),
+    ]
+    cutoff = datetime(2026, 3, 15)
+    assert expired_partitions(partitions, cutoff, None) == []
+    assert expired_partitions(partitions, cutoff, datetime(2026, 2, 10)) == ["query_logs_p2026_01"]
+    assert expired_partitions(partitions, cutoff, datetime(2026, 4, 1)) == [
+        "query_logs_p2026_01",
+        "query_logs_p2026_02",
+    ]
+
+
+def _log(created_at: datetime, response_time_ms: int, success: bool = True) -> QueryLog:
+    return QueryLog(
+        domain="example.com",
+        dns_server="8.8.8.8",
+        response_time_ms=response_time_ms,
+        success=success,
+        created_at=created_at,
+    )
+
+
+@pytest.mark.asyncio
+async def test_rollup_is_incremental_and_idempotent(
+    db_engine, db_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+):
+    """Test hourly rollups with latency buckets, delay and reruns."""
+    monkeypatch.setattr(settings, "query_log_rollup_delay", 300)
+    db_session.add_all(
+        [
+            _log(datetime(2026, 10, 16, 9, 1), 3),
+            _log(datetime(2026, 10, 16, 9, 30), 40),
+            _log(datetime(2026, 10, 16, 9, 59), 9000, success=False),
+            _log(datetime(2026, 10, 16, 10, 2), 12),
+            _log(datetime(2026, 10, 16, 11, 1), 12),
+        ]
+    )
+    await db_session.commit()
+
+    maintenance = QueryLogMaintenance(async_sessionmaker(db_engine, expire_on_commit=False))
+    # 11:03 minus the delay is 10:58, so only the 09:00 hour is complete
+    result = await maintenance.run_once(now=datetime(2026, 10, 16, 11, 3))
+    assert result["rolled_up"] == 1
+    assert result["created"] == [] and result["dropped"] == []
+
+    rollups = (await db_session.scalars(select(QueryLogRollup))).all()
+    assert len(rollups) == 1
+    rollup = rollups[0]
+    assert rollup.bucket_start == datetime(2026, 10, 16, 9)
+    assert (rollup.query_count, rollup.success_count, rollup.latency_sum_ms) == (3, 2, 9043)
+    assert rollup.latency_buckets == [1, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1]
+
+    await maintenance.run_once(now=datetime(2026, 10, 16, 11, 6))
+    await maintenance.run_once(now=datetime(2026, 10, 16, 11, 6))
+    db_session.expire_all()
+    rollups = (
+        await db_session.scalars(select(QueryLogRollup).order_by(QueryLogRollup.bucket_start))
+    ).all()
+    assert [(r.bucket_start.hour, r.query_count) for r in rollups] == [(9, 3), (10, 1)]
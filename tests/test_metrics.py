@@ -0,0 +1,70 @@
+"""Prometheus metrics tests."""
+
+import pytest
+from httpx import AsyncClient
+
+from src.core.config import settings
+from src.core.metrics import Counter, Histogram, MetricsRegistry, registry
+
+
+def test_render_text_format(monkeypatch: pytest.MonkeyPatch):
+    """Test counter/histogram exposition and the series cap."""
+    monkeypatch.setattr(settings, "metrics_max_series", 2)
+    local = MetricsRegistry()
+    counter = local.register(Counter("test_requests", "Requests", ("server",)))
+    histogram = local.register(Histogram("test_latency_seconds", "Latency", (), buckets=(0.1, 1.0)))
+
+    counter.inc("a")
+    counter.inc("a")
+    counter.inc("b", amount=3)
+    counter.inc("c")  # past the cap
+    counter.inc("d")
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    text = local.render()
+    assert "# TYPE test_requests counter" in text
+    assert 'test_requests_total{server="a"} 2' in text
+    assert 'test_requests_total{server="b"} 3' in text
+    assert 'test_requests_total{server="other"} 2' in text
+    assert "# TYPE test_latency_seconds histogram" in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_latency_seconds_count 3" in text
+    assert "test_latency_seconds_sum 5.55" in text
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_metrics_endpoint(client: AsyncClient):
+    """Test that routes and upstream queries show up on /metrics."""
+    registry.clear()
+    await client.post("/api/resolve", json={"domain": "ok.example.test", "dns_server": "127.0.0.1"})
+    await client.post("/api/resolve", json={"domain": "nx.example.test", "dns_server": "127.0.0.1"})
+    await client.get("/api/isps/999999")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    assert (
+        'kresolver_http_request_duration_seconds_count{method="POST",route="/api/resolve",status="200"} 2'
+        in text
+    )
+    assert 'route="/api/isps/{isp_id}",status="404"' in text
+    assert (
+        'kresolver_upstream_dns_responses_total{dns_server="127.0.0.1",rcode="NOERROR"} 1' in text
+    )
+    assert (
+        'kresolver_upstream_dns_responses_total{dns_server="127.0.0.1",rcode="NXDOMAIN"} 1' in text
+    )
+    assert (
+        'kresolver_upstream_dns_duration_seconds_count{dns_server="127.0.0.1",transport="udp"} 2'
+        in text
+    )
+    assert "kresolver_asn_cache_hit_ratio" in text
+    assert 'kresolver_query_log_rows_total{outcome="dropped"}' in text
+    assert "# TYPE kresolver_db_pool_connections gauge" in text
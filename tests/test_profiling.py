@@ -0,0 +1,81 @@
+"""Per-request profiling tests."""
+
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from src.core.config import settings
+from src.core.profiling import ProfileStore, StackSampler, stack_sampler
+
+
+@pytest.fixture
+def profiling(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "profiling_enabled", True)
+    monkeypatch.setattr(settings, "profiling_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "profiling_slow_threshold_ms", 0)
+    stack_sampler.start()
+    yield tmp_path
+    stack_sampler.stop()
+    stack_sampler.samples.clear()
+
+
+def _parse(path) -> dict[str, int]:
+    weights = {}
+    for line in path.read_text().splitlines():
+        stack, _, weight = line.rpartition(" ")
+        weights[stack] = int(weight)
+    return weights
+
+
+def test_sampler_and_store(tmp_path):
+    """Test sampling a busy thread and pruning the capture directory."""
+    sampler = StackSampler(interval=0.002, window=1.0)
+    sampler.start()
+    start = time.perf_counter()
+    while time.perf_counter() - start < 0.1:
+        sum(range(1000))
+    end = time.perf_counter()
+    sampler.stop()
+
+    stacks = sampler.between(start, end)
+    assert sum(stacks.values()) > 5
+    assert any(stack[-1].endswith(":test_sampler_and_store") for stack in stacks)
+
+    store = ProfileStore(str(tmp_path), max_files=3)
+    for i in range(5):
+        store.write(f"{i:03d}.folded", [f"a;b {i}"])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["002.folded", "003.folded", "004.folded"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_header_and_slow_capture(
+    client: AsyncClient, profiling, monkeypatch: pytest.MonkeyPatch
+):
+    """Test header-triggered capture with phases, and automatic capture of slow requests."""
+    response = await client.post(
+        "/api/resolve",
+        json={"domain": "example.test", "dns_server": "127.0.0.1", "no_cache": True},
+        headers={"X-Profile": "1"},
+    )
+    capture_id = response.headers["x-profile-id"]
+    (path,) = profiling.glob(f"{capture_id}-header-*.folded")
+    weights = _parse(path)
+    assert "phases;POST_/api/resolve;upstream_dns;udp" in weights
+    assert "phases;POST_/api/resolve;unattributed" in weights
+
+    # Not opted in and fast: nothing written
+    await client.post("/api/resolve", json={"domain": "example.test", "dns_server": "127.0.0.1"})
+    assert len(list(profiling.iterdir())) == 1
+
+    monkeypatch.setattr(settings, "profiling_slow_threshold_ms", 200)
+    response = await client.post(
+        "/api/resolve", json={"domain": "slow.example.test", "dns_server": "127.0.0.1"}
+    )
+    assert "x-profile-id" not in response.headers
+    (slow,) = profiling.glob("*-slow-*.folded")
+    weights = _parse(slow)
+    assert weights["phases;POST_/api/resolve;upstream_dns;udp"] >= 400_000
+    # The loop was mostly idle waiting for the upstream
+    assert any(stack.startswith("stacks;") for stack in weights)
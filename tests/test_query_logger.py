@@ -0,0 +1,100 @@
+"""Write-behind query log tests."""
+
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.config import settings
+from src.models.dns import QueryLog
+from src.services.query_logger import QueryLogWriter
+
+
+def _row(i: int) -> dict:
+    return {
+        "client_ip": "127.0.0.1",
+        "domain": f"d{i}.test",
+        "dns_server": "8.8.8.8",
+        "response_time_ms": i,
+        "success": True,
+        "error_message": None,
+    }
+
+
+async def _count(db_session: AsyncSession) -> int:
+    return await db_session.scalar(select(func.count()).select_from(QueryLog))
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_in_batches(
+    log_writer: QueryLogWriter, db_session: AsyncSession, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that queued rows are flushed in size-bounded batches."""
+    monkeypatch.setattr(settings, "query_log_batch_size", 10)
+    batches, written = log_writer.batches, log_writer.written
+    assert await log_writer.submit_many([_row(i) for i in range(25)]) == 25
+
+    await log_writer.flush()
+    assert await _count(db_session) == 25
+    assert log_writer.batches - batches == 3
+    assert log_writer.written - written == 25
+
+
+@pytest.mark.asyncio
+async def test_pending_rows_flushed_on_stop(log_writer: QueryLogWriter, db_session: AsyncSession):
+    """Test that a graceful stop writes everything still queued."""
+    await log_writer.submit_many([_row(i) for i in range(5)])
+    await log_writer.stop()
+    assert await _count(db_session) == 5
+
+
+@pytest.mark.asyncio
+async def test_drop_policy_counts_overflow(monkeypatch: pytest.MonkeyPatch):
+    """Test that a full queue drops rows under the drop policy."""
+    monkeypatch.setattr(settings, "query_log_queue_size", 2)
+    writer = QueryLogWriter()
+    writer.start()
+    try:
+        # put_nowait never yields, so the consumer cannot drain in between
+        accepted = await writer.submit_many([_row(i) for i in range(5)])
+    finally:
+        writer._task.cancel()
+    assert accepted == 2
+    assert writer.dropped == 3
+
+
+@pytest.mark.asyncio
+async def test_submit_without_writer_is_dropped():
+    """Test that rows submitted before start are counted as dropped."""
+    writer = QueryLogWriter()
+    assert await writer.submit(_row(1)) is False
+    assert writer.dropped == 1
+
+
+class _HangingSession:
+    async def __aenter__(self) -> None:
+        await asyncio.Event().wait()
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
+
+
+@pytest.mark.asyncio
+async def test_stop_gives_up_on_a_stuck_writer(monkeypatch: pytest.MonkeyPatch):
+    """Test that stop returns after the shutdown timeout even with a full queue."""
+    monkeypatch.setattr(settings, "query_log_queue_size", 1)
+    monkeypatch.setattr(settings, "query_log_flush_interval", 0.0)
+    monkeypatch.setattr(settings, "query_log_overflow_policy", "block")
+    monkeypatch.setattr(settings, "query_log_shutdown_timeout", 0.1)
+    writer = QueryLogWriter(session_factory=_HangingSession)
+    writer.start()
+    task = writer._task
+
+    await writer.submit(_row(1))
+    await asyncio.sleep(0.01)  # The writer takes the row and hangs writing it
+    await writer.submit(_row(2))  # Fills the queue
+
+    await asyncio.wait_for(writer.stop(), timeout=1.0)
+    assert not writer.running
+    assert task.cancelled()
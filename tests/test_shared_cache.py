@@ -0,0 +1,133 @@
+"""Shared-memory cache tests."""
+
+import multiprocessing
+import time
+from pathlib import Path
+
+import pytest
+
+from src.services.asn_client import ASNLookupClient
+from src.services.dns_cache import DNSAnswerCache, make_key
+from src.services.shared_cache import HEADER_SIZE, SharedCache
+
+
+def _cache(path: Path, slots: int = 64, slot_size: int = 256, ways: int = 4) -> SharedCache:
+    return SharedCache(str(path), slots, slot_size, ways)
+
+
+def test_shared_between_mappings(tmp_path: Path):
+    """Test set/get across two mappings, overwrite, expiry, eviction and limits."""
+    path = tmp_path / "cache"
+    writer, reader = _cache(path), _cache(path)
+
+    assert writer.set(b"a", b"1", time.time() + 60)
+    assert reader.get(b"a")[0] == b"1"
+    writer.set(b"a", b"22", time.time() + 60)
+    assert reader.get(b"a")[0] == b"22"
+    writer.set(b"gone", b"x", time.time() - 1)
+    assert reader.get(b"gone") is None
+
+    assert not writer.set(b"k", b"x" * 1000, time.time() + 60)
+    assert writer.stats()["oversized"] == 1
+
+    # One set of two ways: the entry expiring first is replaced
+    small = _cache(tmp_path / "small", slots=2, ways=2)
+    small.set(b"soon", b"1", time.time() + 10)
+    small.set(b"late", b"2", time.time() + 60)
+    small.set(b"new", b"3", time.time() + 30)
+    assert small.get(b"soon") is None
+    assert small.get(b"late") and small.get(b"new")
+    assert small.evictions == 1
+
+    small.clear()
+    assert small.get(b"late") is None
+
+    # A different layout for an existing file disables the cache instead of corrupting it
+    mismatched = _cache(path, slot_size=128)
+    assert not mismatched.set(b"a", b"1", time.time() + 60)
+    assert not mismatched.enabled
+
+
+def _write_forever(path: str, stop) -> None:
+    cache = _cache(Path(path), slots=4, ways=4)
+    i = 0
+    while not stop.is_set():
+        i += 1
+        size = 1 + i % 200
+        cache.set(b"key", bytes([i % 256]) * size, time.time() + 60)
+
+
+def test_reads_never_see_torn_writes(tmp_path: Path):
+    """Test the seqlock read path against a writer in another process."""
+    path = tmp_path / "cache"
+    reader = _cache(path, slots=4, ways=4)
+    reader.set(b"key", b"\x00", time.time() + 60)
+
+    context = multiprocessing.get_context("fork")
+    stop = context.Event()
+    writer = context.Process(target=_write_forever, args=(str(path), stop))
+    writer.start()
+    try:
+        seen = set()
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            found = reader.get(b"key")
+            if found is not None:
+                value = found[0]
+                assert value == value[:1] * len(value)  # one byte repeated, never mixed
+                seen.add(value[:1])
+    finally:
+        stop.set()
+        writer.join(timeout=5)
+    assert len(seen) > 1
+
+
+def test_write_after_crashed_writer(tmp_path: Path):
+    """Test that a slot left odd by a dead writer stays odd until rewritten, then reads."""
+    cache = _cache(tmp_path / "cache", slots=1, ways=1)
+    cache.set(b"key", b"old", time.time() + 60)
+    mapped = cache._open()
+    seq = mapped[HEADER_SIZE]
+    mapped[HEADER_SIZE] = seq + 1  # the writer died after marking the slot
+    payload = mapped.find(b"keyold", HEADER_SIZE) + len(b"key")
+    mapped[payload : payload + 3] = b"new"  # and wrote part of its payload
+    assert cache.get(b"key") is None
+
+    cache.set(b"key", b"newer", time.time() + 60)
+    assert mapped[HEADER_SIZE] == seq + 2
+    assert cache.get(b"key")[0] == b"newer"
+
+
+@pytest.mark.asyncio
+async def test_answer_and_asn_caches_share_entries(tmp_path: Path):
+    """Test that one worker's answers and ASN results are hits in another."""
+    path = tmp_path / "cache"
+    first = DNSAnswerCache(1024 * 1024, shared=_cache(path, slot_size=512))
+    second = DNSAnswerCache(1024 * 1024, shared=_cache(path, slot_size=512))
+    key = make_key("Example.com.", "10.0.0.1", "a")
+    result = {
+        "domain": "example.com",
+        "dns_server": "10.0.0.1",
+        "record_type": "A",
+        "answers": ["192.0.2.1"],
+        "response_time_ms": 3,
+        "success": True,
+        "error_message": None,
+    }
+
+    first.set(key, result, 300)
+    cached = second.get(key)
+    assert cached["answers"] == ["192.0.2.1"] and cached["cached"] is True
+    assert 298 <= cached["ttl_remaining"] <= 300
+    assert second.shared_hits == 1
+    assert second.get(key) is not None and second.shared_hits == 1  # now served locally
+
+    one = ASNLookupClient(shared=_cache(path, slot_size=512))
+    other = ASNLookupClient(shared=_cache(path, slot_size=512))
+    one._store_shared("203.0.113.7", {"asn": 64500, "as_name": "TEST", "prefix": "203.0.112.0/22"})
+    one._store_shared("198.51.100.1", None)
+
+    assert (await other.lookup("203.0.113.200"))["asn"] == 64500  # same /24
+    assert await other.lookup("198.51.100.1") is None
+    assert other.stats()["shared_hits"] == 2
+    assert other.stats()["misses"] == 0
@@ -0,0 +1,96 @@
+"""Multiplexed UDP query engine tests."""
+
+import asyncio
+
+import dns.exception
+import dns.message
+import pytest
+
+from benchmarks.stub_dns import StubDNSServer
+from src.core.config import settings
+from src.services.dns_service import DNSService
+from src.services.udp_engine import TimerWheel, UDPQueryEngine
+
+
+@pytest.mark.asyncio
+async def test_timer_wheel_fires_and_cancels():
+    """Test that due timers fire in order and cancelled timers never do."""
+    wheel = TimerWheel(resolution=0.01, slots=8)
+    fired: list[str] = []
+    wheel.schedule(0.03, lambda: fired.append("short"))
+    wheel.schedule(0.15, lambda: fired.append("long"))  # more than one revolution out
+    cancelled = wheel.schedule(0.05, lambda: fired.append("cancelled"))
+    cancelled.cancel()
+    assert len(wheel) == 2
+
+    await asyncio.sleep(0.08)
+    assert fired == ["short"]
+    await asyncio.sleep(0.12)
+    assert fired == ["short", "long"]
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("stub_dns")
+async def test_engine_multiplexes_and_matches_out_of_order(monkeypatch: pytest.MonkeyPatch):
+    """Test many concurrent queries over a few sockets, matched by ID and question."""
+    monkeypatch.setattr(settings, "dns_udp_sockets_per_upstream", 2)
+    monkeypatch.setattr(settings, "dns_udp_socket_max_queries", 50)
+    engine = UDPQueryEngine()
+    try:
+        slow = asyncio.ensure_future(
+            engine.query("127.0.0.1", dns.message.make_query("slow.example.test", "A"), 2.0)
+        )
+        queries = [dns.message.make_query(f"q{i}.example.test", "A") for i in range(200)]
+        responses = await asyncio.gather(*(engine.query("127.0.0.1", q, 2.0) for q in queries))
+        assert not slow.done()
+        for query, response in zip(queries, responses, strict=True):
+            assert query.is_response(response)
+
+        assert (await slow).answer
+        stats = engine.stats()
+        assert stats["queries"] == 201 and stats["in_flight"] == 0
+        # Sockets were recycled after 50 queries each but the pool size held
+        assert stats["sockets"] == 2
+        assert sum(len(pool) for pool in engine._pools.values()) == 2
+    finally:
+        await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_engine_timeout_and_tcp_fallback(stub_dns: StubDNSServer):
+    """Test wheel-driven timeouts, TCP retry on truncation, and DNSService wiring."""
+    engine = UDPQueryEngine()
+    try:
+        with pytest.raises(dns.exception.Timeout):
+            await engine.query("127.0.0.1", dns.message.make_query("slow.example.test", "A"), 0.1)
+        assert engine.timeouts == 1
+
+        response = await engine.query(
+            "127.0.0.1", dns.message.make_query("tc.example.test", "A"), 1.0
+        )
+        assert engine.tcp_fallbacks == 1
+        assert response.answer and stub_dns.connections == 1
+    finally:
+        await engine.close()
+
+    result = await DNSService.resolve_domain("tc.example.test", "127.0.0.1", use_cache=False)
+    assert result["success"] is True and result["answers"] == ["127.0.0.1"]
+
+
+@pytest.mark.asyncio
+async def test_stub_injected_loss_and_truncation(
+    stub_dns: StubDNSServer, monkeypatch: pytest.MonkeyPatch
+):
+    """Test the load-test fault knobs: random truncation retries over TCP, loss times out."""
+    monkeypatch.setattr(settings, "dns_timeout", 0.2)
+    stub_dns.truncate = 1.0
+    result = await DNSService.resolve_domain("ok.example.test", "127.0.0.1", use_cache=False)
+    assert result["success"] is True
+    assert stub_dns.truncated == 1 and stub_dns.connections == 1
+
+    stub_dns.truncate = 0.0
+    stub_dns.loss = 1.0
+    result = await DNSService.resolve_domain("ok.example.test", "127.0.0.1", use_cache=False)
+    assert result["success"] is False
+    assert stub_dns.dropped == 1